@@ -3,18 +3,40 @@
 Dashboard Flask pour visualiser les prix des métaux et les taux de change ECB.
 """
 
-from flask import Flask, render_template, jsonify, request, send_file
+from flask import Flask, Response, render_template, jsonify, request, send_file, send_from_directory, has_request_context, g
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+from psycopg2.errors import QueryCanceled
 from psycopg2.extras import RealDictCursor
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta, date, timezone
 import logging
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-from io import BytesIO
+from io import BytesIO, StringIO
 import calendar
+import contextlib
+import cProfile
+import contextvars
+import csv
+import functools
+import gzip
+import hashlib
+import html
+import importlib.util
+import inspect
+import json
+import mimetypes
 import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from decimal import Decimal
+from werkzeug.security import safe_join
 
 logging.basicConfig(
     level=logging.INFO,
@@ -35,27 +57,256 @@ DB_CONFIG = {
     "database": "LME_DB",
     "sslmode": "require"
 }
+# Base locale (benchmarks, tests de plans) : DATABASE_URL=postgresql://…
+if os.environ.get("DATABASE_URL"):
+    DB_CONFIG = {"dsn": os.environ["DATABASE_URL"]}
 
 # ==============================
 # IMPORTS SUPPLÉMENTAIRES
 # ==============================
+# Export Excel (openpyxl), mail et scheduler sont importés à la première
+# utilisation : la plupart des requêtes n'en ont pas besoin et chaque worker
+# gunicorn démarre ~110 ms plus vite (cf. benchmarks/startup.py).
+MAIL_AVAILABLE = importlib.util.find_spec('flask_mail') is not None
+if not MAIL_AVAILABLE:
+    logger.warning("flask_mail non disponible")
+
+SCHEDULER_AVAILABLE = importlib.util.find_spec('apscheduler') is not None
+if not SCHEDULER_AVAILABLE:
+    logger.warning("apscheduler non disponible")
+
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+if not NUMPY_AVAILABLE:
+    logger.warning("numpy non disponible (pas de conversions FX journalières)")
+
 try:
-    from flask_mail import Mail, Message
-    MAIL_AVAILABLE = True
+    import prometheus_client
+    from prometheus_client import Counter, Histogram, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
+    from prometheus_client import multiprocess as prometheus_multiprocess
+    METRICS_AVAILABLE = True
 except ImportError:
-    MAIL_AVAILABLE = False
-    logger.warning("flask_mail non disponible")
+    METRICS_AVAILABLE = False
+    logger.warning("prometheus_client non disponible")
 
 try:
-    from apscheduler.schedulers.background import BackgroundScheduler
-    from apscheduler.triggers.cron import CronTrigger
-    SCHEDULER_AVAILABLE = True
+    import brotli
+    BROTLI_AVAILABLE = True
 except ImportError:
-    SCHEDULER_AVAILABLE = False
-    logger.warning("apscheduler non disponible")
+    BROTLI_AVAILABLE = False
+    logger.warning("brotli non disponible (compression gzip uniquement)")
 
 import atexit
 import secrets
+import socket
+
+# ==============================
+# MÉTRIQUES PROMETHEUS
+# ==============================
+# Sous gunicorn, PROMETHEUS_MULTIPROC_DIR (posé par gunicorn.conf.py) fait
+# écrire chaque worker dans un fichier partagé ; /metrics agrège tous les workers.
+PROMETHEUS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+if METRICS_AVAILABLE and PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+_LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+_ROWS_BUCKETS    = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+_BYTES_BUCKETS   = (10e3, 50e3, 100e3, 500e3, 1e6, 5e6, 20e6, 100e6)
+
+if METRICS_AVAILABLE:
+    HTTP_REQUEST_SECONDS = Histogram(
+        'lme_http_request_duration_seconds', 'Latence des requêtes HTTP par route',
+        ['route', 'method', 'status'], buckets=_LATENCY_BUCKETS)
+    DB_QUERY_SECONDS = Histogram(
+        'lme_db_query_duration_seconds', 'Durée des requêtes SQL par fonction',
+        ['function'], buckets=_LATENCY_BUCKETS)
+    DB_QUERY_ROWS = Histogram(
+        'lme_db_query_rows', 'Lignes retournées par requête SQL',
+        ['function'], buckets=_ROWS_BUCKETS)
+    DB_ACQUIRE_SECONDS = Histogram(
+        'lme_db_connection_acquire_seconds', 'Temps pour emprunter une connexion au pool',
+        buckets=(.0005, .001, .005, .01, .05, .1, .5, 1, 5))
+    EXPORT_BUILD_SECONDS = Histogram(
+        'lme_export_build_seconds', 'Temps de construction des exports Excel',
+        ['export'], buckets=_LATENCY_BUCKETS)
+    EXPORT_BYTES = Histogram(
+        'lme_export_bytes', 'Taille des exports Excel',
+        ['export'], buckets=_BYTES_BUCKETS)
+    CACHE_REQUESTS = Counter(
+        'lme_cache_requests_total', 'Accès aux caches applicatifs',
+        ['cache', 'result'])
+    SCHEDULER_JOB_SECONDS = Histogram(
+        'lme_scheduler_job_duration_seconds', 'Durée des jobs du scheduler',
+        ['job', 'status'], buckets=_LATENCY_BUCKETS + (120, 300, 600))
+    SINGLE_FLIGHT_COALESCED = Counter(
+        'lme_single_flight_coalesced_total', 'Appels servis par une requête déjà en vol',
+        ['function'])
+    QUERY_TIMEOUTS = Counter(
+        'lme_query_timeouts_total', 'Requêtes annulées par statement_timeout',
+        ['endpoint'])
+
+_current_query_label = contextvars.ContextVar('query_label', default=None)
+
+@contextlib.contextmanager
+def query_label(name):
+    """Étiquette les requêtes SQL exécutées dans le bloc (utilisable en décorateur)."""
+    token = _current_query_label.set(name)
+    try:
+        yield
+    finally:
+        _current_query_label.reset(token)
+
+def set_query_label(name):
+    """Change l'étiquette jusqu'à la sortie du query_label englobant."""
+    _current_query_label.set(name)
+
+def current_query_label():
+    label = _current_query_label.get()
+    if label:
+        return label
+    if has_request_context() and request.endpoint:
+        return request.endpoint
+    return 'unlabelled'
+
+def record_query(label, elapsed, rows):
+    if METRICS_AVAILABLE:
+        DB_QUERY_SECONDS.labels(label).observe(elapsed)
+        if rows is not None and rows >= 0:
+            DB_QUERY_ROWS.labels(label).observe(rows)
+
+# ==============================
+# SLOW QUERY LOG + EXPLAIN ÉCHANTILLONNÉ
+# ==============================
+# Toute requête au-delà de SLOW_QUERY_MS est journalisée (empreinte, paramètres,
+# durée, lignes). Une fraction SLOW_QUERY_EXPLAIN_SAMPLE est rejouée en
+# EXPLAIN (ANALYZE, BUFFERS) dans un thread dédié ; le tout est conservé dans un
+# buffer circulaire consultable sur /api/admin/slow-queries. ANALYZE exécute
+# réellement la requête : seules les lectures sont rejouées (pas de CTE
+# INSERT/UPDATE…), dans une transaction READ ONLY au timeout court.
+SLOW_QUERY_MS              = float(os.environ.get('SLOW_QUERY_MS', 500))
+SLOW_QUERY_EXPLAIN_SAMPLE  = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE', 0.1))
+SLOW_QUERY_BUFFER_SIZE     = int(os.environ.get('SLOW_QUERY_BUFFER_SIZE', 200))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.environ.get('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', 5000))
+
+_slow_queries = deque(maxlen=SLOW_QUERY_BUFFER_SIZE)
+_slow_queries_lock = threading.Lock()
+_slow_query_seq = [0]
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+_explain_pending = threading.Event()
+
+_FINGERPRINT_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|%s")
+# Sur la forme normalisée (littéraux déjà remplacés) : un seul de ces mots exclut l'EXPLAIN
+_WRITE_TOKENS = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|COPY|INTO|LOCK|CALL)\b", re.IGNORECASE)
+# Fonctions à effet de bord qu'une transaction READ ONLY laisse passer (verrous
+# consultatifs de session gardés par la connexion du pool, NOTIFY…) ou refuse
+_SIDE_EFFECT_CALLS = re.compile(
+    r"\b(pg_(try_)?advisory\w*|set_config|nextval|setval|pg_notify|pg_sleep\w*|lo_\w+|dblink\w*)\s*\(",
+    re.IGNORECASE)
+
+def query_fingerprint(query):
+    """Forme normalisée d'une requête (littéraux et paramètres → ?) et son hash."""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    normalized = _FINGERPRINT_LITERALS.sub('?', ' '.join(query.split()))
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12], normalized
+
+def _serialize_params(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: serialize_value(v) for k, v in params.items()}
+    return [serialize_value(v) for v in params]
+
+def is_read_only_sql(normalized):
+    """Vrai si la requête normalisée est une lecture pure (SELECT / WITH sans écriture)."""
+    head = normalized.lstrip('( ').upper()
+    return (head.startswith(('SELECT', 'WITH')) and not _WRITE_TOKENS.search(normalized)
+            and not _SIDE_EFFECT_CALLS.search(normalized))
+
+def record_slow_query(label, query, params, elapsed, rows, error=None):
+    duration_ms = elapsed * 1000
+    if duration_ms < SLOW_QUERY_MS or label == 'slow_query_explain':
+        return
+    fingerprint, normalized = query_fingerprint(query)
+    with _slow_queries_lock:
+        _slow_query_seq[0] += 1
+        entry = {
+            'id':          _slow_query_seq[0],
+            'at':          datetime.now().isoformat(),
+            'label':       label,
+            'endpoint':    request.endpoint if has_request_context() else None,
+            'fingerprint': fingerprint,
+            'sql':         normalized,
+            'params':      _serialize_params(params),
+            'duration_ms': round(duration_ms, 1),
+            'rows':        rows if rows is not None and rows >= 0 else None,
+            'error':       error,
+            'explain':     None,
+        }
+        _slow_queries.append(entry)
+    logger.warning(
+        f"🐢 Requête lente {fingerprint} [{label}] {duration_ms:.0f} ms, "
+        f"{entry['rows']} lignes, params={entry['params']}"
+    )
+    if (error is None and is_read_only_sql(normalized)
+            and random.random() < SLOW_QUERY_EXPLAIN_SAMPLE
+            and not _explain_pending.is_set()):
+        # Un seul EXPLAIN à la fois : les suivants sont ignorés tant qu'il tourne
+        _explain_pending.set()
+        _explain_executor.submit(_capture_explain, entry, query, params)
+
+def _capture_explain(entry, query, params):
+    try:
+        with query_label('slow_query_explain'):
+            conn = get_db_connection()
+            if not conn:
+                return
+            try:
+                conn.rollback()
+                with conn.cursor() as cur:
+                    # Filet de sécurité : une écriture mal classée échoue au lieu de s'exécuter
+                    cur.execute("SET TRANSACTION READ ONLY")
+                    cur.execute("SET LOCAL statement_timeout = %s", (SLOW_QUERY_EXPLAIN_TIMEOUT_MS,))
+                    cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+                    plan = '\n'.join(row[0] for row in cur.fetchall())
+                conn.rollback()
+            finally:
+                conn.close()
+        with _slow_queries_lock:
+            entry['explain'] = plan
+    except Exception as e:
+        logger.error(f"Erreur EXPLAIN requête lente {entry['fingerprint']}: {e}")
+    finally:
+        _explain_pending.clear()
+
+def record_cache_access(cache, hit):
+    if METRICS_AVAILABLE:
+        CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+def record_export(export, started, size):
+    if METRICS_AVAILABLE:
+        EXPORT_BUILD_SECONDS.labels(export).observe(time.perf_counter() - started)
+        EXPORT_BYTES.labels(export).observe(size)
+
+def timed_job(job_id):
+    """Mesure la durée d'un job du scheduler et l'enregistre dans scheduler_job_runs."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            status, error = 'success', None
+            run_id = start_job_run(job_id)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                status, error = 'error', str(e)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                finish_job_run(run_id, status, error, elapsed)
+                if METRICS_AVAILABLE:
+                    SCHEDULER_JOB_SECONDS.labels(job_id, status).observe(elapsed)
+        return wrapper
+    return decorator
 
 # ==============================
 # CONFIGURATION EMAIL
@@ -68,8 +319,15 @@ app.config['MAIL_USERNAME'] = None
 app.config['MAIL_PASSWORD'] = None
 app.config['MAIL_DEFAULT_SENDER'] = 'administration.STS@avocarbon.com'
 
-if MAIL_AVAILABLE:
-    mail = Mail(app)
+_mail = None
+
+def get_mail():
+    """Extension Flask-Mail, créée au premier envoi."""
+    global _mail
+    if _mail is None:
+        from flask_mail import Mail
+        _mail = Mail(app)
+    return _mail
 
 # ==============================
 # CONFIGURATION BUDGET RATE
@@ -94,17 +352,350 @@ def serialize_row(row):
     return {k: serialize_value(v) for k, v in dict(row).items()}
 
 # ==============================
-# CONNEXION BASE DE DONNÉES
+# CONNEXION BASE DE DONNÉES (POOL)
 # ==============================
-def get_db_connection():
-    """Créer une connexion à PostgreSQL."""
+# Une connexion empruntée reçoit le budget statement_timeout de l'endpoint en
+# cours : une requête qui le dépasse est annulée par PostgreSQL (QueryCanceled)
+# et l'API répond une erreur « réduisez vos filtres » au lieu de bloquer un worker.
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', 10))
+DB_POOL_WARMUP = int(os.environ.get('DB_POOL_WARMUP', 4))   # connexions ouvertes au démarrage du worker
+
+app.config['STATEMENT_TIMEOUTS_MS'] = {
+    'default':              15000,
+    'background':           120000,   # scheduler / hors requête HTTP
+    'api_price_history':    10000,
+    'api_ecb_rates':        10000,
+    'api_metals_summary':   20000,
+    'export_excel':         30000,
+    'export_sheet_excel':   30000,
+    'api_ecb_rates_export': 30000,
+    'export_florent':       20000,
+}
+# Surcharges: STATEMENT_TIMEOUTS_MS='{"export_excel": 60000}'
+app.config['STATEMENT_TIMEOUTS_MS'].update(json.loads(os.environ.get('STATEMENT_TIMEOUTS_MS', '{}')))
+
+class _AppConnection(psycopg2.extensions.connection):
+    """Connexion psycopg2 qui mémorise le statement_timeout déjà appliqué."""
+    statement_timeout_ms = None
+
+class _InstrumentedCursorMixin:
+    """Chronomètre chaque execute() et le rapporte sous l'étiquette courante."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        error = None
+        try:
+            return super().execute(query, vars)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            label = current_query_label()
+            record_query(label, elapsed, self.rowcount)
+            sql_timing = g.get('sql_timing') if has_request_context() else None
+            if sql_timing is not None:
+                # Threads de fan-out : temps SQL parallèle, compté à part (sa somme dépasse le temps mur)
+                key = 'parallel_seconds' if getattr(_fanout_local, 'active', False) else 'seconds'
+                with _sql_timing_lock:
+                    sql_timing[key]     += elapsed
+                    sql_timing['count'] += 1
+            record_slow_query(label, query, vars, elapsed, self.rowcount, error)
+
+class InstrumentedCursor(_InstrumentedCursorMixin, psycopg2.extensions.cursor):
+    pass
+
+class InstrumentedRealDictCursor(_InstrumentedCursorMixin, RealDictCursor):
+    pass
+
+_INSTRUMENTED_CURSORS = {
+    psycopg2.extensions.cursor: InstrumentedCursor,
+    RealDictCursor:             InstrumentedRealDictCursor,
+}
+
+class PooledConnection:
+    """Connexion empruntée au pool : close() la rend au pool au lieu de la fermer."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self._conn.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _INSTRUMENTED_CURSORS.get(factory, factory)
+        return self._conn.cursor(*args, **kwargs)
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self._pool.putconn(conn, close=bool(conn.closed))
+
+class _AppConnectionPool(psycopg2.pool.ThreadedConnectionPool):
+    """
+    Garde jusqu'à maxconn connexions inactives (psycopg2 ferme tout ce qui
+    dépasse minconn) et fait attendre getconn() quand le pool est épuisé au
+    lieu de lever PoolError : indispensable avec des workers gevent, où les
+    requêtes concurrentes dépassent largement DB_POOL_MAX. Les nouvelles
+    connexions s'ouvrent hors du verrou : à froid, N requêtes concurrentes
+    paient une connexion en parallèle au lieu de N à la suite.
+    """
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        # Pas de connexions ouvertes en série à la création : warm_db_pool()
+        # les ouvre en parallèle au démarrage du worker
+        super().__init__(0, maxconn, *args, **kwargs)
+        self.minconn = minconn
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=DB_POOL_ACQUIRE_TIMEOUT):
+            raise psycopg2.pool.PoolError(
+                f"pool épuisé : aucune connexion libérée en {DB_POOL_ACQUIRE_TIMEOUT}s")
+        try:
+            with self._lock:
+                if self.closed or self._pool or (key is not None and key in self._used):
+                    return self._getconn(key)
+            # Le sémaphore borne déjà le total à maxconn
+            conn = psycopg2.connect(*self._args, **self._kwargs)
+            with self._lock:
+                if key is None:
+                    key = self._getkey()
+                self._used[key] = conn
+                self._rused[id(conn)] = key
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            # ROLLBACK hors du verrou du pool : c'est un aller-retour réseau,
+            # psycopg2 le ferait sous le verrou et sérialiserait les requêtes
+            if not close and not conn.closed and conn.info.transaction_status not in (
+                    psycopg2.extensions.TRANSACTION_STATUS_IDLE,
+                    psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN):
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+    def _putconn(self, conn, key=None, close=False):
+        # Appelé sous le verrou du pool
+        minconn, self.minconn = self.minconn, self.maxconn
+        try:
+            super()._putconn(conn, key, close)
+        finally:
+            self.minconn = minconn
+
+_db_pool = None
+_db_pool_pid = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool():
+    """Pool par process (recréé après un fork de gunicorn)."""
+    global _db_pool, _db_pool_pid
+    if _db_pool is None or _db_pool_pid != os.getpid():
+        with _db_pool_lock:
+            if _db_pool is None or _db_pool_pid != os.getpid():
+                _db_pool = _AppConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX,
+                    connection_factory=_AppConnection, **DB_CONFIG
+                )
+                _db_pool_pid = os.getpid()
+    return _db_pool
+
+def warm_db_pool(size=None):
+    """
+    Ouvre `size` connexions en parallèle puis les rend au pool, qui les garde :
+    la première vague de requêtes d'un worker neuf ne paie pas les connexions
+    TLS vers Azure. Retourne le nombre de connexions ouvertes.
+    """
+    size = min(size if size is not None else DB_POOL_WARMUP, DB_POOL_MAX)
+    conns = []
+    def borrow():
+        conn = get_db_connection()
+        if conn:
+            conns.append(conn)
+    threads = [threading.Thread(target=borrow, name='db-pool-warmup-conn') for _ in range(size)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for conn in conns:
+        conn.close()
+    return len(conns)
+
+def current_statement_timeout_ms():
+    budgets = app.config['STATEMENT_TIMEOUTS_MS']
+    if not has_request_context():
+        return budgets.get('background', budgets['default'])
+    return budgets.get(request.endpoint, budgets['default'])
+
+def get_db_connection(statement_timeout_ms=None):
+    """Emprunter une connexion PostgreSQL au pool, avec le budget de l'endpoint."""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
+        started = time.perf_counter()
+        pool = get_db_pool()
+        # 0 = pas de limite (migrations, index CONCURRENTLY) : seul None prend le budget courant
+        timeout_ms = int(current_statement_timeout_ms() if statement_timeout_ms is None
+                         else statement_timeout_ms)
+        for _ in range(2):
+            conn = pool.getconn()
+            try:
+                if conn.statement_timeout_ms != timeout_ms:
+                    with conn.cursor() as cur:
+                        cur.execute("SET statement_timeout = %s", (timeout_ms,))
+                    conn.commit()
+                    conn.statement_timeout_ms = timeout_ms
+                if METRICS_AVAILABLE:
+                    DB_ACQUIRE_SECONDS.observe(time.perf_counter() - started)
+                return PooledConnection(pool, conn)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                # Connexion morte (redémarrage serveur, coupure réseau) : on la jette
+                pool.putconn(conn, close=True)
+            except Exception:
+                # Toute autre erreur de préparation : ni la connexion ni son slot ne doivent fuir
+                pool.putconn(conn, close=True)
+                raise
+        raise psycopg2.OperationalError("aucune connexion valide dans le pool")
     except Exception as e:
         logger.error(f"Erreur de connexion à la base de données: {e}")
         return None
 
+# ==============================
+# SINGLE-FLIGHT: COALESCENCE DES REQUÊTES IDENTIQUES
+# ==============================
+# Les appels concurrents avec les mêmes arguments (défauts appliqués : f(x) et
+# f(x, None) sont le même appel) partagent une seule requête DB en vol et son
+# résultat. Pas de normalisation des valeurs (' copper ', 'all', None) : la
+# fonction ne reçoit que les arguments de son meneur, ils doivent donc être
+# identiques. Le résultat partagé ne doit pas être modifié par les appelants.
+class _Flight:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event  = threading.Event()
+        self.result = None
+        self.error  = None
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+single_flight_stats = {}   # nom → {'calls', 'executions', 'coalesced'}
+
+def single_flight(func):
+    sig = inspect.signature(func)
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (name, tuple(bound.arguments.items()))
+        with _inflight_lock:
+            stats = single_flight_stats.setdefault(name, {'calls': 0, 'executions': 0, 'coalesced': 0})
+            stats['calls'] += 1
+            flight = _inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _inflight[key] = _Flight()
+            else:
+                stats['coalesced'] += 1
+                if METRICS_AVAILABLE:
+                    SINGLE_FLIGHT_COALESCED.labels(name).inc()
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = func(*args, **kwargs)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+                stats['executions'] += 1
+            flight.event.set()
+    return wrapper
+
+# ==============================
+# REQUÊTES INDÉPENDANTES EN PARALLÈLE
+# ==============================
+# Les endpoints composites (synthèse, onglets, bootstrap) lancent leurs
+# sous-requêtes indépendantes sur des connexions distinctes du pool : le
+# temps de réponse devient max(requête) au lieu de sum(requête).
+# Connexions max par process ≈ threads du worker + DB_FANOUT_WORKERS,
+# à garder sous DB_POOL_MAX.
+DB_FANOUT_WORKERS = int(os.environ.get('DB_FANOUT_WORKERS', 6))
+
+_fanout_executor = None
+_fanout_pid = None
+_fanout_lock = threading.Lock()
+_fanout_local = threading.local()
+_sql_timing_lock = threading.Lock()
+
+def get_fanout_executor():
+    """Exécuteur par process (les threads ne survivent pas au fork de gunicorn)."""
+    global _fanout_executor, _fanout_pid
+    if _fanout_executor is None or _fanout_pid != os.getpid():
+        with _fanout_lock:
+            if _fanout_executor is None or _fanout_pid != os.getpid():
+                _fanout_executor = ThreadPoolExecutor(max_workers=DB_FANOUT_WORKERS,
+                                                      thread_name_prefix='db-fanout',
+                                                      initializer=_mark_fanout_thread)
+                _fanout_pid = os.getpid()
+    return _fanout_executor
+
+def _mark_fanout_thread():
+    _fanout_local.active = True
+
+def run_concurrently(tasks):
+    """
+    Exécute {nom: callable} en parallèle et retourne {nom: résultat}.
+    Chaque tâche garde le contexte de l'appelant (requête Flask, étiquette SQL)
+    et doit prendre sa propre connexion via get_db_connection().
+    """
+    if DB_FANOUT_WORKERS <= 1 or len(tasks) <= 1 or getattr(_fanout_local, 'active', False):
+        # Depuis un thread de fan-out : séquentiel, pour ne pas attendre un thread du même pool
+        return {name: fn() for name, fn in tasks.items()}
+    executor = get_fanout_executor()
+    started = time.perf_counter()
+    futures = {name: executor.submit(contextvars.copy_context().run, fn) for name, fn in tasks.items()}
+    wait(futures.values())
+    sql_timing = g.get('sql_timing') if has_request_context() else None
+    if sql_timing is not None:
+        # Temps mur où la requête attend son fan-out (profiler)
+        with _sql_timing_lock:
+            sql_timing['fanout_seconds'] += time.perf_counter() - started
+    return {name: future.result() for name, future in futures.items()}
+
+def fetch_all(label, query, params=None):
+    """Une requête sur sa propre connexion (pour run_concurrently) ; None si la DB est injoignable."""
+    with query_label(label):
+        conn = get_db_connection()
+        if not conn:
+            return None
+        try:
+            # Lecture seule : autocommit évite les allers-retours BEGIN / ROLLBACK
+            conn.set_session(autocommit=True)
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(query, params)
+                return cur.fetchall()
+        finally:
+            conn.set_session(autocommit=False)
+            conn.close()
+
 # ==============================
 # HELPER: Vérifier si une table existe
 # ==============================
@@ -247,14 +838,26 @@ def _build_source_filter(config, alias='mp'):
         params.extend([f'%{p}%', p])
     return '(' + ' OR '.join(clauses) + ')', params
 
-def _apply_date_filter(query, params, year=None, month=None,
-                       start_date=None, end_date=None, date_col='price_date'):
+def _apply_period_filter(query, params, year=None, month=None, date_col='price_date'):
+    # Bornes de dates plutôt qu'EXTRACT() : l'index sur date_col reste utilisable
     if year:
-        query += f" AND EXTRACT(YEAR FROM {date_col}) = %s"
-        params.append(int(year))
-    if month:
+        year = int(year)
+        if month:
+            month = int(month)
+            first = date(year, month, 1)
+            after = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        else:
+            first, after = date(year, 1, 1), date(year + 1, 1, 1)
+        query += f" AND {date_col} >= %s AND {date_col} < %s"
+        params.extend([first, after])
+    elif month:
         query += f" AND EXTRACT(MONTH FROM {date_col}) = %s"
         params.append(int(month))
+    return query, params
+
+def _apply_date_filter(query, params, year=None, month=None,
+                       start_date=None, end_date=None, date_col='price_date'):
+    query, params = _apply_period_filter(query, params, year, month, date_col)
     if start_date:
         try:
             query += f" AND {date_col} >= %s"
@@ -269,6 +872,54 @@ def _apply_date_filter(query, params, year=None, month=None,
             pass
     return query, params
 
+# Rééchantillonnage côté PostgreSQL : freq=D|W|M|Q|Y, agg=mean|last|ohlc.
+# La requête filtrée de l'endpoint devient une sous-requête regroupée par
+# date_trunc ; le client reçoit une ligne par série et par période.
+RESAMPLE_FREQS = {'D': 'day', 'W': 'week', 'M': 'month', 'Q': 'quarter', 'Y': 'year'}
+RESAMPLE_AGGS  = ('mean', 'last', 'ohlc')
+
+def parse_resample_args(args):
+    """(freq, agg) de la query string, (None, None) sans freq ; ValueError si invalide."""
+    freq = (args.get('freq') or '').upper() or None
+    agg  = (args.get('agg') or 'mean').lower()
+    if freq is None:
+        if args.get('agg'):
+            raise ValueError("Paramètre 'agg' sans 'freq'")
+        return None, None
+    if freq not in RESAMPLE_FREQS:
+        raise ValueError(f"freq invalide : {freq} (attendu {'|'.join(RESAMPLE_FREQS)})")
+    if agg not in RESAMPLE_AGGS:
+        raise ValueError(f"agg invalide : {agg} (attendu {'|'.join(RESAMPLE_AGGS)})")
+    return freq, agg
+
+def resample_query(query, keys, freq, agg, date_col='price_date', value_col='price', tiebreak=()):
+    """
+    Regroupe `query` (sans ORDER BY) par série (keys) et par période : date_col
+    devient le premier jour de la période, value_col la moyenne (mean) ou la
+    dernière valeur (last, ohlc : plus open/high/low/close). tiebreak départage
+    les points d'un même jour pour open/close (ex. created_at).
+    """
+    period = f"date_trunc('{RESAMPLE_FREQS[freq]}', {date_col}::timestamp)::date"
+    chrono = ', '.join((date_col,) + tuple(tiebreak))
+    latest = ', '.join(f"{c} DESC NULLS LAST" for c in (date_col,) + tuple(tiebreak))
+    first = f"(ARRAY_AGG({value_col} ORDER BY {chrono}))[1]"
+    last = f"(ARRAY_AGG({value_col} ORDER BY {latest}))[1]"
+    if agg == 'mean':
+        values = [f"AVG({value_col}) AS {value_col}"]
+    elif agg == 'last':
+        values = [f"{last} AS {value_col}"]
+    else:
+        values = [f"{last} AS {value_col}", f"{first} AS open", f"MAX({value_col}) AS high",
+                  f"MIN({value_col}) AS low", f"{last} AS close"]
+    keys = ', '.join(keys)
+    return f"""
+        SELECT {keys}, {period} AS {date_col}, {', '.join(values)},
+               COUNT(*) AS data_points, MAX({date_col}) AS last_date
+        FROM ({query}) AS raw
+        WHERE {value_col} IS NOT NULL
+        GROUP BY {keys}, {period}
+    """
+
 def _serialize_metals_row(row):
     return serialize_row(row)
 
@@ -362,6 +1013,7 @@ def calculate_formulas(data, config):
 # ===============================
 # FONCTIONS RÉCUPÉRATION DONNÉES MÉTAUX
 # ===============================
+@query_label('get_brent_data')
 def get_brent_data(cursor, config, year_filter=None, month_filter=None,
                    start_date=None, end_date=None):
     src_clause, params = _build_source_filter(config)
@@ -375,17 +1027,13 @@ def get_brent_data(cursor, config, year_filter=None, month_filter=None,
         FROM metal_prices mp
         WHERE {src_clause}
     """
-    if year_filter:
-        query += " AND EXTRACT(YEAR FROM price_date) = %s"
-        params.append(year_filter)
-    if month_filter:
-        query += " AND EXTRACT(MONTH FROM price_date) = %s"
-        params.append(month_filter)
+    query, params = _apply_period_filter(query, params, year_filter, month_filter)
     query, params = _apply_date_filter(query, params, start_date=start_date, end_date=end_date)
     query += " GROUP BY EXTRACT(YEAR FROM price_date), EXTRACT(MONTH FROM price_date) ORDER BY year DESC, month DESC"
     cursor.execute(query, params)
     return [serialize_row(r) for r in cursor.fetchall()]
 
+@query_label('get_shme_data')
 def get_shme_data(cursor, config, year_filter=None, month_filter=None,
                   start_date=None, end_date=None):
     src_clause, params = _build_source_filter(config)
@@ -400,12 +1048,7 @@ def get_shme_data(cursor, config, year_filter=None, month_filter=None,
         WHERE {src_clause}
           AND metal_type IN ('copper', 'zinc', 'tin')
     """
-    if year_filter:
-        query += " AND EXTRACT(YEAR FROM price_date) = %s"
-        params.append(year_filter)
-    if month_filter:
-        query += " AND EXTRACT(MONTH FROM price_date) = %s"
-        params.append(month_filter)
+    query, params = _apply_period_filter(query, params, year_filter, month_filter)
     query, params = _apply_date_filter(query, params, start_date=start_date, end_date=end_date)
     query += " GROUP BY EXTRACT(YEAR FROM price_date), EXTRACT(MONTH FROM price_date), metal_type ORDER BY year DESC, month DESC, metal_type"
     cursor.execute(query, params)
@@ -467,6 +1110,7 @@ def get_shme_data(cursor, config, year_filter=None, month_filter=None,
             })
     return result
 
+@query_label('get_yearly_columns_data')
 def get_yearly_columns_data(cursor, config, year_filter=None,
                              start_date=None, end_date=None):
     src_clause, params = _build_source_filter(config)
@@ -480,9 +1124,7 @@ def get_yearly_columns_data(cursor, config, year_filter=None,
         FROM metal_prices mp
         WHERE {src_clause}
     """
-    if year_filter:
-        query += " AND EXTRACT(YEAR FROM price_date) = %s"
-        params.append(year_filter)
+    query, params = _apply_period_filter(query, params, year_filter)
     query, params = _apply_date_filter(query, params, start_date=start_date, end_date=end_date)
     query += " GROUP BY EXTRACT(YEAR FROM price_date), EXTRACT(MONTH FROM price_date), metal_type ORDER BY month, year DESC"
     cursor.execute(query, params)
@@ -506,6 +1148,7 @@ def get_yearly_columns_data(cursor, config, year_filter=None,
         'format': 'yearly_columns',
     }
 
+@query_label('get_comex_data')
 def get_comex_data(cursor, config, start_date=None, end_date=None,
                    year_filter=None, month_filter=None):
     src_clause, params = _build_source_filter(config)
@@ -518,12 +1161,7 @@ def get_comex_data(cursor, config, start_date=None, end_date=None,
         FROM metal_prices mp
         WHERE {src_clause}
     """
-    if year_filter:
-        query += " AND EXTRACT(YEAR FROM price_date) = %s"
-        params.append(year_filter)
-    if month_filter:
-        query += " AND EXTRACT(MONTH FROM price_date) = %s"
-        params.append(month_filter)
+    query, params = _apply_period_filter(query, params, year_filter, month_filter)
     if start_date:
         query += " AND price_date >= %s"
         params.append(start_date)
@@ -550,7 +1188,9 @@ def get_comex_data(cursor, config, start_date=None, end_date=None,
         })
     return result
 
-def get_standard_data(cursor, config, start_date=None, end_date=None, metal_type=None):
+@query_label('get_standard_data')
+def get_standard_data(cursor, config, start_date=None, end_date=None, metal_type=None,
+                      freq=None, agg=None):
     src_clause, params = _build_source_filter(config)
     query = f"""
         SELECT price_date, metal_type, price, currency, unit, source_url
@@ -568,29 +1208,357 @@ def get_standard_data(cursor, config, start_date=None, end_date=None, metal_type
     if metal_type and metal_type != 'all':
         query += " AND metal_type = %s"
         params.append(metal_type)
+    if freq:
+        query = resample_query(query, ('metal_type', 'currency', 'unit', 'source_url'), freq, agg)
     query += " ORDER BY price_date DESC, metal_type"
     cursor.execute(query, params)
     return [_serialize_metals_row(r) for r in cursor.fetchall()]
 
+# ===============================
+# TABLE latest_prices — PRIX COURANTS MAINTENUS
+# ===============================
+# Prix courant + précédent par (metal_type, source) et compteurs de tables,
+# tenus à jour par un trigger à l'ingestion et reconstruits par le scheduler.
+# /api/prices/latest et /api/statistics deviennent des lectures par clé primaire
+# au lieu d'un ROW_NUMBER() sur tout l'historique de metal_prices.
+# Le schéma (DDL, trigger, premier remplissage) est posé au démarrage par le
+# leader du scheduler ; les workers vérifient seulement qu'il est en place.
+LATEST_PRICES_REFRESH_MINUTES = 15
+LATEST_PRICES_RETRY_SECONDS   = 60    # nouvelle vérification après un échec
+
+LATEST_PRICES_SCHEMA_SQL = """
+SELECT pg_advisory_xact_lock(hashtext('latest_prices_schema'));
+
+CREATE TABLE IF NOT EXISTS latest_prices (
+    metal_type          TEXT        NOT NULL,
+    source              TEXT        NOT NULL,
+    price_id            BIGINT      NOT NULL,
+    price               NUMERIC,
+    currency            TEXT,
+    price_date          DATE        NOT NULL,
+    created_at          TIMESTAMPTZ,
+    previous_price_id   BIGINT,
+    previous_price      NUMERIC,
+    previous_price_date DATE,
+    previous_created_at TIMESTAMPTZ,
+    updated_at          TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (metal_type, source)
+);
+
+CREATE TABLE IF NOT EXISTS table_counts (
+    table_name  TEXT        PRIMARY KEY,
+    row_count   BIGINT      NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Trigger par instruction (table de transition) : le compteur table_counts
+-- n'est mis à jour qu'une fois par INSERT, pas une fois par ligne, et les
+-- lignes latest_prices sont verrouillées dans un ordre stable.
+CREATE OR REPLACE FUNCTION latest_prices_on_insert_rows() RETURNS trigger AS $$
+DECLARE
+    n   BIGINT;
+    r   RECORD;
+    cur latest_prices%ROWTYPE;
+BEGIN
+    SELECT COUNT(*) INTO n FROM new_rows;
+    IF n = 0 THEN
+        RETURN NULL;
+    END IF;
+    INSERT INTO table_counts (table_name, row_count) VALUES ('metal_prices', n)
+    ON CONFLICT (table_name) DO UPDATE
+        SET row_count = table_counts.row_count + EXCLUDED.row_count, updated_at = NOW();
+
+    FOR r IN
+        SELECT id, metal_type, COALESCE(source_url, source_product_name, '') AS src,
+               price, currency, price_date, created_at
+        FROM new_rows
+        WHERE metal_type IS NOT NULL AND price_date IS NOT NULL
+        ORDER BY 2, 3, price_date, created_at NULLS FIRST, id
+    LOOP
+        SELECT * INTO cur FROM latest_prices
+        WHERE metal_type = r.metal_type AND source = r.src
+        FOR UPDATE;
+
+        IF NOT FOUND THEN
+            INSERT INTO latest_prices (metal_type, source, price_id, price, currency, price_date, created_at)
+            VALUES (r.metal_type, r.src, r.id, r.price, r.currency, r.price_date, r.created_at)
+            ON CONFLICT (metal_type, source) DO NOTHING;
+        ELSIF (r.price_date, COALESCE(r.created_at, '-infinity'), r.id)
+            > (cur.price_date, COALESCE(cur.created_at, '-infinity'), cur.price_id) THEN
+            UPDATE latest_prices SET
+                previous_price_id   = cur.price_id,
+                previous_price      = cur.price,
+                previous_price_date = cur.price_date,
+                previous_created_at = cur.created_at,
+                price_id   = r.id,
+                price      = r.price,
+                currency   = r.currency,
+                price_date = r.price_date,
+                created_at = r.created_at,
+                updated_at = NOW()
+            WHERE metal_type = r.metal_type AND source = r.src;
+        ELSIF cur.previous_price_id IS NULL
+           OR (r.price_date, COALESCE(r.created_at, '-infinity'), r.id)
+            > (cur.previous_price_date, COALESCE(cur.previous_created_at, '-infinity'), cur.previous_price_id) THEN
+            UPDATE latest_prices SET
+                previous_price_id   = r.id,
+                previous_price      = r.price,
+                previous_price_date = r.price_date,
+                previous_created_at = r.created_at,
+                updated_at = NOW()
+            WHERE metal_type = r.metal_type AND source = r.src;
+        END IF;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    -- Ancien trigger FOR EACH ROW (une mise à jour de table_counts par ligne)
+    IF EXISTS (
+        SELECT 1 FROM pg_trigger
+        WHERE tgname = 'trg_latest_prices' AND tgrelid = 'metal_prices'::regclass
+    ) THEN
+        DROP TRIGGER trg_latest_prices ON metal_prices;
+        DROP FUNCTION IF EXISTS latest_prices_on_insert();
+    END IF;
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_trigger
+        WHERE tgname = 'trg_latest_prices_rows' AND tgrelid = 'metal_prices'::regclass
+    ) THEN
+        CREATE TRIGGER trg_latest_prices_rows AFTER INSERT ON metal_prices
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION latest_prices_on_insert_rows();
+    END IF;
+END $$;
+"""
+
+_latest_prices_state = {'ready': False, 'checked_at': None}
+_latest_prices_lock = threading.Lock()
+
+@query_label('latest_prices_ready')
+def latest_prices_ready():
+    """
+    Vrai si latest_prices et son trigger sont en place (posés par
+    migrate_latest_prices). Seul le succès est mémorisé : une absence ou une
+    erreur passagère est revérifiée après LATEST_PRICES_RETRY_SECONDS, les
+    lectures retombant entre-temps sur les requêtes historiques.
+    """
+    with _latest_prices_lock:
+        if _latest_prices_state['ready']:
+            return True
+        checked_at = _latest_prices_state['checked_at']
+        if checked_at is not None and time.monotonic() - checked_at < LATEST_PRICES_RETRY_SECONDS:
+            return False
+        _latest_prices_state['checked_at'] = time.monotonic()
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT EXISTS (
+                    SELECT 1 FROM pg_trigger
+                    WHERE tgname = 'trg_latest_prices_rows' AND tgrelid = 'metal_prices'::regclass
+                )
+            """)
+            ready = cur.fetchone()[0]
+        if ready:
+            with _latest_prices_lock:
+                _latest_prices_state['ready'] = True
+        return ready
+    except Exception as e:
+        logger.warning(f"latest_prices indisponible, repli sur metal_prices: {e}")
+        return False
+    finally:
+        conn.close()
+
+@query_label('migrate_latest_prices')
+def migrate_latest_prices():
+    """
+    Crée latest_prices / table_counts et le trigger d'ingestion, et remplit la
+    table à sa création, dans une seule transaction : les lecteurs ne voient
+    jamais une table vide. Appelé au démarrage (leader du scheduler).
+    """
+    conn = get_db_connection(statement_timeout_ms=0)
+    if not conn:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('latest_prices_schema'))")
+            cur.execute("SELECT to_regclass('latest_prices') IS NULL")
+            needs_refresh = cur.fetchone()[0]
+            cur.execute(LATEST_PRICES_SCHEMA_SQL)
+            if needs_refresh:
+                rebuild_latest_prices(cur)
+        conn.commit()
+        logger.info(f"✅ Schéma latest_prices en place{' (table remplie)' if needs_refresh else ''}")
+        return True
+    except Exception as e:
+        conn.rollback()
+        logger.warning(f"Migration latest_prices impossible, repli sur metal_prices: {e}")
+        return False
+    finally:
+        conn.close()
+
+def rebuild_latest_prices(cur):
+    """Recalcule latest_prices et table_counts depuis metal_prices (transaction de l'appelant)."""
+    # Bloque les triggers d'ingestion concurrents le temps de la reconstruction
+    cur.execute("LOCK TABLE latest_prices IN SHARE ROW EXCLUSIVE MODE")
+    cur.execute("DELETE FROM latest_prices")
+    cur.execute("""
+        WITH R AS (
+            SELECT id, metal_type,
+                   COALESCE(source_url, source_product_name, '') AS source,
+                   price, currency, price_date, created_at,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY metal_type, COALESCE(source_url, source_product_name, '')
+                       ORDER BY price_date DESC, created_at DESC NULLS LAST, id DESC
+                   ) AS rn
+            FROM metal_prices
+            WHERE metal_type IS NOT NULL AND price_date IS NOT NULL
+        )
+        INSERT INTO latest_prices (
+            metal_type, source, price_id, price, currency, price_date, created_at,
+            previous_price_id, previous_price, previous_price_date, previous_created_at
+        )
+        SELECT l.metal_type, l.source, l.id, l.price, l.currency, l.price_date, l.created_at,
+               p.id, p.price, p.price_date, p.created_at
+        FROM R l
+        LEFT JOIN R p ON p.metal_type = l.metal_type AND p.source = l.source AND p.rn = 2
+        WHERE l.rn = 1
+    """)
+    cur.execute("""
+        INSERT INTO table_counts (table_name, row_count)
+        SELECT 'metal_prices', COUNT(*) FROM metal_prices
+        ON CONFLICT (table_name) DO UPDATE
+            SET row_count = EXCLUDED.row_count, updated_at = NOW()
+    """)
+
+@query_label('refresh_latest_prices')
+def refresh_latest_prices():
+    """
+    Reconstruit latest_prices et table_counts depuis metal_prices.
+    Rattrape ce que le trigger ne voit pas (UPDATE/DELETE, chargements hors trigger).
+    """
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        with conn.cursor() as cur:
+            rebuild_latest_prices(cur)
+        conn.commit()
+        logger.info("✅ latest_prices reconstruite")
+        return True
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erreur refresh_latest_prices: {e}")
+        return False
+    finally:
+        conn.close()
+
+# ===============================
+# INDEX DE PERFORMANCE
+# ===============================
+# Index attendus par les requêtes des onglets (cf. tests/test_query_plans.py).
+# Le filtre source `source_url ILIKE '%motif%'` n'est indexable que par un GIN
+# trigrammes : si pg_trgm ne peut pas être installé, les autres index restent créés.
+# Un CREATE INDEX CONCURRENTLY interrompu (deadlock, timeout) laisse un index
+# INVALID que IF NOT EXISTS ne reconstruirait jamais : il est supprimé avant.
+PERFORMANCE_INDEXES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_metal_prices_price_date "
+    "ON metal_prices (price_date)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_metal_prices_metal_date "
+    "ON metal_prices (metal_type, price_date)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_metal_prices_product_date "
+    "ON metal_prices (source_product_name, price_date)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_metal_prices_created_at "
+    "ON metal_prices (created_at)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_metal_prices_source_url_trgm "
+    "ON metal_prices USING gin (source_url gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ecb_rates_ref_date "
+    "ON ecb_exchange_rates (ref_date)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ecb_rates_quote_date "
+    "ON ecb_exchange_rates (quote_currency, ref_date)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ecb_rates_created_at "
+    "ON ecb_exchange_rates (created_at)",
+]
+
+_INDEX_NAME = re.compile(r"CREATE INDEX CONCURRENTLY IF NOT EXISTS (\w+)")
+
+def drop_invalid_index(cur, index_name):
+    """Supprime un index laissé INVALID par une construction concurrente échouée."""
+    cur.execute("""
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND c.relnamespace = 'public'::regnamespace AND NOT i.indisvalid
+    """, (index_name,))
+    if cur.fetchone():
+        logger.warning(f"Index {index_name} INVALID (construction interrompue) : reconstruction")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+@query_label('ensure_performance_indexes')
+def ensure_performance_indexes():
+    """Crée les index manquants (CONCURRENTLY : n'empêche pas l'ingestion)."""
+    conn = get_db_connection(statement_timeout_ms=0)
+    if not conn:
+        return False
+    created = True
+    try:
+        conn.set_session(autocommit=True)
+        with conn.cursor() as cur:
+            for statement in PERFORMANCE_INDEXES_SQL:
+                try:
+                    index_name = _INDEX_NAME.search(statement)
+                    if index_name:
+                        drop_invalid_index(cur, index_name.group(1))
+                    cur.execute(statement)
+                except Exception as e:
+                    created = False
+                    logger.warning(f"Index non créé ({statement.split(' ON ')[0]}): {e}")
+        return created
+    finally:
+        conn.set_session(autocommit=False)
+        conn.close()
+
 # ===============================
 # FONCTIONS GÉNÉRALES
 # ===============================
+@single_flight
+@query_label('get_latest_prices')
 def get_latest_prices():
+    use_table = latest_prices_ready()
     conn = get_db_connection()
     if not conn:
         return []
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                WITH latest_prices AS (
-                    SELECT id, metal_type,
-                        ROW_NUMBER() OVER (PARTITION BY metal_type ORDER BY price_date DESC, created_at DESC) AS rn
-                    FROM metal_prices
-                )
-                SELECT p.* FROM metal_prices p JOIN latest_prices lp ON p.id = lp.id WHERE lp.rn = 1
-                ORDER BY p.metal_type;
-            """)
+            if use_table:
+                # Dernier prix par métal, toutes sources confondues, puis lecture PK
+                cur.execute("""
+                    SELECT p.*
+                    FROM (
+                        SELECT DISTINCT ON (metal_type) price_id
+                        FROM latest_prices
+                        ORDER BY metal_type, price_date DESC, created_at DESC NULLS LAST, price_id DESC
+                    ) lp
+                    JOIN metal_prices p ON p.id = lp.price_id
+                    ORDER BY p.metal_type;
+                """)
+            else:
+                cur.execute("""
+                    WITH latest_prices AS (
+                        SELECT id, metal_type,
+                            ROW_NUMBER() OVER (PARTITION BY metal_type ORDER BY price_date DESC, created_at DESC) AS rn
+                        FROM metal_prices
+                    )
+                    SELECT p.* FROM metal_prices p JOIN latest_prices lp ON p.id = lp.id WHERE lp.rn = 1
+                    ORDER BY p.metal_type;
+                """)
             return cur.fetchall()
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur get_latest_prices: {e}")
         return []
@@ -600,7 +1568,23 @@ def get_latest_prices():
 # ==============================================================
 # ✅ MODIFIÉ: get_price_history — ajout du paramètre `source`
 # ==============================================================
-def get_price_history(days=None, metal_type=None, start_date=None, end_date=None, month=None, source=None):
+# Marge de recouvrement des deltas `since` : une ligne insérée par une
+# transaction ouverte avant le watermark porte un created_at antérieur.
+HISTORY_DELTA_OVERLAP_SECONDS = 300
+
+def utc_naive(value):
+    """
+    Horodatage comparable à metal_prices.created_at (TIMESTAMP sans fuseau,
+    en UTC) : un datetime avec fuseau est ramené en UTC, un naïf est supposé UTC.
+    """
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+@single_flight
+@query_label('get_price_history')
+def get_price_history(days=None, metal_type=None, start_date=None, end_date=None, month=None, source=None,
+                      since=None, freq=None, agg=None):
     """
     Récupère l'historique des prix avec filtres :
       - days        : nb de jours en arrière
@@ -609,6 +1593,8 @@ def get_price_history(days=None, metal_type=None, start_date=None, end_date=None
       - end_date    : date de fin   'YYYY-MM-DD'
       - month       : mois au format 'YYYY-MM' (prioritaire sur start/end si présent)
       - source      : filtre sur source_url ILIKE '%source%' (ex: 'shmet', 'metals.dev')
+      - since       : watermark (datetime) — seulement les lignes ajoutées depuis
+      - freq, agg   : rééchantillonnage (resample_query), une ligne par série et par période
     """
     conn = get_db_connection()
     if not conn:
@@ -616,11 +1602,16 @@ def get_price_history(days=None, metal_type=None, start_date=None, end_date=None
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             query = """
-                SELECT metal_type, price, currency, unit, source_url, price_date, created_at
+                SELECT id, metal_type, price, currency, unit, source_url, price_date, created_at
                 FROM metal_prices WHERE 1=1
             """
             params = []
 
+            # --- Delta depuis le watermark (idx_metal_prices_created_at) ---
+            if since:
+                query += " AND created_at > %s"
+                params.append(since - timedelta(seconds=HISTORY_DELTA_OVERLAP_SECONDS))
+
             # --- Filtre temporel ---
             if month and not start_date and not end_date:
                 sd, ed = month_to_range(month)
@@ -654,9 +1645,16 @@ def get_price_history(days=None, metal_type=None, start_date=None, end_date=None
                 query += " AND source_url ILIKE %s"
                 params.append(f'%{source}%')
 
-            query += " ORDER BY metal_type, price_date DESC, created_at DESC"
+            if freq:
+                query = resample_query(query, ('metal_type', 'source_url', 'currency', 'unit'),
+                                       freq, agg, tiebreak=('created_at', 'id'))
+                query += " ORDER BY metal_type, price_date DESC, source_url"
+            else:
+                query += " ORDER BY metal_type, price_date DESC, created_at DESC"
             cur.execute(query, params)
             return cur.fetchall()
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur get_price_history: {e}")
         import traceback
@@ -665,29 +1663,65 @@ def get_price_history(days=None, metal_type=None, start_date=None, end_date=None
     finally:
         conn.close()
 
+@single_flight
+@query_label('get_statistics')
 def get_statistics():
     """
     FIX: Sérialise les Decimal → float pour éviter les crashes JSON.
+    Lit latest_prices / table_counts quand disponibles.
     """
+    use_table = latest_prices_ready()
     conn = get_db_connection()
     if not conn:
         return {'total_records': 0, 'total_metals': 0, 'variations': []}
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT COUNT(*) AS total_records, COUNT(DISTINCT metal_type) AS total_metals
-                FROM metal_prices;
-            """)
-            summary = cur.fetchone()
-            cur.execute("""
-                WITH R AS (
-                    SELECT metal_type, price, currency, price_date, created_at,
-                        ROW_NUMBER() OVER (
-                            PARTITION BY metal_type
-                            ORDER BY price_date DESC, created_at DESC
-                        ) AS rn
-                    FROM metal_prices
-                )
+            if use_table:
+                cur.execute("""
+                    SELECT
+                        COALESCE((SELECT row_count FROM table_counts WHERE table_name = 'metal_prices'), 0)
+                            AS total_records,
+                        (SELECT COUNT(DISTINCT metal_type) FROM latest_prices) AS total_metals;
+                """)
+                summary = cur.fetchone()
+                # Les 2 derniers prix d'un métal sont forcément parmi les
+                # (courant, précédent) de chacune de ses sources.
+                ranked_source = """
+                    WITH C AS (
+                        SELECT metal_type, price, currency, price_date, created_at, price_id AS id
+                        FROM latest_prices
+                        UNION ALL
+                        SELECT metal_type, previous_price, currency, previous_price_date,
+                               previous_created_at, previous_price_id
+                        FROM latest_prices
+                        WHERE previous_price_id IS NOT NULL
+                    ),
+                    R AS (
+                        SELECT metal_type, price, currency, price_date, created_at,
+                            ROW_NUMBER() OVER (
+                                PARTITION BY metal_type
+                                ORDER BY price_date DESC, created_at DESC NULLS LAST, id DESC
+                            ) AS rn
+                        FROM C
+                    )
+                """
+            else:
+                cur.execute("""
+                    SELECT COUNT(*) AS total_records, COUNT(DISTINCT metal_type) AS total_metals
+                    FROM metal_prices;
+                """)
+                summary = cur.fetchone()
+                ranked_source = """
+                    WITH R AS (
+                        SELECT metal_type, price, currency, price_date, created_at,
+                            ROW_NUMBER() OVER (
+                                PARTITION BY metal_type
+                                ORDER BY price_date DESC, created_at DESC
+                            ) AS rn
+                        FROM metal_prices
+                    )
+                """
+            cur.execute(ranked_source + """
                 SELECT
                     l.metal_type,
                     l.price          AS current_price,
@@ -711,6 +1745,8 @@ def get_statistics():
                 'total_metals':  int(summary['total_metals']),
                 'variations':    variations,
             }
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur get_statistics: {e}")
         import traceback
@@ -722,42 +1758,60 @@ def get_statistics():
 # ===============================
 # API DYNAMIQUE: METAL TYPES
 # ===============================
+@query_label('get_all_metal_types')
 def get_all_metal_types():
+    use_table = latest_prices_ready()
     conn = get_db_connection()
     if not conn:
         return []
     try:
         with conn.cursor() as cur:
-            cur.execute("""
-                SELECT DISTINCT metal_type FROM metal_prices
+            cur.execute(f"""
+                SELECT DISTINCT metal_type FROM {'latest_prices' if use_table else 'metal_prices'}
                 WHERE metal_type IS NOT NULL
                 ORDER BY metal_type;
             """)
             return [row[0] for row in cur.fetchall()]
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur get_all_metal_types: {e}")
         return []
     finally:
         conn.close()
 
+@query_label('get_all_sources')
 def get_all_sources():
+    use_table = latest_prices_ready()
     conn = get_db_connection()
     if not conn:
         return []
     try:
         with conn.cursor() as cur:
-            cur.execute("""
-                SELECT DISTINCT source_url FROM metal_prices
-                WHERE source_url IS NOT NULL
-                ORDER BY source_url;
-            """)
+            if use_table:
+                # Une ligne latest_prices par (métal, source) → quelques lectures PK
+                cur.execute("""
+                    SELECT DISTINCT p.source_url
+                    FROM latest_prices lp JOIN metal_prices p ON p.id = lp.price_id
+                    WHERE p.source_url IS NOT NULL
+                    ORDER BY p.source_url;
+                """)
+            else:
+                cur.execute("""
+                    SELECT DISTINCT source_url FROM metal_prices
+                    WHERE source_url IS NOT NULL
+                    ORDER BY source_url;
+                """)
             return [row[0] for row in cur.fetchall()]
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur get_all_sources: {e}")
         return []
     finally:
         conn.close()
 
+@query_label('get_all_fx_currencies')
 def get_all_fx_currencies():
     conn = get_db_connection()
     if not conn:
@@ -770,12 +1824,15 @@ def get_all_fx_currencies():
                 ORDER BY quote_currency;
             """)
             return [row[0] for row in cur.fetchall()]
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur get_all_fx_currencies: {e}")
         return []
     finally:
         conn.close()
 
+@query_label('get_price_date_range')
 def get_price_date_range():
     conn = get_db_connection()
     if not conn:
@@ -785,12 +1842,15 @@ def get_price_date_range():
             cur.execute("SELECT MIN(price_date)::text, MAX(price_date)::text FROM metal_prices;")
             row = cur.fetchone()
             return {'min_date': row[0], 'max_date': row[1]}
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur get_price_date_range: {e}")
         return {}
     finally:
         conn.close()
 
+@query_label('get_fx_date_range')
 def get_fx_date_range():
     conn = get_db_connection()
     if not conn:
@@ -800,6 +1860,8 @@ def get_fx_date_range():
             cur.execute("SELECT MIN(ref_date)::text, MAX(ref_date)::text FROM ecb_exchange_rates;")
             row = cur.fetchone()
             return {'min_date': row[0], 'max_date': row[1]}
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur get_fx_date_range: {e}")
         return {}
@@ -807,81 +1869,823 @@ def get_fx_date_range():
         conn.close()
 
 # ===============================
-# ECB / FX FUNCTIONS
+# VERSION DES DONNÉES + CACHE DES DIMENSIONS
 # ===============================
-def get_ecb_rates(start_date=None, end_date=None, quote_currency=None, month=None):
-    conn = get_db_connection()
-    if not conn:
-        return []
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            query = """
-                SELECT
-                    ref_date,
-                    base_currency,
-                    quote_currency,
-                    rate,
-                    source_url,
-                    metadata
-                FROM ecb_exchange_rates
-                WHERE 1=1
-            """
-            params = []
-            if month:
-                sd, ed = month_to_range(month)
-                if sd and ed:
-                    query += " AND ref_date >= %s AND ref_date <= %s"
-                    params.extend([sd, ed])
-            else:
-                if start_date:
-                    try:
-                        sd = datetime.strptime(start_date, "%Y-%m-%d").date()
-                        query += " AND ref_date >= %s"
-                        params.append(sd)
-                    except ValueError:
-                        pass
-                if end_date:
-                    try:
-                        ed = datetime.strptime(end_date, "%Y-%m-%d").date()
-                        query += " AND ref_date <= %s"
-                        params.append(ed)
-                    except ValueError:
-                        pass
-                if not start_date and not end_date:
-                    query += " AND ref_date >= %s"
-                    params.append(datetime.now().date() - timedelta(days=365))
+# Les listes des filtres (métaux, sources, devises, bornes de dates) ne changent
+# qu'après une ingestion. On les garde en mémoire par worker tant que la
+# version des données ne bouge pas.
+# MAX(id) ne voit que les insertions : un trigger par instruction compte aussi
+# les UPDATE / DELETE / TRUNCATE de chaque table dans data_changes (rewrite_seq
+# à part : ils invalident les deltas `since`). La date du jour fait partie de
+# la version, pour les vues à fenêtre relative (« 1 an »).
+DATA_VERSION_TTL_SECONDS = 30
+DATA_CHANGES_TABLES = ('metal_prices', 'ecb_exchange_rates', 'fx_budget_rates')
+
+DATA_CHANGES_SCHEMA_SQL = """
+SELECT pg_advisory_xact_lock(hashtext('data_changes_schema'));
+
+CREATE TABLE IF NOT EXISTS data_changes (
+    table_name  TEXT        PRIMARY KEY,
+    change_seq  BIGINT      NOT NULL DEFAULT 0,
+    changed_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+ALTER TABLE data_changes ADD COLUMN IF NOT EXISTS rewrite_seq BIGINT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION data_changes_bump() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO data_changes (table_name, change_seq, rewrite_seq)
+    VALUES (TG_TABLE_NAME, 1, CASE WHEN TG_OP = 'INSERT' THEN 0 ELSE 1 END)
+    ON CONFLICT (table_name) DO UPDATE
+        SET change_seq  = data_changes.change_seq + 1,
+            rewrite_seq = data_changes.rewrite_seq + EXCLUDED.rewrite_seq,
+            changed_at  = NOW();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY %(tables)s LOOP
+        IF to_regclass(t) IS NOT NULL AND NOT EXISTS (
+            SELECT 1 FROM pg_trigger WHERE tgname = 'trg_data_changes' AND tgrelid = to_regclass(t)
+        ) THEN
+            EXECUTE format(
+                'CREATE TRIGGER trg_data_changes AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %%I '
+                'FOR EACH STATEMENT EXECUTE FUNCTION data_changes_bump()', t);
+        END IF;
+    END LOOP;
+END $$;
+"""
 
-            if quote_currency and quote_currency.lower() != 'all':
-                query += " AND quote_currency = %s"
-                params.append(quote_currency.upper())
+_data_version = {'value': None, 'checked_at': 0.0, 'price_revision': None}
+_data_version_lock = threading.Lock()
 
-            query += " ORDER BY ref_date DESC, quote_currency ASC"
-            cur.execute(query, params)
-            return cur.fetchall()
+_dimension_cache = {'version': None, 'values': {}}
+_dimension_cache_lock = threading.Lock()
+
+_data_changes_ready = [False]
+
+@query_label('migrate_data_changes')
+def migrate_data_changes():
+    """Pose data_changes et ses triggers (démarrage, leader du scheduler)."""
+    conn = get_db_connection(statement_timeout_ms=0)
+    if not conn:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute(DATA_CHANGES_SCHEMA_SQL, {'tables': list(DATA_CHANGES_TABLES)})
+        conn.commit()
+        return True
     except Exception as e:
-        logger.error(f"Erreur get_ecb_rates: {e}")
-        return []
+        conn.rollback()
+        logger.warning(f"data_changes indisponible, version des données sur MAX(id) seul: {e}")
+        return False
     finally:
         conn.close()
 
-def get_florent_report_data(year, month):
+@query_label('get_data_version')
+def get_data_version():
+    """
+    Jeton qui change dès qu'un sync, un prix ou un taux ECB est ajouté, corrigé
+    ou supprimé, et chaque jour. Vérifié au plus toutes les
+    DATA_VERSION_TTL_SECONDS par process.
+    """
+    with _data_version_lock:
+        if (_data_version['value'] is not None and
+                time.monotonic() - _data_version['checked_at'] < DATA_VERSION_TTL_SECONDS):
+            return _data_version['value']
+    return poll_data_version()
+
+@query_label('get_data_version')
+def poll_data_version():
+    """Relit la version en base, sans TTL (et rafraîchit celle de get_data_version)."""
     conn = get_db_connection()
     if not conn:
-        return []
+        return _data_version['value']
+    try:
+        with conn.cursor() as cur:
+            if not _data_changes_ready[0]:
+                # Schéma courant (rewrite_seq) posé par migrate_data_changes()
+                cur.execute("""
+                    SELECT EXISTS (SELECT FROM information_schema.columns
+                                   WHERE table_schema = 'public' AND table_name = 'data_changes'
+                                     AND column_name = 'rewrite_seq')
+                """)
+                _data_changes_ready[0] = cur.fetchone()[0]
+            changes = """
+                (SELECT COALESCE(SUM(change_seq) FILTER (WHERE table_name <> 'ecb_exchange_rates'), 0)
+                 FROM data_changes),
+                (SELECT COALESCE(SUM(change_seq) FILTER (WHERE table_name = 'ecb_exchange_rates'), 0)
+                 FROM data_changes),
+                (SELECT rewrite_seq FROM data_changes WHERE table_name = 'metal_prices')
+            """ if _data_changes_ready[0] else "0, 0, NULL"
+            cur.execute(f"""
+                SELECT (SELECT MAX(id) FROM sync_logs),
+                       (SELECT MAX(id) FROM metal_prices),
+                       (SELECT MAX(ref_date) FROM ecb_exchange_rates),
+                       {changes},
+                       CURRENT_DATE;
+            """)
+            sync_id, price_id, fx_date, price_changes, fx_changes, price_revision, today = cur.fetchone()
+        # La partie ECB reste en dernier (« -f… ») : get_fx_engine() ne recharge que sur elle
+        version = (f"s{sync_id or 0}-p{price_id or 0}.{price_changes}-d{today.isoformat()}"
+                   f"-f{fx_date.isoformat() if fx_date else 0}.{fx_changes}")
+        with _data_version_lock:
+            _data_version['value'] = version
+            _data_version['checked_at'] = time.monotonic()
+            # Sans data_changes, aucune correction n'est visible : pas de révision
+            _data_version['price_revision'] = (price_revision or 0) if _data_changes_ready[0] else None
+        return version
+    except Exception as e:
+        logger.error(f"Erreur get_data_version: {e}")
+        return _data_version['value']
+    finally:
+        conn.close()
 
-    has_budget_table = table_exists(conn, 'fx_budget_rates')
+def get_price_revision():
+    """
+    Nombre d'UPDATE / DELETE / TRUNCATE sur metal_prices (même TTL que la
+    version) : un delta `since` n'est valable qu'à révision inchangée. None si
+    data_changes est indisponible.
+    """
+    get_data_version()
+    with _data_version_lock:
+        return _data_version['price_revision']
+
+def get_cached_dimension(name, loader):
+    """Retourne loader() depuis le cache du worker, invalidé au changement de version."""
+    version = get_data_version()
+    if version is None:
+        return loader()
+    with _dimension_cache_lock:
+        if _dimension_cache['version'] != version:
+            _dimension_cache['version'] = version
+            _dimension_cache['values'] = {}
+        if name in _dimension_cache['values']:
+            record_cache_access('dimensions', True)
+            return _dimension_cache['values'][name]
+    record_cache_access('dimensions', False)
+    value = loader()
+    # Les loaders renvoient []/{} en cas d'erreur : on ne met pas ça en cache
+    if value:
+        with _dimension_cache_lock:
+            if _dimension_cache['version'] == version:
+                _dimension_cache['values'][name] = value
+    return value
+
+DIMENSION_LOADERS = {
+    'metal_types':       get_all_metal_types,
+    'sources':           get_all_sources,
+    'fx_currencies':     get_all_fx_currencies,
+    'metals_date_range': get_price_date_range,
+    'fx_date_range':     get_fx_date_range,
+}
 
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            if has_budget_table:
-                budget_join = "LEFT JOIN fx_budget_rates br ON md.quote_currency = br.currency AND br.year = %(year_budget)s"
-                budget_select = ", br.budget_rate"
-            else:
-                budget_join = ""
-                budget_select = ", NULL::numeric AS budget_rate"
+def get_bootstrap_dimensions():
+    get_data_version()   # une seule vérification de version pour toutes les listes
+    return run_concurrently({
+        name: functools.partial(get_cached_dimension, name, loader)
+        for name, loader in DIMENSION_LOADERS.items()
+    })
 
-            query = f"""
-            WITH MonthlyData AS (
+# ===============================
+# CACHE DE RÉPONSES PARTAGÉ
+# ===============================
+# Les vues les plus ouvertes (onglets du workbook, synthèse, FX du mois,
+# derniers prix) sont stockées en JSON dans response_cache, commun à tous les
+# workers et instances, et indexées par la version des données. Le job
+# cache_warm du scheduler les recalcule dès qu'un nouveau sync apparaît :
+# le premier utilisateur ne paie plus les requêtes à froid.
+CACHE_WARM_INTERVAL_MINUTES = int(os.environ.get('CACHE_WARM_INTERVAL_MINUTES', 2))
+# À incrémenter quand la forme d'une réponse mise en cache change : les corps
+# écrits par l'ancienne version du code ne sont plus servis après déploiement
+RESPONSE_CACHE_REVISION = 3
+
+RESPONSE_CACHE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS response_cache (
+    cache_key    TEXT        PRIMARY KEY,
+    data_version TEXT        NOT NULL,
+    body         TEXT        NOT NULL,
+    compute_ms   NUMERIC,
+    computed_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+"""
+
+_response_cache_ready = None
+_response_memo = {'version': None, 'bodies': {}}
+_response_memo_lock = threading.Lock()
+
+def ensure_response_cache_table():
+    """Crée response_cache si besoin ; False si la DB refuse (pas de cache partagé)."""
+    global _response_cache_ready
+    if _response_cache_ready is not None:
+        return _response_cache_ready
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute(RESPONSE_CACHE_SCHEMA_SQL)
+        conn.commit()
+        _response_cache_ready = True
+    except Exception as e:
+        conn.rollback()
+        logger.warning(f"response_cache indisponible: {e}")
+        _response_cache_ready = False
+    finally:
+        conn.close()
+    return _response_cache_ready
+
+@query_label('response_cache')
+def read_cached_response(key, version):
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT body FROM response_cache WHERE cache_key = %s AND data_version = %s",
+                        (key, version))
+            row = cur.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logger.warning(f"Lecture response_cache [{key}]: {e}")
+        return None
+    finally:
+        conn.close()
+
+@query_label('response_cache')
+def store_cached_response(key, version, body, elapsed):
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO response_cache (cache_key, data_version, body, compute_ms)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (cache_key) DO UPDATE
+                    SET data_version = EXCLUDED.data_version, body = EXCLUDED.body,
+                        compute_ms = EXCLUDED.compute_ms, computed_at = NOW()
+            """, (key, version, body, round(elapsed * 1000, 1)))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.warning(f"Écriture response_cache [{key}]: {e}")
+    finally:
+        conn.close()
+
+def cached_response(key, builder, refresh=False):
+    """
+    Corps JSON de builder() pour la version courante des données : mémoire du
+    worker, puis response_cache, puis calcul (et écriture dans les deux).
+    builder renvoie un dict, ou None pour une réponse à ne pas mettre en cache.
+    refresh=True force le recalcul (préchauffage).
+    """
+    version = get_data_version()
+    if version is None or not ensure_response_cache_table():
+        payload = builder()
+        return dump_json_body(payload) if payload is not None else None
+    version = f"r{RESPONSE_CACHE_REVISION}-{version}"
+    if not refresh:
+        with _response_memo_lock:
+            if _response_memo['version'] != version:
+                _response_memo['version'] = version
+                _response_memo['bodies'] = {}
+            body = _response_memo['bodies'].get(key)
+        if body is None:
+            body = read_cached_response(key, version)
+        record_cache_access('responses', body is not None)
+        if body is not None:
+            with _response_memo_lock:
+                if _response_memo['version'] == version:
+                    _response_memo['bodies'][key] = body
+            return body
+    started = time.perf_counter()
+    payload = builder()
+    if payload is None:
+        return None
+    body = dump_json_body(payload)
+    store_cached_response(key, version, body, time.perf_counter() - started)
+    with _response_memo_lock:
+        if _response_memo['version'] == version:
+            _response_memo['bodies'][key] = body
+    return body
+
+def dump_json_body(payload):
+    # Même sérialisation compacte que jsonify()
+    return app.json.dumps(payload, separators=(',', ':'))
+
+def json_body_response(body):
+    return app.response_class(body, mimetype='application/json')
+
+def warm_response_cache():
+    """Recalcule les vues chaudes pour la version courante ; retourne le nombre de vues écrites."""
+    this_year = datetime.now().year
+
+    def fx_summary_builder():
+        payload = build_monthly_fx_summary_payload()
+        return payload if payload['data'] else None
+
+    targets = {}
+    for sheet_id in METALS_SOURCE_CONFIGS:
+        # Sans filtre (vue par défaut du workbook), année courante et précédente
+        for year in (None, this_year, this_year - 1):
+            targets[sheet_cache_key(sheet_id, year)] = functools.partial(get_sheet_payload, sheet_id, year)
+    for months in (12, 24, 36):
+        targets[f"summary:{months}"] = functools.partial(build_metals_summary, months)
+    targets[fx_summary_cache_key()] = fx_summary_builder
+    targets['prices_latest'] = build_latest_prices_payload
+
+    warmed = 0
+    for key, builder in targets.items():
+        try:
+            if cached_response(key, builder, refresh=True) is not None:
+                warmed += 1
+        except Exception as e:
+            logger.warning(f"Préchauffage {key} impossible: {e}")
+    return warmed
+
+# ===============================
+# MOTEUR FX AS-OF (CONVERSIONS JOURNALIÈRES)
+# ===============================
+# La BCE ne publie pas les week-ends ni les jours fériés TARGET, alors que
+# des prix existent ces jours-là. Le moteur garde en mémoire, par devise, les
+# dates et taux triés et convertit des vecteurs entiers : pour chaque date,
+# dernier taux publié à cette date ou avant (forward fill), par recherche
+# dichotomique (numpy.searchsorted). Rechargé quand la version des données change.
+# Toutes les paires X/Y se déduisent des taux EUR/X et EUR/Y (triangulation).
+FX_ASOF_MAX_DAYS = 7   # au-delà, pas de taux (date future ou trou de données)
+
+class FxEngine:
+    """Taux ECB EUR → devise (1 EUR = rate devise), recherchés à une date donnée."""
+
+    def __init__(self, rows):
+        import numpy as np
+        self.np = np
+        by_currency = {}
+        for currency, ref_date, rate in rows:
+            dates, rates = by_currency.setdefault(currency, ([], []))
+            dates.append(ref_date)
+            rates.append(rate)
+        self.series = {
+            currency: (np.asarray(dates, dtype='datetime64[D]'), np.asarray(rates, dtype=float))
+            for currency, (dates, rates) in by_currency.items()
+        }
+
+    def __len__(self):
+        return len(self.series)
+
+    @property
+    def currencies(self):
+        return ['EUR'] + sorted(self.series)
+
+    def _asof(self, currency, dates):
+        """(index du fixing retenu, masque des dates couvertes) pour une devise connue."""
+        np = self.np
+        ref_dates = self.series[currency][0]
+        idx = np.searchsorted(ref_dates, dates, side='right') - 1
+        found = (idx >= 0) & ~np.isnat(dates)   # NaT est trié en fin de série
+        idx = idx.clip(0)
+        stale = (dates - ref_dates[idx]) > np.timedelta64(FX_ASOF_MAX_DAYS, 'D')
+        return idx, found & ~stale
+
+    def rates_asof(self, currency, dates):
+        """Taux EUR → currency en vigueur à chaque date (NaN si aucun)."""
+        np = self.np
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        if currency == 'EUR':
+            return np.ones(dates.shape)
+        if currency not in self.series:
+            return np.full(dates.shape, np.nan)
+        idx, ok = self._asof(currency, dates)
+        return np.where(ok, self.series[currency][1][idx], np.nan)
+
+    def fixing_dates(self, currency, dates):
+        """Date du fixing ECB retenu pour chaque date (NaT pour EUR ou sans taux)."""
+        np = self.np
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        if currency not in self.series:
+            return np.full(dates.shape, np.datetime64('NaT'), dtype='datetime64[D]')
+        idx, ok = self._asof(currency, dates)
+        return np.where(ok, self.series[currency][0][idx], np.datetime64('NaT'))
+
+    def cross_rates(self, base, quote, dates):
+        """Unités de quote pour 1 base à chaque date (EUR/quote ÷ EUR/base)."""
+        if base == quote:
+            return self.np.ones(self.np.shape(dates))
+        return self.rates_asof(quote, dates) / self.rates_asof(base, dates)
+
+    def monthly_average(self, currency, periods):
+        """Moyenne des fixings EUR → devise publiés dans chaque mois 'YYYY-MM' (NaN si aucun)."""
+        np = self.np
+        months = np.asarray(periods, dtype='datetime64[M]')
+        if currency == 'EUR':
+            return np.ones(months.shape)
+        if currency not in self.series:
+            return np.full(months.shape, np.nan)
+        ref_dates, rates = self.series[currency]
+        cumulative = np.concatenate(([0.0], np.cumsum(rates)))
+        lo = np.searchsorted(ref_dates, months.astype('datetime64[D]'), side='left')
+        hi = np.searchsorted(ref_dates, (months + 1).astype('datetime64[D]'), side='left')
+        counts = hi - lo
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, (cumulative[hi] - cumulative[lo]) / counts, np.nan)
+
+    def monthly_cross_rates(self, base, quote, periods):
+        """
+        {période: unités de quote pour 1 base} sur les moyennes mensuelles des
+        fixings (convention du tableau de synthèse) ; mois sans fixing omis.
+        """
+        rates = self.monthly_average(quote, periods) / self.monthly_average(base, periods)
+        return {p: r for p, r in zip(periods, rates.tolist()) if r == r and r != 0}
+
+    def to_eur(self, amounts, dates, currency):
+        return self.np.asarray(amounts, dtype=float) / self.rates_asof(currency, dates)
+
+    def convert(self, amounts, dates, from_currency, to_currency):
+        return self.np.asarray(amounts, dtype=float) * self.cross_rates(from_currency, to_currency, dates)
+
+@query_label('load_fx_engine')
+def load_fx_engine():
+    if not NUMPY_AVAILABLE:
+        return None
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT DISTINCT ON (quote_currency, ref_date) quote_currency, ref_date, rate
+                FROM ecb_exchange_rates
+                WHERE quote_currency IS NOT NULL AND rate IS NOT NULL AND rate > 0
+                  AND COALESCE(base_currency, 'EUR') = 'EUR'
+                ORDER BY quote_currency, ref_date, created_at DESC NULLS LAST
+            """)
+            return FxEngine(cur.fetchall())
+    except QueryCanceled:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur load_fx_engine: {e}")
+        return None
+    finally:
+        conn.close()
+
+_fx_engine = {'fx_version': None, 'engine': None}
+_fx_engine_lock = threading.Lock()
+
+def get_fx_engine():
+    """Moteur FX du worker (None sans numpy ou sans base), rechargé à l'arrivée de nouveaux taux."""
+    version = get_data_version()
+    # Seule la partie ECB de la version compte : un nouveau prix ne recharge pas les taux
+    fx_version = version.rpartition('-f')[2] if version else None
+    with _fx_engine_lock:
+        if _fx_engine['engine'] is not None and _fx_engine['fx_version'] == fx_version:
+            record_cache_access('fx_engine', True)
+            return _fx_engine['engine']
+    record_cache_access('fx_engine', False)
+    engine = load_fx_engine()
+    if engine:
+        with _fx_engine_lock:
+            _fx_engine['fx_version'] = fx_version
+            _fx_engine['engine'] = engine
+    return engine
+
+def fx_engine_missing(engine):
+    """
+    Vrai si le moteur FX manque alors qu'il devrait exister (numpy présent) :
+    taux ECB momentanément illisibles. Un payload calculé sans lui ne doit pas
+    être mis en cache pour toute la version des données.
+    """
+    return engine is None and NUMPY_AVAILABLE
+
+def add_eur_column(rows, amount_key='price', date_key='price_date',
+                   currency_key='currency', out_key='price_eur', engine=None):
+    """Ajoute à chaque ligne son montant en EUR au taux ECB du jour (forward fill)."""
+    if not rows:
+        return rows
+    engine = engine or get_fx_engine()
+    by_currency = {}
+    for i, row in enumerate(rows):
+        row[out_key] = None
+        if row.get(amount_key) is not None and row.get(date_key) and row.get(currency_key):
+            by_currency.setdefault(row[currency_key], []).append(i)
+    if not engine:
+        return rows
+    for currency, idx in by_currency.items():
+        converted = engine.to_eur([rows[i][amount_key] for i in idx],
+                                  [str(rows[i][date_key])[:10] for i in idx], currency)
+        for i, value in zip(idx, converted.tolist()):
+            rows[i][out_key] = None if value != value else round(value, 6)   # NaN → None
+    return rows
+
+# ──────────────────────────────────────────
+# CONVERSION EN LOT
+# ──────────────────────────────────────────
+FX_CONVERT_MAX_ROWS   = int(os.environ.get('FX_CONVERT_MAX_ROWS', 500000))
+FX_CONVERT_CHUNK_ROWS = 10000
+FX_CONVERT_COLUMNS    = ('amount', 'currency', 'date', 'target')
+FX_CONVERT_OUTPUT     = FX_CONVERT_COLUMNS + ('rate', 'converted', 'rate_date', 'error')
+FX_CONVERT_ALIASES    = {'montant': 'amount', 'devise': 'currency', 'cible': 'target'}
+FX_CONVERT_ERRORS     = {1: 'montant invalide', 2: 'date invalide', 3: 'devise inconnue', 4: 'aucun taux à cette date'}
+
+class FxBatch:
+    """Lot à convertir, en colonnes ; devises normalisées une fois par valeur distincte."""
+
+    def __init__(self, amounts, currencies, dates, targets, default_target='EUR'):
+        self.amounts, self.dates = amounts, dates
+        default_target = str(default_target).strip().upper() or 'EUR'
+        try:
+            self.currencies = self._normalize(currencies, '')
+            self.targets = self._normalize(targets, default_target)
+        except TypeError:
+            raise ValueError('Devise invalide (texte attendu)')
+
+    @staticmethod
+    def _normalize(values, default):
+        names = {v: str(v if v is not None else '').strip().upper() or default for v in set(values)}
+        return [names[v] for v in values]
+
+    def __len__(self):
+        return len(self.amounts)
+
+def parse_fx_amount(value):
+    """Montant d'une ligne (NaN si illisible) ; accepte 1 234,56 et 1,234.56."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    text = str(value if value is not None else '').replace('\u00a0', '').replace(' ', '')
+    if ',' in text:
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    try:
+        return float(text)
+    except ValueError:
+        return float('nan')
+
+def parse_fx_amounts(np, values):
+    """Montants du lot en float (NaN si illisible) : d'un bloc, sinon ligne à ligne."""
+    if not any(isinstance(v, bool) for v in values):   # numpy lirait true comme 1.0
+        try:
+            return np.asarray(values, dtype=float)
+        except (ValueError, TypeError):
+            pass
+    return np.fromiter((parse_fx_amount(v) for v in values), dtype=float, count=len(values))
+
+FX_DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+def parse_fx_dates(np, values):
+    """
+    Dates du lot en datetime64[D] (NaT si illisible). Seuls AAAA-MM-JJ et
+    JJ/MM/AAAA sont acceptés : numpy lirait 20240607 comme l'an 20240607 et
+    « 2024 » comme le 1er janvier. Lot tout ISO : d'un bloc, sinon ligne à ligne.
+    """
+    if all(isinstance(v, str) and len(v) == 10 and v[4] == '-' and v[7] == '-' for v in values):
+        try:
+            return np.asarray(values, dtype='datetime64[D]')
+        except ValueError:
+            pass
+    parsed = {}   # un lot répète peu de dates distinctes : strptime une fois par valeur
+    for value in values:
+        if isinstance(value, str) and value not in parsed:
+            parsed[value] = np.datetime64('NaT')
+            for fmt in FX_DATE_FORMATS:
+                try:
+                    parsed[value] = np.datetime64(datetime.strptime(value.strip(), fmt).date())
+                    break
+                except ValueError:
+                    pass
+    nat = np.datetime64('NaT')
+    return np.array([parsed.get(v, nat) if isinstance(v, str) else nat for v in values],
+                    dtype='datetime64[D]')
+
+def read_fx_csv(text, default_target='EUR'):
+    """Lot depuis un CSV (',', ';' ou tabulation), avec ou sans ligne d'en-tête."""
+    first_line = text.split('\n', 1)[0]
+    delimiter = ';' if ';' in first_line else '\t' if '\t' in first_line else ','
+    rows = [row for row in csv.reader(StringIO(text), delimiter=delimiter) if row]
+    names = [FX_CONVERT_ALIASES.get(h.strip().lower(), h.strip().lower()) for h in rows[0]] if rows else []
+    if 'amount' in names:
+        positions = [names.index(c) if c in names else None for c in FX_CONVERT_COLUMNS]
+        rows = rows[1:]
+    else:
+        positions = [0, 1, 2, 3]   # pas d'en-tête : la première ligne est une donnée
+    columns = [[row[p] if p is not None and p < len(row) else None for row in rows] for p in positions]
+    return FxBatch(*columns, default_target=default_target)
+
+def read_fx_json(payload, default_target='EUR'):
+    """Lot depuis une liste de lignes : objets ou [amount, currency, date, target]."""
+    if isinstance(payload, dict):
+        payload = payload.get('rows')
+    if not isinstance(payload, list):
+        raise ValueError('Liste de lignes attendue (ou {"rows": [...]})')
+    if all(isinstance(row, dict) for row in payload):
+        columns = [[row.get(c) for row in payload] for c in FX_CONVERT_COLUMNS]
+    elif all(isinstance(row, (list, tuple)) for row in payload):
+        columns = [[row[i] if i < len(row) else None for row in payload] for i in range(4)]
+    else:
+        raise ValueError('Lignes attendues : toutes des objets ou toutes des listes')
+    return FxBatch(*columns, default_target=default_target)
+
+def convert_fx_batch(engine, batch):
+    """
+    Convertit tout le lot en une passe vectorielle sur les séries préchargées :
+    chaque devise n'est recherchée (as-of) que pour ses lignes, le taux croisé
+    est le quotient des deux jambes EUR.
+    """
+    np = engine.np
+    n = len(batch)
+    amounts = parse_fx_amounts(np, batch.amounts)
+    dates = parse_fx_dates(np, batch.dates)
+
+    codes = {c: i for i, c in enumerate(set(batch.currencies) | set(batch.targets))}
+    base_codes = np.fromiter((codes[c] for c in batch.currencies), dtype=np.int32, count=n)
+    quote_codes = np.fromiter((codes[c] for c in batch.targets), dtype=np.int32, count=n)
+    known = set(engine.currencies)
+
+    base_rate, quote_rate = np.full(n, np.nan), np.full(n, np.nan)
+    base_fix = np.full(n, np.datetime64('NaT'), dtype='datetime64[D]')
+    quote_fix = base_fix.copy()
+    unknown = np.zeros(n, dtype=bool)
+    for currency, code in codes.items():
+        for leg_codes, rate, fix in ((base_codes, base_rate, base_fix), (quote_codes, quote_rate, quote_fix)):
+            rows = np.flatnonzero(leg_codes == code)
+            if not len(rows):
+                continue
+            if currency not in known:
+                unknown[rows] = True
+                continue
+            rate[rows] = engine.rates_asof(currency, dates[rows])
+            fix[rows] = engine.fixing_dates(currency, dates[rows])
+
+    rates = np.where(base_codes == quote_codes, 1.0, quote_rate / base_rate)
+    errors = np.select(
+        [~np.isfinite(amounts), np.isnat(dates), unknown, ~np.isfinite(rates)],
+        [1, 2, 3, 4], default=0)
+    rates[errors > 0] = np.nan
+    base_fix[errors > 0] = quote_fix[errors > 0] = np.datetime64('NaT')
+    return {
+        'amounts':    amounts,
+        'dates':      dates,
+        'rates':      rates,
+        'converted':  amounts * rates,
+        'rate_dates': np.fmin(base_fix, quote_fix),   # fixing le plus ancien des deux jambes
+        'errors':     errors,
+    }
+
+def csv_field(value):
+    """Champ CSV, entre guillemets seulement s'il contient un séparateur."""
+    if any(ch in value for ch in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+def fx_convert_columns(np, batch, result, fmt):
+    """
+    Colonnes de sortie déjà encodées en texte JSON ou CSV. Taux et dates ne
+    prennent que quelques valeurs distinctes par lot : chacune est formatée une
+    seule fois puis recopiée par indexation.
+    """
+    as_json = fmt == 'json'
+    null = 'null' if as_json else ''
+    quote = json.dumps if as_json else csv_field
+
+    def numbers(values):
+        return [null if v != v else repr(v) for v in values.tolist()]
+
+    def days(values):
+        return [null if d == 'NaT' else (f'"{d}"' if as_json else d)
+                for d in np.datetime_as_string(values).tolist()]
+
+    def distinct(values, encode):
+        uniques, inverse = np.unique(values, return_inverse=True)
+        encoded = encode(uniques)
+        return [encoded[i] for i in inverse.ravel().tolist()]
+
+    def echo_invalid(column, invalid, raw):
+        for i in np.flatnonzero(invalid).tolist():   # illisible : renvoyé tel que reçu
+            column[i] = quote(str(raw[i]))
+        return column
+
+    names = {c: quote(c) for c in set(batch.currencies) | set(batch.targets)}
+    messages = {code: quote(message) for code, message in FX_CONVERT_ERRORS.items()}
+    return (
+        echo_invalid(numbers(np.round(result['amounts'], 12)), ~np.isfinite(result['amounts']), batch.amounts),
+        [names[c] for c in batch.currencies],
+        echo_invalid(distinct(result['dates'], days), np.isnat(result['dates']), batch.dates),
+        [names[c] for c in batch.targets],
+        distinct(np.round(result['rates'], 8), numbers),
+        numbers(np.round(result['converted'], 6)),
+        distinct(result['rate_dates'], days),
+        [messages.get(e, null) for e in result['errors'].tolist()],
+    )
+
+def fx_convert_stream(np, batch, result, fmt):
+    """Sérialise le lot converti par tranches de FX_CONVERT_CHUNK_ROWS lignes (CSV ou JSON)."""
+    columns = fx_convert_columns(np, batch, result, fmt)
+    n = len(batch)
+    failed = int((result['errors'] > 0).sum())
+    if fmt == 'csv':
+        yield ','.join(FX_CONVERT_OUTPUT) + '\r\n'
+    else:
+        yield f'{{"status":"success","count":{n},"failed":{failed},"data":['
+    template = '{' + ','.join(f'"{c}":%s' for c in FX_CONVERT_OUTPUT) + '}'
+    for start in range(0, n, FX_CONVERT_CHUNK_ROWS):
+        chunk = zip(*(column[start:start + FX_CONVERT_CHUNK_ROWS] for column in columns))
+        if fmt == 'csv':
+            yield '\r\n'.join(map(','.join, chunk)) + '\r\n'
+        else:
+            yield (',' if start else '') + ','.join(map(template.__mod__, chunk))
+    if fmt != 'csv':
+        yield ']}'
+
+# ===============================
+# ECB / FX FUNCTIONS
+# ===============================
+@single_flight
+@query_label('get_ecb_rates')
+def get_ecb_rates(start_date=None, end_date=None, quote_currency=None, month=None,
+                  freq=None, agg=None):
+    conn = get_db_connection()
+    if not conn:
+        return []
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            query = """
+                SELECT
+                    ref_date,
+                    base_currency,
+                    quote_currency,
+                    rate,
+                    source_url,
+                    metadata
+                FROM ecb_exchange_rates
+                WHERE 1=1
+            """
+            params = []
+            if month:
+                sd, ed = month_to_range(month)
+                if sd and ed:
+                    query += " AND ref_date >= %s AND ref_date <= %s"
+                    params.extend([sd, ed])
+            else:
+                if start_date:
+                    try:
+                        sd = datetime.strptime(start_date, "%Y-%m-%d").date()
+                        query += " AND ref_date >= %s"
+                        params.append(sd)
+                    except ValueError:
+                        pass
+                if end_date:
+                    try:
+                        ed = datetime.strptime(end_date, "%Y-%m-%d").date()
+                        query += " AND ref_date <= %s"
+                        params.append(ed)
+                    except ValueError:
+                        pass
+                if not start_date and not end_date:
+                    query += " AND ref_date >= %s"
+                    params.append(datetime.now().date() - timedelta(days=365))
+
+            if quote_currency and quote_currency.lower() != 'all':
+                query += " AND quote_currency = %s"
+                params.append(quote_currency.upper())
+
+            if freq:
+                query = resample_query(query, ('base_currency', 'quote_currency'), freq, agg,
+                                       date_col='ref_date', value_col='rate')
+            query += " ORDER BY ref_date DESC, quote_currency ASC"
+            cur.execute(query, params)
+            return cur.fetchall()
+    except QueryCanceled:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur get_ecb_rates: {e}")
+        return []
+    finally:
+        conn.close()
+
+@single_flight
+@query_label('get_florent_report_data')
+def get_florent_report_data(year, month):
+    conn = get_db_connection()
+    if not conn:
+        return []
+
+    has_budget_table = table_exists(conn, 'fx_budget_rates')
+
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if has_budget_table:
+                budget_join = "LEFT JOIN fx_budget_rates br ON md.quote_currency = br.currency AND br.year = %(year_budget)s"
+                budget_select = ", br.budget_rate"
+            else:
+                budget_join = ""
+                budget_select = ", NULL::numeric AS budget_rate"
+
+            query = f"""
+            WITH MonthlyData AS (
                 SELECT
                     quote_currency,
                     rate,
@@ -946,6 +2750,8 @@ def get_florent_report_data(year, month):
             rows = cur.fetchall()
             return [serialize_row(r) for r in rows]
 
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur get_florent_report_data: {e}")
         import traceback
@@ -954,6 +2760,8 @@ def get_florent_report_data(year, month):
     finally:
         conn.close()
 
+@single_flight
+@query_label('get_monthly_fx_summary')
 def get_monthly_fx_summary(year=None, month=None, quote_currency=None):
     conn = get_db_connection()
     if not conn:
@@ -1046,6 +2854,8 @@ def get_monthly_fx_summary(year=None, month=None, quote_currency=None):
             rows = cur.fetchall()
             return [serialize_row(r) for r in rows]
 
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur get_monthly_fx_summary: {e}")
         import traceback
@@ -1054,6 +2864,7 @@ def get_monthly_fx_summary(year=None, month=None, quote_currency=None):
     finally:
         conn.close()
 
+@query_label('get_sync_logs')
 def get_sync_logs(limit=10):
     conn = get_db_connection()
     if not conn:
@@ -1066,6 +2877,8 @@ def get_sync_logs(limit=10):
                 FROM sync_logs ORDER BY created_at DESC LIMIT %s;
             """, (limit,))
             return cur.fetchall()
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur get_sync_logs: {e}")
         return []
@@ -1179,12 +2992,13 @@ def send_budget_rate_email(year, recipient_email=BUDGET_OWNER_EMAIL, test_mode=F
         form_url = f"https://avo-exmetrics.azurewebsites.net/budget-form/{token}"
         email_html = get_email_html_template(year, form_url, token)
         if MAIL_AVAILABLE:
+            from flask_mail import Message
             msg = Message(
                 subject=f"[ACTION REQUISE] Budget FX Rates {year}",
                 recipients=[recipient_email],
                 html=email_html
             )
-            mail.send(msg)
+            get_mail().send(msg)
         logger.info(f"✅ Email Budget Rate {year} envoyé à {recipient_email}")
         return True
     except Exception as e:
@@ -1206,12 +3020,13 @@ def budget_form(token):
     year = token_data['year']
     existing_rates = {}
     conn = get_db_connection()
-    if conn and table_exists(conn, 'fx_budget_rates'):
+    if conn:
         try:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT currency, budget_rate FROM fx_budget_rates WHERE year = %s", (year,))
-                for row in cur.fetchall():
-                    existing_rates[row['currency']] = float(row['budget_rate'])
+            if table_exists(conn, 'fx_budget_rates'):
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute("SELECT currency, budget_rate FROM fx_budget_rates WHERE year = %s", (year,))
+                    for row in cur.fetchall():
+                        existing_rates[row['currency']] = float(row['budget_rate'])
         except Exception as e:
             logger.error(f"Erreur récupération taux existants: {e}")
         finally:
@@ -1259,9 +3074,620 @@ def submit_budget_rates():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 # ==============================
-# CRON SCHEDULER
+# ALERTES — RÈGLES ÉVALUÉES APRÈS CHAQUE SYNC
+# ==============================
+# Règles stockées dans alert_rules, évaluées par le scheduler sur les seules
+# lignes ingérées depuis le dernier watermark (created_at, par table) : le
+# coût suit le volume du sync, pas la taille de l'historique. Le point
+# précédent de chaque série est lu par index (LATERAL … LIMIT 1).
+#   - price_move   : variation d'un jour coté à l'autre au-delà de threshold %
+#   - price_level  : franchissement du niveau threshold (devise de la source)
+#   - fx_vs_budget : franchissement de l'écart threshold % au budget_rate de l'année
+# Un événement par (règle, série, jour) grâce à UNIQUE (rule_id, dedup_key) ;
+# les événements non notifiés partent par mail au passage suivant.
+ALERTS_INTERVAL_MINUTES = int(os.environ.get('ALERTS_INTERVAL_MINUTES', 2))
+ALERTS_OVERLAP_SECONDS  = HISTORY_DELTA_OVERLAP_SECONDS   # transactions validées après un sync plus récent
+ALERTS_NOTIFY_MAX_AGE   = timedelta(days=1)              # au-delà, un événement n'est plus envoyé
+ALERT_KINDS             = ('price_move', 'price_level', 'fx_vs_budget')
+ALERT_DIRECTIONS        = ('up', 'down', 'both')
+ALERT_DEFAULT_RECIPIENTS = [e.strip() for e in os.environ.get('ALERT_RECIPIENTS', BUDGET_OWNER_EMAIL).split(',')
+                            if e.strip()]
+
+ALERTS_SCHEMA_SQL = """
+SELECT pg_advisory_xact_lock(hashtext('alerts_schema'));
+
+CREATE TABLE IF NOT EXISTS alert_rules (
+    id             SERIAL      PRIMARY KEY,
+    name           TEXT        NOT NULL,
+    kind           TEXT        NOT NULL,
+    metal_type     TEXT,
+    sheet_id       TEXT,
+    quote_currency TEXT,
+    threshold      NUMERIC     NOT NULL,
+    direction      TEXT        NOT NULL DEFAULT 'both',
+    recipients     TEXT[]      NOT NULL DEFAULT '{}',
+    enabled        BOOLEAN     NOT NULL DEFAULT TRUE,
+    created_at     TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS alert_events (
+    id          BIGSERIAL   PRIMARY KEY,
+    rule_id     INTEGER     NOT NULL REFERENCES alert_rules (id) ON DELETE CASCADE,
+    dedup_key   TEXT        NOT NULL,
+    observed_on DATE,
+    value       NUMERIC,
+    reference   NUMERIC,
+    change_pct  NUMERIC,
+    message     TEXT        NOT NULL,
+    notified_at TIMESTAMPTZ,
+    created_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE (rule_id, dedup_key)
+);
+CREATE INDEX IF NOT EXISTS idx_alert_events_pending ON alert_events (created_at) WHERE notified_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS alert_watermarks (
+    source_table TEXT        PRIMARY KEY,
+    watermark    TIMESTAMPTZ NOT NULL,
+    updated_at   TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+DO $$
+BEGIN
+    -- Première version de la table : watermark en TIMESTAMP sans fuseau
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'alert_watermarks' AND column_name = 'watermark'
+          AND data_type = 'timestamp without time zone'
+    ) THEN
+        ALTER TABLE alert_watermarks ALTER COLUMN watermark TYPE TIMESTAMPTZ;
+    END IF;
+END $$;
+"""
+
+_alert_tables_ready = None
+
+def ensure_alert_tables():
+    """Crée les tables d'alertes si besoin ; False si la DB refuse."""
+    global _alert_tables_ready
+    if _alert_tables_ready is not None:
+        return _alert_tables_ready
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute(ALERTS_SCHEMA_SQL)
+        conn.commit()
+        _alert_tables_ready = True
+    except Exception as e:
+        conn.rollback()
+        logger.warning(f"Tables d'alertes indisponibles: {e}")
+        _alert_tables_ready = False
+    finally:
+        conn.close()
+    return _alert_tables_ready
+
+def validate_alert_rule(data):
+    """Règle normalisée depuis le JSON reçu ; ValueError si incomplète."""
+    if not isinstance(data, dict):
+        raise ValueError('Objet JSON attendu')
+    kind = data.get('kind')
+    if kind not in ALERT_KINDS:
+        raise ValueError(f"kind : {' | '.join(ALERT_KINDS)}")
+    direction = data.get('direction', 'both')
+    if direction not in ALERT_DIRECTIONS:
+        raise ValueError(f"direction : {' | '.join(ALERT_DIRECTIONS)}")
+    try:
+        if isinstance(data['threshold'], bool):
+            raise TypeError
+        threshold = float(data['threshold'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('threshold numérique requis')
+    if not 0 < threshold < float('inf'):   # NaN compris
+        raise ValueError('threshold doit être positif')
+    recipients = data.get('recipients') or ALERT_DEFAULT_RECIPIENTS
+    if not isinstance(recipients, list) or not all(isinstance(r, str) and '@' in r for r in recipients):
+        raise ValueError('recipients : liste d\'adresses email')
+    rule = {'name': str(data.get('name') or '').strip(), 'kind': kind, 'threshold': threshold,
+            'direction': direction, 'recipients': recipients,
+            'metal_type': None, 'sheet_id': None, 'quote_currency': None}
+    if kind == 'fx_vs_budget':
+        rule['quote_currency'] = str(data.get('quote_currency') or '').strip().upper()
+        if len(rule['quote_currency']) != 3:
+            raise ValueError('quote_currency requis (ex. CNY)')
+    else:
+        rule['sheet_id'] = data.get('sheet_id', 'lme')
+        rule['metal_type'] = str(data.get('metal_type') or '').strip().lower()
+        config = METALS_SOURCE_CONFIGS.get(rule['sheet_id']) if isinstance(rule['sheet_id'], str) else None
+        if not config or rule['metal_type'] not in config['metal_types']:
+            raise ValueError('metal_type / sheet_id : métal coté par la source (cf. METALS_SOURCE_CONFIGS)')
+    if not rule['name']:
+        raise ValueError('name requis')
+    return rule
+
+def alert_change_pct(value, reference):
+    """Variation en % ; arrondie pour qu'un mouvement d'exactement threshold % ne dépende pas du flottant."""
+    return round((value / reference - 1) * 100, 9)
+
+def alert_direction_matches(direction, change, limit):
+    if direction == 'up':
+        return change > limit
+    if direction == 'down':
+        return change < -limit
+    return abs(change) > limit
+
+def check_price_rule(rule, row):
+    """Événement d'une règle price_* pour un prix ingéré (None si pas déclenchée)."""
+    price, previous = row['price'], row['prev_price']
+    if not previous:
+        return None
+    threshold = float(rule['threshold'])
+    change = alert_change_pct(price, previous)
+    series = f"{rule['metal_type']} {METALS_SOURCE_CONFIGS[rule['sheet_id']]['name']}"
+    if rule['kind'] == 'price_move':
+        if not alert_direction_matches(rule['direction'], change, threshold):
+            return None
+        message = (f"{series} : {change / 100:+.2%} le {row['price_date']} "
+                   f"({previous:,.2f} → {price:,.2f} {row['currency'] or ''})")
+    else:
+        # Au-dessus = strictement supérieur au seuil : toucher le seuil puis repartir
+        # du même côté ne déclenche rien
+        up = previous <= threshold < price and rule['direction'] in ('up', 'both')
+        down = previous > threshold >= price and rule['direction'] in ('down', 'both')
+        if not (up or down):
+            return None
+        message = (f"{series} : {price:,.2f} {row['currency'] or ''} le {row['price_date']}, "
+                   f"{'au-dessus' if up else 'en dessous'} du seuil {threshold:,.2f}")
+    return {'rule_id': rule['id'], 'dedup_key': f"{row['source']}|{row['price_date']}",
+            'observed_on': row['price_date'], 'value': price, 'reference': previous,
+            'change_pct': round(change, 4), 'message': message}
+
+def check_fx_rule(rule, row):
+    """Événement fx_vs_budget : l'écart au budget franchit threshold % (None sinon)."""
+    budget = row['budget_rate']
+    if not budget:
+        return None
+    limit = float(rule['threshold'])
+    deviation = alert_change_pct(row['rate'], budget)
+    if not alert_direction_matches(rule['direction'], deviation, limit):
+        return None
+    if row['prev_rate'] and alert_direction_matches(rule['direction'],
+                                                    alert_change_pct(row['prev_rate'], budget), limit):
+        return None   # déjà au-delà au fixing précédent
+    return {'rule_id': rule['id'], 'dedup_key': f"{row['quote_currency']}|{row['ref_date']}",
+            'observed_on': row['ref_date'], 'value': row['rate'], 'reference': budget,
+            'change_pct': round(deviation, 4),
+            'message': (f"EUR/{row['quote_currency']} {row['rate']:.4f} le {row['ref_date']} : "
+                        f"{deviation / 100:+.2%} vs budget {budget:.4f}")}
+
+def evaluate_price_rules(cur, rules, since, until):
+    events, groups = [], {}
+    for rule in rules:
+        groups.setdefault((rule['sheet_id'], rule['metal_type']), []).append(rule)
+    for (sheet_id, metal_type), group in groups.items():
+        src_clause, params = _build_source_filter(METALS_SOURCE_CONFIGS[sheet_id], alias='n')
+        cur.execute(f"""
+            SELECT COALESCE(n.source_url, n.source_product_name, '') AS source,
+                   n.price::float8 AS price, n.price_date, n.currency,
+                   prev.price::float8 AS prev_price
+            FROM metal_prices n
+            LEFT JOIN LATERAL (
+                SELECT p.price FROM metal_prices p
+                WHERE p.metal_type = n.metal_type AND p.price_date < n.price_date
+                  AND p.source_url IS NOT DISTINCT FROM n.source_url
+                  AND p.source_product_name IS NOT DISTINCT FROM n.source_product_name
+                  AND p.price IS NOT NULL
+                ORDER BY p.price_date DESC, p.created_at DESC NULLS LAST
+                LIMIT 1
+            ) prev ON TRUE
+            WHERE n.created_at > %s AND n.created_at <= %s
+              AND n.metal_type = %s AND {src_clause} AND n.price IS NOT NULL
+            ORDER BY n.price_date, n.created_at
+        """, [since, until, metal_type] + params)
+        for row in cur.fetchall():
+            events.extend(e for e in (check_price_rule(rule, row) for rule in group) if e)
+    return events
+
+def evaluate_fx_rules(cur, rules, since, until):
+    if not table_exists(cur.connection, 'fx_budget_rates'):
+        return []
+    cur.execute("""
+        SELECT n.quote_currency, n.rate::float8 AS rate, n.ref_date,
+               br.budget_rate::float8 AS budget_rate, prev.rate::float8 AS prev_rate
+        FROM ecb_exchange_rates n
+        JOIN fx_budget_rates br
+          ON br.currency = n.quote_currency AND br.year = EXTRACT(YEAR FROM n.ref_date)::INTEGER
+        LEFT JOIN LATERAL (
+            SELECT p.rate FROM ecb_exchange_rates p
+            WHERE p.quote_currency = n.quote_currency AND p.ref_date < n.ref_date
+              AND COALESCE(p.base_currency, 'EUR') = 'EUR' AND p.rate IS NOT NULL
+            ORDER BY p.ref_date DESC
+            LIMIT 1
+        ) prev ON TRUE
+        WHERE n.created_at > %s AND n.created_at <= %s
+          AND n.quote_currency = ANY(%s)
+          AND COALESCE(n.base_currency, 'EUR') = 'EUR' AND n.rate IS NOT NULL
+        ORDER BY n.ref_date
+    """, (since, until, sorted({r['quote_currency'] for r in rules})))
+    events = []
+    for row in cur.fetchall():
+        for rule in rules:
+            if rule['quote_currency'] == row['quote_currency']:
+                event = check_fx_rule(rule, row)
+                if event:
+                    events.append(event)
+    return events
+
+# (table surveillée, types de règles, évaluation incrémentale)
+ALERT_SOURCES = (
+    ('metal_prices',       ('price_move', 'price_level'), evaluate_price_rules),
+    ('ecb_exchange_rates', ('fx_vs_budget',),             evaluate_fx_rules),
+)
+
+def advance_alert_watermark(cur, table):
+    """
+    (depuis, jusqu'à) à évaluer pour la table, et watermark avancé à la plus
+    récente ligne ; None si rien de nouveau. Premier passage : le watermark est
+    posé sur l'existant, les règles ne regardent que ce qui arrive ensuite.
+    """
+    cur.execute("SELECT watermark FROM alert_watermarks WHERE source_table = %s", (table,))
+    row = cur.fetchone()
+    watermark = row['watermark'] if row else None
+    if watermark is None:
+        cur.execute(f"SELECT MAX(created_at) AS latest FROM {table}")
+    else:
+        cur.execute(f"SELECT MAX(created_at) AS latest FROM {table} WHERE created_at > %s", (watermark,))
+    latest = cur.fetchone()['latest']
+    if latest is None:
+        return None
+    cur.execute("""
+        INSERT INTO alert_watermarks (source_table, watermark) VALUES (%s, %s)
+        ON CONFLICT (source_table) DO UPDATE SET watermark = EXCLUDED.watermark, updated_at = NOW()
+    """, (table, latest))
+    if watermark is None:
+        return None
+    return watermark - timedelta(seconds=ALERTS_OVERLAP_SECONDS), latest
+
+@query_label('evaluate_alerts')
+def evaluate_alerts():
+    """Évalue les règles actives sur les lignes ingérées depuis le watermark ; nb d'événements créés."""
+    if not ensure_alert_tables():
+        return 0
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT * FROM alert_rules WHERE enabled")
+            rules = cur.fetchall()
+            events = []
+            for table, kinds, evaluate in ALERT_SOURCES:
+                # Le watermark avance même sans règle : une règle créée plus tard
+                # ne rejoue pas l'historique
+                window = advance_alert_watermark(cur, table)
+                table_rules = [r for r in rules if r['kind'] in kinds]
+                if window and table_rules:
+                    events.extend(evaluate(cur, table_rules, *window))
+            created = 0
+            for event in events:
+                cur.execute("""
+                    INSERT INTO alert_events (rule_id, dedup_key, observed_on, value, reference, change_pct, message)
+                    VALUES (%(rule_id)s, %(dedup_key)s, %(observed_on)s, %(value)s, %(reference)s,
+                            %(change_pct)s, %(message)s)
+                    ON CONFLICT (rule_id, dedup_key) DO NOTHING
+                """, event)
+                created += cur.rowcount
+        # Watermarks et événements dans la même transaction : un échec rejoue le lot
+        conn.commit()
+        return created
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def get_alert_email_html(rule_name, events):
+    # Nom de règle et messages viennent de l'API : échappés avant d'entrer dans le HTML
+    rows = ''.join(
+        f"<tr><td>{html.escape(str(e['observed_on']))}</td><td>{html.escape(e['message'])}</td></tr>"
+        for e in events
+    )
+    return f"""
+    <div style="font-family: Arial, sans-serif;">
+        <h3>🔔 {html.escape(rule_name)}</h3>
+        <table cellpadding="6" style="border-collapse: collapse;">{rows}</table>
+        <p style="color:#888;font-size:12px;">LME Dashboard — alertes automatiques</p>
+    </div>
+    """
+
+@query_label('notify_alert_events')
+def notify_alert_events():
+    """
+    Envoie les événements pas encore notifiés (un mail par règle) et les marque ;
+    un envoi en échec reste en attente pour le passage suivant.
+    """
+    if not MAIL_AVAILABLE or not ensure_alert_tables():
+        return 0
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    sent = 0
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT e.id, e.rule_id, e.observed_on, e.message, r.name, r.recipients
+                FROM alert_events e JOIN alert_rules r ON r.id = e.rule_id
+                WHERE e.notified_at IS NULL AND e.created_at > NOW() - %s
+                ORDER BY e.rule_id, e.observed_on, e.id
+            """, (ALERTS_NOTIFY_MAX_AGE,))
+            by_rule = {}
+            for row in cur.fetchall():
+                by_rule.setdefault(row['rule_id'], []).append(row)
+        from flask_mail import Message
+        for rule_id, events in by_rule.items():
+            name, recipients = events[0]['name'], events[0]['recipients'] or ALERT_DEFAULT_RECIPIENTS
+            try:
+                get_mail().send(Message(
+                    subject=f"[ALERTE] {name} ({len(events)})",
+                    recipients=recipients,
+                    html=get_alert_email_html(name, events),
+                ))
+            except Exception as e:
+                logger.error(f"❌ Envoi alerte '{name}': {e}")
+                continue
+            with conn.cursor() as cur:
+                cur.execute("UPDATE alert_events SET notified_at = NOW() WHERE id = ANY(%s)",
+                            ([e['id'] for e in events],))
+            conn.commit()
+            sent += len(events)
+        return sent
+    finally:
+        conn.close()
+
+@app.route('/api/alerts/rules', methods=['GET', 'POST'])
+@query_label('api_alert_rules')
+def api_alert_rules():
+    if not is_admin_request():
+        return jsonify({'status': 'error', 'message': 'Accès refusé'}), 403
+    if not ensure_alert_tables():
+        return jsonify({'status': 'error', 'message': 'Tables d\'alertes indisponibles'}), 500
+    if request.method == 'POST':
+        try:
+            rule = validate_alert_rule(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'status': 'error', 'message': 'DB connection failed'}), 500
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if request.method == 'POST':
+                cur.execute("""
+                    INSERT INTO alert_rules (name, kind, metal_type, sheet_id, quote_currency,
+                                             threshold, direction, recipients)
+                    VALUES (%(name)s, %(kind)s, %(metal_type)s, %(sheet_id)s, %(quote_currency)s,
+                            %(threshold)s, %(direction)s, %(recipients)s)
+                    RETURNING *
+                """, rule)
+                created = cur.fetchone()
+                conn.commit()
+                return jsonify({'status': 'success', 'data': serialize_row(created)}), 201
+            cur.execute("""
+                SELECT r.*, MAX(e.created_at) AS last_event_at, COUNT(e.id) AS events
+                FROM alert_rules r LEFT JOIN alert_events e ON e.rule_id = r.id
+                GROUP BY r.id ORDER BY r.id
+            """)
+            return jsonify({'status': 'success', 'data': [serialize_row(r) for r in cur.fetchall()]})
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erreur api_alert_rules: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/alerts/rules/<int:rule_id>', methods=['PATCH', 'DELETE'])
+@query_label('api_alert_rules')
+def api_alert_rule(rule_id):
+    if not is_admin_request():
+        return jsonify({'status': 'error', 'message': 'Accès refusé'}), 403
+    if not ensure_alert_tables():
+        return jsonify({'status': 'error', 'message': 'Tables d\'alertes indisponibles'}), 500
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'status': 'error', 'message': 'DB connection failed'}), 500
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if request.method == 'DELETE':
+                cur.execute("DELETE FROM alert_rules WHERE id = %s RETURNING id", (rule_id,))
+            else:
+                enabled = (request.get_json(silent=True) or {}).get('enabled')
+                if not isinstance(enabled, bool):
+                    return jsonify({'status': 'error', 'message': 'enabled (booléen) requis'}), 400
+                cur.execute("UPDATE alert_rules SET enabled = %s WHERE id = %s RETURNING *", (enabled, rule_id))
+            row = cur.fetchone()
+        conn.commit()
+        if not row:
+            return jsonify({'status': 'error', 'message': f"Règle {rule_id} introuvable"}), 404
+        return jsonify({'status': 'success', 'data': serialize_row(row)})
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erreur api_alert_rule [{rule_id}]: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/alerts/events')
+@query_label('api_alert_events')
+def api_alert_events():
+    # Noms, seuils et messages des règles : mêmes droits que leur gestion
+    if not is_admin_request():
+        return jsonify({'status': 'error', 'message': 'Accès refusé'}), 403
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    rule_id = request.args.get('rule_id', type=int)
+    if not ensure_alert_tables():
+        return jsonify({'status': 'success', 'data': []})
+    query = """
+        SELECT e.id, e.rule_id, r.name AS rule_name, r.kind, e.observed_on, e.value, e.reference,
+               e.change_pct, e.message, e.notified_at, e.created_at
+        FROM alert_events e JOIN alert_rules r ON r.id = e.rule_id
+    """
+    params = []
+    if rule_id:
+        query += " WHERE e.rule_id = %s"
+        params.append(rule_id)
+    query += " ORDER BY e.created_at DESC, e.id DESC LIMIT %s"
+    rows = fetch_all('api_alert_events', query, params + [limit])
+    if rows is None:
+        return jsonify({'status': 'error', 'message': 'DB connection failed'}), 500
+    return jsonify({'status': 'success', 'data': [serialize_row(r) for r in rows]})
+
+# ==============================
+# CRON SCHEDULER — UN SEUL PROCESS PAR CLUSTER
 # ==============================
+# Chaque worker gunicorn / instance App Service candidate ; seul le détenteur
+# du verrou consultatif SCHEDULER_LOCK_NAME démarre le scheduler. Les
+# exécutions sont tracées dans scheduler_job_runs (cf. /api/admin/scheduler).
+SCHEDULER_ENABLED          = os.environ.get('SCHEDULER_ENABLED', '1') != '0'
+SCHEDULER_LOCK_NAME        = 'lme_dashboard_scheduler'
+SCHEDULER_ELECTION_SECONDS = int(os.environ.get('SCHEDULER_ELECTION_SECONDS', 30))
+SCHEDULER_APP_NAME         = f"lme-scheduler {socket.gethostname()}:{os.getpid()}"
+
+SCHEDULER_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS scheduler_job_runs (
+    id               BIGSERIAL   PRIMARY KEY,
+    job_id           TEXT        NOT NULL,
+    host             TEXT,
+    pid              INTEGER,
+    status           TEXT        NOT NULL,   -- running / success / error
+    error            TEXT,
+    started_at       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at      TIMESTAMPTZ,
+    duration_seconds NUMERIC
+);
+CREATE INDEX IF NOT EXISTS idx_scheduler_job_runs_job ON scheduler_job_runs (job_id, started_at DESC);
+"""
+
+@query_label('scheduler_job_runs')
+def start_job_run(job_id):
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO scheduler_job_runs (job_id, host, pid, status)
+                VALUES (%s, %s, %s, 'running') RETURNING id
+            """, (job_id, socket.gethostname(), os.getpid()))
+            run_id = cur.fetchone()[0]
+        conn.commit()
+        return run_id
+    except Exception as e:
+        conn.rollback()
+        logger.warning(f"Exécution de {job_id} non tracée: {e}")
+        return None
+    finally:
+        conn.close()
+
+@query_label('scheduler_job_runs')
+def finish_job_run(run_id, status, error, elapsed):
+    if run_id is None:
+        return
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE scheduler_job_runs
+                SET status = %s, error = %s, finished_at = NOW(), duration_seconds = %s
+                WHERE id = %s
+            """, (status, error, round(elapsed, 3), run_id))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.warning(f"Fin d'exécution {run_id} non tracée: {e}")
+    finally:
+        conn.close()
+
+class SchedulerLeader(threading.Thread):
+    """
+    Élection du process qui exécute les jobs : verrou consultatif de session
+    détenu sur une connexion dédiée (hors pool). Si le leader meurt, sa session
+    se ferme, le verrou est libéré et un autre candidat le prend au tour
+    suivant (SCHEDULER_ELECTION_SECONDS).
+    """
+
+    def __init__(self, build_scheduler):
+        super().__init__(daemon=True, name='scheduler-leader')
+        self.build_scheduler = build_scheduler
+        self.scheduler = None
+        self.leader_since = None
+        self.conn = None
+        self.stop_event = threading.Event()
+
+    @property
+    def is_leader(self):
+        return self.scheduler is not None
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                if self.conn is None or self.conn.closed:
+                    self.conn = psycopg2.connect(application_name=SCHEDULER_APP_NAME, **DB_CONFIG)
+                    self.conn.autocommit = True
+                with self.conn.cursor() as cur:
+                    if self.is_leader:
+                        # La session, donc le verrou, est toujours là
+                        cur.execute("SELECT 1")
+                    else:
+                        cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (SCHEDULER_LOCK_NAME,))
+                        if cur.fetchone()[0]:
+                            self.become_leader()
+            except Exception as e:
+                logger.warning(f"Élection du scheduler: {e}")
+                self.step_down()
+            self.stop_event.wait(SCHEDULER_ELECTION_SECONDS)
+        self.step_down()
+
+    def become_leader(self):
+        conn = get_db_connection()
+        if conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(SCHEDULER_SCHEMA_SQL)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.warning(f"Table scheduler_job_runs indisponible: {e}")
+            finally:
+                conn.close()
+        self.scheduler = self.build_scheduler()
+        self.scheduler.start()
+        self.leader_since = datetime.now()
+        logger.info(f"✅ Scheduler démarré (leader {SCHEDULER_APP_NAME})")
+
+    def step_down(self):
+        if self.scheduler is not None:
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
+            self.leader_since = None
+            logger.warning(f"Scheduler arrêté : leadership perdu ({SCHEDULER_APP_NAME})")
+        if self.conn is not None:
+            # Fermer la session libère le verrou pour les autres candidats
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+    def stop(self):
+        self.stop_event.set()
+        self.step_down()
+
+scheduler_leader = None
+
 if SCHEDULER_AVAILABLE:
+    @timed_job('budget_rate_annual_email')
     def scheduled_budget_email_job():
         with app.app_context():
             try:
@@ -1269,18 +3695,118 @@ if SCHEDULER_AVAILABLE:
                 send_budget_rate_email(year=next_year, recipient_email=BUDGET_OWNER_EMAIL, test_mode=False)
             except Exception as e:
                 logger.error(f"Erreur cron Budget Rate: {e}")
+                raise
 
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(
-        func=scheduled_budget_email_job,
-        trigger=CronTrigger(month=11, day=1, hour=9, minute=0),
-        id="budget_rate_annual_email",
-        replace_existing=True
-    )
-    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
-        scheduler.start()
-        logger.info("✅ Scheduler démarré")
-    atexit.register(lambda: scheduler.shutdown())
+    @timed_job('schema_migrations')
+    def scheduled_schema_migrations_job():
+        if not run_schema_migrations():
+            raise RuntimeError("migration de schéma en échec")
+
+    @timed_job('latest_prices_refresh')
+    def scheduled_latest_prices_refresh_job():
+        try:
+            if latest_prices_ready():
+                refresh_latest_prices()
+        except Exception as e:
+            logger.error(f"Erreur cron latest_prices: {e}")
+            raise
+
+    @timed_job('performance_indexes')
+    def scheduled_performance_indexes_job():
+        try:
+            ensure_performance_indexes()
+        except Exception as e:
+            logger.error(f"Erreur création des index: {e}")
+            raise
+
+    _cache_warm_state = {'version': None}
+
+    @timed_job('cache_warm')
+    def scheduled_cache_warm_job():
+        # Ne recalcule que si un sync / prix / taux ECB a changé la version des données
+        version = get_data_version()
+        if version is None or version == _cache_warm_state['version']:
+            return
+        started = time.perf_counter()
+        warmed = warm_response_cache()
+        _cache_warm_state['version'] = version
+        logger.info(f"🔥 Cache préchauffé ({warmed} vues, version {version}) en {time.perf_counter() - started:.1f}s")
+
+    _alerts_state = {'version': None}
+
+    @timed_job('alerts')
+    def scheduled_alerts_job():
+        # Évaluation seulement si un sync a changé les données ; l'envoi des
+        # événements en attente (échec SMTP précédent) est retenté à chaque passage
+        version = get_data_version()
+        created = 0
+        if version is None or version != _alerts_state['version']:
+            created = evaluate_alerts()
+            _alerts_state['version'] = version
+        with app.app_context():
+            sent = notify_alert_events()
+        if created or sent:
+            logger.info(f"🔔 Alertes : {created} événement(s), {sent} notifié(s)")
+
+    def build_scheduler():
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from apscheduler.triggers.cron import CronTrigger
+        scheduler = BackgroundScheduler()
+        scheduler.add_job(
+            func=scheduled_budget_email_job,
+            trigger=CronTrigger(month=11, day=1, hour=9, minute=0),
+            id="budget_rate_annual_email",
+            replace_existing=True
+        )
+        scheduler.add_job(
+            func=scheduled_latest_prices_refresh_job,
+            trigger='interval',
+            minutes=LATEST_PRICES_REFRESH_MINUTES,
+            id="latest_prices_refresh",
+            replace_existing=True
+        )
+        scheduler.add_job(
+            func=scheduled_schema_migrations_job,
+            trigger='date',
+            id="schema_migrations",
+            replace_existing=True
+        )
+        scheduler.add_job(
+            func=scheduled_performance_indexes_job,
+            trigger='date',
+            id="performance_indexes",
+            replace_existing=True
+        )
+        scheduler.add_job(
+            func=scheduled_cache_warm_job,
+            trigger='interval',
+            minutes=CACHE_WARM_INTERVAL_MINUTES,
+            next_run_time=datetime.now(),
+            id="cache_warm",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        scheduler.add_job(
+            func=scheduled_alerts_job,
+            trigger='interval',
+            minutes=ALERTS_INTERVAL_MINUTES,
+            next_run_time=datetime.now(),
+            id="alerts",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        return scheduler
+
+def start_scheduler_election():
+    """Candidature du process au rôle de leader du scheduler (cf. SchedulerLeader)."""
+    global scheduler_leader
+    if not (SCHEDULER_AVAILABLE and SCHEDULER_ENABLED) or scheduler_leader is not None:
+        return
+    scheduler_leader = SchedulerLeader(build_scheduler)
+    scheduler_leader.start()
+    atexit.register(scheduler_leader.stop)
 
 # ==============================
 # ROUTES TEST
@@ -1296,65 +3822,533 @@ def test_budget_email():
         return f"<h1>✅ Test OK</h1><p>Token: {latest_token}</p><a href='{form_url}'>Ouvrir formulaire</a>"
     return "<h1>❌ Erreur</h1>", 500
 
-# ===============================
-# ROUTES FLASK PRINCIPALES
-# ===============================
-@app.route('/')
-def landing_page():
-    return render_template('landing.html')
+# ===============================
+# ROUTES FLASK PRINCIPALES
+# ===============================
+@app.route('/')
+def landing_page():
+    return render_shell('landing.html')
+
+@app.route('/dashboard')
+def dashboard():
+    return render_shell('index.html')
+
+@app.route('/health')
+def health_check():
+    try:
+        conn = get_db_connection()
+        if conn:
+            conn.close()
+            return jsonify({'status': 'ok', 'db': 'connected'}), 200
+        return jsonify({'status': 'error', 'db': 'disconnected'}), 500
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# ──────────────────────────────────────────
+# INSTRUMENTATION HTTP + /metrics
+# ──────────────────────────────────────────
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _observe_request_latency(response):
+    started = g.pop('request_started', None)
+    if METRICS_AVAILABLE and started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.labels(route, request.method, response.status_code).observe(
+            time.perf_counter() - started)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    if not METRICS_AVAILABLE:
+        return jsonify({'status': 'error', 'message': 'prometheus_client non installé'}), 501
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        prometheus_multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+# ──────────────────────────────────────────
+# COMPRESSION DES RÉPONSES
+# ──────────────────────────────────────────
+# JSON / HTML / JS / CSS au-delà de COMPRESS_MIN_BYTES : brotli si le client
+# l'accepte (et si le paquet est installé), sinon gzip. Les réponses en flux
+# sont compressées au fil de l'eau ; SSE et fichiers (xlsx, pstats) passent tels quels.
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+COMPRESS_LEVEL     = int(os.environ.get('COMPRESS_LEVEL', 6))       # gzip 1-9
+BROTLI_QUALITY     = int(os.environ.get('BROTLI_QUALITY', 4))       # brotli 0-11 (réponses dynamiques)
+COMPRESS_STREAM_FLUSH_BYTES = 16384
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'text/html', 'text/css', 'text/javascript',
+    'application/javascript', 'text/csv', 'text/plain', 'image/svg+xml',
+}
+
+def negotiate_encoding(accept_encoding):
+    """'br', 'gzip' ou None selon l'en-tête Accept-Encoding (q=0 exclut)."""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    if BROTLI_AVAILABLE and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+def compress_bytes(data, encoding, brotli_quality=None):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY if brotli_quality is None else brotli_quality)
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL)
+
+def compress_stream(chunks, encoding):
+    # Flush tous les COMPRESS_STREAM_FLUSH_BYTES : le client reçoit les données
+    # au fur et à mesure sans payer un flush par (petit) morceau
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)   # 31 = format gzip
+        compress, finish = compressor.compress, compressor.flush
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+    pending = 0
+    for chunk in chunks:
+        chunk = chunk.encode() if isinstance(chunk, str) else chunk
+        out = compress(chunk)
+        pending += len(chunk)
+        if pending >= COMPRESS_STREAM_FLUSH_BYTES:
+            out += flush()
+            pending = 0
+        if out:
+            yield out
+    yield finish()
+
+@app.after_request
+def _compress_response(response):
+    if (response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.status_code < 200 or response.status_code in (204, 304)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(compress_bytes(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    return response
+
+# ──────────────────────────────────────────
+# COQUILLE DU DASHBOARD + ASSETS PRÉCOMPRESSÉS
+# ──────────────────────────────────────────
+# Les templates n'ont pas de contenu dynamique : rendus une seule fois par
+# version (mtime) du fichier, puis servis depuis la mémoire déjà compressés,
+# avec ETag = hash du contenu. Le CSS/JS du dashboard (static/) est servi sous
+# /assets/<fichier>?v=<hash> avec un cache navigateur d'un an : l'URL change
+# à chaque modification. La page HTML elle-même est revalidée (304).
+ASSET_MAX_AGE_SECONDS = 365 * 24 * 3600
+STATIC_DIR = os.path.join(app.root_path, 'static')
+
+class PrecompressedBody:
+    """Corps figé avec ses variantes identity / gzip / br et son hash."""
+
+    def __init__(self, body, mimetype):
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {None: body, 'gzip': gzip.compress(body, compresslevel=9)}
+        if BROTLI_AVAILABLE:
+            self.variants['br'] = brotli.compress(body, quality=11)
+
+    def response(self, cache_control):
+        if request.if_none_match.contains(self.digest):
+            response = Response(status=304)
+        else:
+            encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+            response = Response(self.variants[encoding], mimetype=self.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(self.digest)
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+_precompressed = {}   # clé → (mtime, PrecompressedBody)
+_precompressed_lock = threading.Lock()
+
+def get_precompressed(key, version, build, mimetype):
+    """Recalcule build() seulement si version (mtime, hash des assets…) a changé."""
+    cached = _precompressed.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+    with _precompressed_lock:
+        cached = _precompressed.get(key)
+        if not cached or cached[0] != version:
+            cached = _precompressed[key] = (version, PrecompressedBody(build(), mimetype))
+    return cached[1]
+
+def get_static_asset(filename):
+    path = safe_join(STATIC_DIR, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    def read():
+        with open(path, 'rb') as f:
+            return f.read()
+    return get_precompressed(('asset', filename), os.path.getmtime(path), read, mimetype)
+
+@app.template_global()
+def asset_url(filename):
+    asset = get_static_asset(filename)
+    return f"/assets/{filename}?v={asset.digest}" if asset else f"/assets/{filename}"
+
+SHELL_ASSETS = {'index.html': ('dashboard.css', 'dashboard.js')}
+
+def render_shell(template_name):
+    """Template statique rendu une fois par version du template et des assets qu'il référence."""
+    path = os.path.join(app.root_path, app.template_folder, template_name)
+    version = (os.path.getmtime(path),
+               tuple(asset_url(name) for name in SHELL_ASSETS.get(template_name, ())))
+    shell = get_precompressed(('shell', template_name), version,
+                              lambda: render_template(template_name).encode(), 'text/html')
+    return shell.response('no-cache')
+
+@app.route('/assets/<path:filename>')
+def static_asset(filename):
+    asset = get_static_asset(filename)
+    if asset is None:
+        return jsonify({'status': 'error', 'message': 'Fichier introuvable'}), 404
+    if request.args.get('v') == asset.digest:
+        return asset.response(f'public, max-age={ASSET_MAX_AGE_SECONDS}, immutable')
+    return asset.response('no-cache')
+
+# ──────────────────────────────────────────
+# PROFILER À LA DEMANDE
+# ──────────────────────────────────────────
+# Requête admin + header « X-Profile: 1 » (ou ?_profile=1) : la requête tourne
+# sous cProfile et un échantillonneur de piles. On écrit dans PROFILE_DIR :
+#   <id>.pstats     → python -m pstats / snakeviz
+#   <id>.collapsed  → flamegraph.pl / speedscope (feuille [sql] = temps dans PostgreSQL)
+#   <id>.json       → temps total, temps SQL, temps Python
+# Temps SQL : celui du thread de la requête ; un fan-out (run_concurrently)
+# compte pour son temps mur d'attente, la somme de ses requêtes parallèles
+# étant rapportée à part (parallel_sql_ms).
+# Non supporté sous gevent (GUNICORN_PROFILE=gevent) : l'échantillonneur lit la
+# pile des threads OS, pas celle des greenlets, et cProfile mélangerait les
+# greenlets du worker. La requête est servie sans profil (X-Profile-Error).
+PROFILE_DIR             = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'lme_profiles'))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+
+_profile_lock = threading.Lock()   # un seul profil à la fois par process
+
+class _StackSampler(threading.Thread):
+    """Échantillonne la pile d'un thread ; agrège au format « collapsed stacks »."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='request-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval  = interval
+        self.stacks    = {}
+        self._stopped  = threading.Event()
+
+    def run(self):
+        sql_code = _InstrumentedCursorMixin.execute.__code__
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names, in_sql = [], False
+            while frame is not None:
+                code = frame.f_code
+                in_sql = in_sql or code is sql_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if not names:
+                continue
+            names.reverse()
+            if in_sql:
+                names.append('[sql]')
+            key = ';'.join(names)
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+def _profiling_requested():
+    flag = request.headers.get('X-Profile') or request.args.get('_profile')
+    return bool(flag) and flag not in ('0', 'false') and is_admin_request()
+
+def _gevent_patched():
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('threading')
+
+@app.before_request
+def _start_request_profile():
+    if not _profiling_requested():
+        return
+    if _gevent_patched():
+        g.profile_error = 'gevent'
+        return
+    if not _profile_lock.acquire(blocking=False):
+        return
+    g.sql_timing = {'seconds': 0.0, 'parallel_seconds': 0.0, 'fanout_seconds': 0.0, 'count': 0}
+    g.profile_started = time.perf_counter()
+    g.profile_sampler = _StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+    g.profile_sampler.start()
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+@app.after_request
+def _finish_request_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        if g.get('profile_error'):
+            response.headers['X-Profile-Error'] = g.profile_error
+        return response
+    try:
+        profiler.disable()
+        g.profile_sampler.stop()
+        wall = time.perf_counter() - g.profile_started
+        sql  = g.sql_timing['seconds'] + g.sql_timing['fanout_seconds']
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile_id = f"{datetime.now():%Y%m%d_%H%M%S_%f}_{request.endpoint or 'unmatched'}_{os.getpid()}"
+        base = os.path.join(PROFILE_DIR, profile_id)
+        profiler.dump_stats(base + '.pstats')
+        with open(base + '.collapsed', 'w') as f:
+            for stack, count in sorted(g.profile_sampler.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        summary = {
+            'id':             profile_id,
+            'path':           request.full_path,
+            'status':         response.status_code,
+            'wall_ms':        round(wall * 1000, 1),
+            'sql_ms':         round(sql * 1000, 1),
+            'fanout_ms':      round(g.sql_timing['fanout_seconds'] * 1000, 1),
+            'parallel_sql_ms': round(g.sql_timing['parallel_seconds'] * 1000, 1),
+            'sql_queries':    g.sql_timing['count'],
+            'python_ms':      round(max(wall - sql, 0.0) * 1000, 1),
+            'samples':        sum(g.profile_sampler.stacks.values()),
+        }
+        with open(base + '.json', 'w') as f:
+            json.dump(summary, f, indent=2)
+        response.headers['X-Profile-Id']      = profile_id
+        response.headers['X-Profile-Wall-Ms'] = str(summary['wall_ms'])
+        response.headers['X-Profile-Sql-Ms']  = str(summary['sql_ms'])
+        logger.info(f"🔬 Profil {profile_id}: {summary['wall_ms']} ms dont SQL {summary['sql_ms']} ms")
+    except Exception as e:
+        logger.error(f"Erreur profiler: {e}")
+    finally:
+        _profile_lock.release()
+    return response
+
+@app.route('/api/admin/profiles')
+@app.route('/api/admin/profiles/<path:filename>')
+def api_admin_profiles(filename=None):
+    if not is_admin_request():
+        return jsonify({'status': 'error', 'message': 'Accès refusé'}), 403
+    if filename:
+        return send_from_directory(PROFILE_DIR, filename, as_attachment=True)
+    summaries = []
+    if os.path.isdir(PROFILE_DIR):
+        for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+            if name.endswith('.json'):
+                with open(os.path.join(PROFILE_DIR, name)) as f:
+                    summaries.append(json.load(f))
+    return jsonify({'status': 'success', 'directory': PROFILE_DIR, 'data': summaries})
+
+# ──────────────────────────────────────────
+# ROUTES ADMIN (header X-Admin-Token = $ADMIN_TOKEN)
+# ──────────────────────────────────────────
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
 
-@app.route('/dashboard')
-def dashboard():
-    return render_template('index.html')
+def is_admin_request():
+    supplied = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and secrets.compare_digest(supplied, ADMIN_TOKEN)
 
-@app.route('/health')
-def health_check():
+# ──────────────────────────────────────────
+# TIMEOUTS SQL → ERREUR STRUCTURÉE
+# ──────────────────────────────────────────
+query_timeout_counts = {}   # (endpoint, filtres) → nb de requêtes annulées
+_query_timeout_lock = threading.Lock()
+
+@app.errorhandler(QueryCanceled)
+def handle_query_timeout(e):
+    endpoint = request.endpoint or request.path
+    filters  = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items()))
+    with _query_timeout_lock:
+        key = (endpoint, filters)
+        query_timeout_counts[key] = query_timeout_counts.get(key, 0) + 1
+    if METRICS_AVAILABLE:
+        QUERY_TIMEOUTS.labels(endpoint).inc()
+    logger.warning(f"⏱️ Requête annulée (statement_timeout) sur {endpoint} [{filters or 'sans filtre'}]")
+    return jsonify({
+        'status':     'error',
+        'error':      'query_timeout',
+        'message':    "Requête trop longue : réduisez la période ou ajoutez un filtre (métal, source, mois).",
+        'endpoint':   endpoint,
+        'timeout_ms': current_statement_timeout_ms(),
+        'filters':    request.args.to_dict(),
+    }), 504
+
+@app.route('/api/admin/query-timeouts')
+def api_admin_query_timeouts():
+    if not is_admin_request():
+        return jsonify({'status': 'error', 'message': 'Accès refusé'}), 403
+    with _query_timeout_lock:
+        rows = [{'endpoint': ep, 'filters': f, 'count': n}
+                for (ep, f), n in query_timeout_counts.items()]
+    rows.sort(key=lambda r: r['count'], reverse=True)
+    return jsonify({
+        'status':   'success',
+        'data':     rows,
+        'budgets':  app.config['STATEMENT_TIMEOUTS_MS'],
+    })
+
+@app.route('/api/admin/slow-queries')
+def api_admin_slow_queries():
+    """Buffer des requêtes lentes ; ?fingerprint=… pour filtrer, ?id=… pour une entrée."""
+    if not is_admin_request():
+        return jsonify({'status': 'error', 'message': 'Accès refusé'}), 403
+    fingerprint = request.args.get('fingerprint')
+    entry_id    = request.args.get('id', type=int)
+    with _slow_queries_lock:
+        entries = [dict(e) for e in _slow_queries]
+    if entry_id is not None:
+        entries = [e for e in entries if e['id'] == entry_id]
+    if fingerprint:
+        entries = [e for e in entries if e['fingerprint'] == fingerprint]
+    by_fingerprint = {}
+    for e in entries:
+        agg = by_fingerprint.setdefault(e['fingerprint'], {
+            'fingerprint': e['fingerprint'], 'label': e['label'], 'sql': e['sql'],
+            'count': 0, 'max_ms': 0.0, 'total_ms': 0.0, 'has_explain': False,
+        })
+        agg['count']      += 1
+        agg['max_ms']      = max(agg['max_ms'], e['duration_ms'])
+        agg['total_ms']   += e['duration_ms']
+        agg['has_explain'] = agg['has_explain'] or e['explain'] is not None
+    return jsonify({
+        'status':       'success',
+        'threshold_ms': SLOW_QUERY_MS,
+        'sample_rate':  SLOW_QUERY_EXPLAIN_SAMPLE,
+        'fingerprints': sorted(by_fingerprint.values(), key=lambda a: a['total_ms'], reverse=True),
+        'data':         entries[::-1],
+    })
+
+@app.route('/api/admin/scheduler')
+@query_label('api_admin_scheduler')
+def api_admin_scheduler():
+    if not is_admin_request():
+        return jsonify({'status': 'error', 'message': 'Accès refusé'}), 403
+    local = {'process': SCHEDULER_APP_NAME, 'enabled': scheduler_leader is not None,
+             'is_leader': False, 'leader_since': None, 'jobs': []}
+    if scheduler_leader is not None and scheduler_leader.is_leader:
+        local['is_leader'] = True
+        local['leader_since'] = scheduler_leader.leader_since.isoformat()
+        local['jobs'] = [{'id': job.id,
+                          'next_run_time': job.next_run_time.isoformat() if job.next_run_time else None}
+                         for job in scheduler_leader.scheduler.get_jobs()]
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'status': 'success', 'local': local, 'leader': None, 'runs': []})
     try:
-        conn = get_db_connection()
-        if conn:
-            conn.close()
-            return jsonify({'status': 'ok', 'db': 'connected'}), 200
-        return jsonify({'status': 'error', 'db': 'disconnected'}), 500
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT a.application_name AS process, a.backend_start AS connected_at
+                FROM pg_locks l JOIN pg_stat_activity a ON a.pid = l.pid
+                WHERE l.locktype = 'advisory' AND l.granted
+                  AND a.application_name LIKE 'lme-scheduler%%'
+            """)
+            leader = cur.fetchone()
+            runs = []
+            if table_exists(conn, 'scheduler_job_runs'):
+                cur.execute("""
+                    SELECT id, job_id, host, pid, status, error, started_at, finished_at, duration_seconds
+                    FROM scheduler_job_runs ORDER BY started_at DESC LIMIT 50
+                """)
+                runs = [serialize_row(r) for r in cur.fetchall()]
+        return jsonify({'status': 'success', 'local': local,
+                        'leader': serialize_row(leader) if leader else None, 'runs': runs})
+    finally:
+        conn.close()
+
+@app.route('/api/admin/single-flight')
+def api_admin_single_flight():
+    if not is_admin_request():
+        return jsonify({'status': 'error', 'message': 'Accès refusé'}), 403
+    with _inflight_lock:
+        stats = {name: dict(v) for name, v in single_flight_stats.items()}
+        in_flight = len(_inflight)
+    return jsonify({'status': 'success', 'data': stats, 'in_flight': in_flight})
 
 # ──────────────────────────────────────────
 # ROUTES: Filtres dynamiques
 # ──────────────────────────────────────────
 
+@app.route('/api/bootstrap')
+def api_bootstrap():
+    """Toutes les listes de filtres en une requête (démarrage du dashboard)."""
+    data = get_bootstrap_dimensions()
+    return jsonify({'status': 'success', 'data': data, 'data_version': get_data_version()})
+
 @app.route('/api/metals/metal-types')
 def api_metal_types():
-    metal_types = get_all_metal_types()
+    metal_types = get_cached_dimension('metal_types', get_all_metal_types)
     return jsonify({'status': 'success', 'data': metal_types})
 
 @app.route('/api/metals/sources')
 def api_metal_sources():
-    sources = get_all_sources()
+    sources = get_cached_dimension('sources', get_all_sources)
     return jsonify({'status': 'success', 'data': sources})
 
 @app.route('/api/metals/date-range')
 def api_metals_date_range():
-    dr = get_price_date_range()
+    dr = get_cached_dimension('metals_date_range', get_price_date_range)
     return jsonify({'status': 'success', 'data': dr})
 
 @app.route('/api/fx/currencies')
 def api_fx_currencies():
-    currencies = get_all_fx_currencies()
+    currencies = get_cached_dimension('fx_currencies', get_all_fx_currencies)
     return jsonify({'status': 'success', 'data': currencies})
 
 @app.route('/api/fx/date-range')
 def api_fx_date_range():
-    dr = get_fx_date_range()
+    dr = get_cached_dimension('fx_date_range', get_fx_date_range)
     return jsonify({'status': 'success', 'data': dr})
 
 # ──────────────────────────────────────────
 # API MÉTAUX
 # ──────────────────────────────────────────
 
+def build_latest_prices_payload():
+    prices = get_latest_prices()
+    if not prices:
+        return None   # DB injoignable ou vide : pas mis en cache
+    return {'status': 'success', 'data': [serialize_row(p) for p in prices]}
+
 @app.route('/api/prices/latest')
 def api_latest_prices():
-    prices = get_latest_prices()
-    return jsonify({'status': 'success', 'data': [serialize_row(p) for p in prices]})
+    body = cached_response('prices_latest', build_latest_prices_payload)
+    if body is None:
+        return jsonify({'status': 'success', 'data': []})
+    return json_body_response(body)
 
 # ==============================================================
 # ✅ MODIFIÉ: /api/prices/history — lit et transmet `source`
@@ -1389,11 +4383,48 @@ def api_price_history():
                     pass
             start_date, end_date, days = ms.isoformat(), me.isoformat(), None
 
-    history = get_price_history(days, metal_type, start_date, end_date, source=source)  # ✅ MODIFIÉ
+    # Watermark renvoyé par un appel précédent : ne renvoie que les lignes
+    # ajoutées depuis (plus HISTORY_DELTA_OVERLAP_SECONDS), à fusionner par id.
+    # Valable seulement si aucune ligne n'a été corrigée ou supprimée depuis :
+    # le client renvoie la `revision` reçue avec le watermark
+    since = request.args.get('since')
+    if since:
+        try:
+            since = utc_naive(datetime.fromisoformat(since))
+        except ValueError:
+            return jsonify({'status': 'error', 'message': f"Watermark 'since' invalide : {since}"}), 400
 
+    try:
+        freq, agg = parse_resample_args(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if freq and since:
+        # Un delta ne contient pas toute la période : ses agrégats seraient faux
+        return jsonify({'status': 'error', 'message': "'since' et 'freq' ne se combinent pas"}), 400
+
+    # Lue avant les lignes : une correction arrivée entre les deux force le prochain rechargement
+    revision = get_price_revision()
+    full_reload = bool(since) and (revision is None or
+                                   request.args.get('revision', type=int) != revision)
+    if full_reload:
+        # Corrections ou suppressions (ou révision inconnue) : historique complet à remplacer
+        since = None
+
+    history = get_price_history(days, metal_type, start_date, end_date, source=source, since=since,
+                                freq=freq, agg=agg)
+
+    stamps = [utc_naive(h['created_at']) for h in history if h.get('created_at')]
+    watermark = max(stamps + ([since] if since else []), default=None)
+    data = [serialize_row(i) for i in history]
     return jsonify({
         'status': 'success',
-        'data': [serialize_row(i) for i in history]
+        'data': add_eur_column(data, date_key='last_date' if freq else 'price_date'),
+        'delta': bool(since),
+        'full_reload': full_reload,
+        'watermark': watermark.isoformat() if watermark else None,
+        'revision': revision,
+        'freq': freq,
+        'agg': agg,
     })
 
 @app.route('/api/statistics')
@@ -1406,23 +4437,87 @@ def api_sync_logs():
     logs = get_sync_logs()
     return jsonify({'status': 'success', 'data': [serialize_row(l) for l in logs]})
 
+# ──────────────────────────────────────────
+# FLUX SSE : CHANGEMENT DE VERSION DES DONNÉES
+# ──────────────────────────────────────────
+# Un seul poller par process relit la version des données toutes les
+# STREAM_POLL_SECONDS tant qu'un onglet est abonné, et réveille les flux
+# quand elle change : le dashboard ne recharge qu'après un sync au lieu de
+# tout relire toutes les 5 minutes. Un flux ouvert occupe un worker sync ou
+# un thread gthread : gunicorn.conf.py ne l'active qu'avec le profil gevent.
+STREAM_ENABLED           = os.environ.get('STREAM_ENABLED', '1') != '0'
+STREAM_POLL_SECONDS      = float(os.environ.get('STREAM_POLL_SECONDS', 5))
+STREAM_HEARTBEAT_SECONDS = 20
+STREAM_MAX_SECONDS       = int(os.environ.get('STREAM_MAX_SECONDS', 600))   # puis reconnexion du navigateur
+
+_stream_cond  = threading.Condition()
+_stream_state = {'version': None, 'subscribers': 0, 'poller_pid': None}
+
+def _stream_poller():
+    while True:
+        with _stream_cond:
+            _stream_cond.wait_for(lambda: _stream_state['subscribers'] > 0)
+        version = poll_data_version()
+        with _stream_cond:
+            if version is not None and version != _stream_state['version']:
+                _stream_state['version'] = version
+                _stream_cond.notify_all()
+        time.sleep(STREAM_POLL_SECONDS)
+
+def ensure_stream_poller():
+    """Démarre le poller du process (les threads ne survivent pas au fork de gunicorn)."""
+    with _stream_cond:
+        if _stream_state['poller_pid'] != os.getpid():
+            _stream_state['poller_pid'] = os.getpid()
+            threading.Thread(target=_stream_poller, daemon=True, name='stream-poller').start()
+
+def data_version_events():
+    with _stream_cond:
+        _stream_state['subscribers'] += 1
+        _stream_cond.notify_all()
+    try:
+        yield f"retry: {int(STREAM_POLL_SECONDS * 1000)}\n\n"
+        version = _stream_state['version'] or get_data_version()
+        sent = None
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            if version is not None and version != sent:
+                sent = version
+                yield f"event: data-version\ndata: {json.dumps({'version': version})}\n\n"
+            else:
+                yield ": ping\n\n"
+            with _stream_cond:
+                _stream_cond.wait_for(lambda: _stream_state['version'] not in (None, sent),
+                                      timeout=STREAM_HEARTBEAT_SECONDS)
+                version = _stream_state['version']
+    finally:
+        with _stream_cond:
+            _stream_state['subscribers'] -= 1
+
+@app.route('/api/stream')
+def api_stream():
+    if not STREAM_ENABLED:
+        # 204 : EventSource abandonne, le dashboard repasse en polling
+        return '', 204
+    ensure_stream_poller()
+    return Response(data_version_events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # ──────────────────────────────────────────
 # WORKBOOK ROUTES
 # ──────────────────────────────────────────
 
+@query_label('get_bme_data')
 def get_bme_data(cursor, year_filter=None, month_filter=None):
     yr = int(year_filter) if year_filter else datetime.now().year
-    params = [yr]
     query = """
         SELECT quote_currency,
                EXTRACT(MONTH FROM ref_date)::INTEGER AS month,
                AVG(rate) AS avg_rate
         FROM ecb_exchange_rates
-        WHERE EXTRACT(YEAR FROM ref_date) = %s
+        WHERE TRUE
     """
-    if month_filter:
-        query += " AND EXTRACT(MONTH FROM ref_date) = %s"
-        params.append(int(month_filter))
+    query, params = _apply_period_filter(query, [], yr, month_filter, date_col='ref_date')
     query += " GROUP BY quote_currency, EXTRACT(MONTH FROM ref_date) ORDER BY quote_currency, month"
     cursor.execute(query, params)
     rows = cursor.fetchall()
@@ -1453,132 +4548,126 @@ def metals_workbook():
     return render_template('metals_workbook.html')
 
 @app.route('/api/metals/sheets')
+@query_label('api_metals_sheets')
 def api_metals_sheets():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'status': 'error', 'message': 'DB connection failed'}), 500
     try:
-        result = {}
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            for sheet_id, config in METALS_SOURCE_CONFIGS.items():
-                fmt = config.get('format', 'standard')
-                if fmt == 'exchange_matrix':
-                    cur.execute("""
-                        SELECT COUNT(*) AS cnt,
-                               MAX(ref_date) AS last_date,
-                               MIN(ref_date) AS first_date
-                        FROM ecb_exchange_rates
-                    """)
-                    row = cur.fetchone()
-                    result[sheet_id] = {
-                        'name':       config['name'],
-                        'count':      int(row['cnt']) if row else 0,
-                        'last_date':  row['last_date'].isoformat() if row and row['last_date'] else None,
-                        'first_date': row['first_date'].isoformat() if row and row['first_date'] else None,
-                        'format':     fmt
-                    }
-                    continue
-
-                if config.get('product_name'):
-                    cur.execute("""
-                        SELECT COUNT(*) AS cnt,
-                               MAX(price_date) AS last_date,
-                               MIN(price_date) AS first_date
-                        FROM metal_prices WHERE source_product_name = %s
-                    """, [config['product_name']])
-                    row = cur.fetchone()
-                    result[sheet_id] = {
-                        'name':       config['name'],
-                        'count':      int(row['cnt']) if row else 0,
-                        'last_date':  row['last_date'].isoformat() if row and row['last_date'] else None,
-                        'first_date': row['first_date'].isoformat() if row and row['first_date'] else None,
-                        'format':     fmt
-                    }
-                    continue
-
-                patterns = config.get('url_patterns') or (
-                    [config['url_pattern']] if config.get('url_pattern') else []
-                )
-                if not patterns:
-                    result[sheet_id] = {'name': config['name'], 'count': 0,
-                                        'last_date': None, 'first_date': None, 'format': fmt}
-                    continue
-
-                clauses, params = [], []
-                for p in patterns:
-                    clauses.append('(source_url ILIKE %s OR source_url = %s)')
-                    params.extend([f'%{p}%', p])
-                where = ' OR '.join(clauses)
-                cur.execute(f"""
+        result, queries = {}, {}
+        for sheet_id, config in METALS_SOURCE_CONFIGS.items():
+            fmt = config.get('format', 'standard')
+            if fmt == 'exchange_matrix':
+                queries[sheet_id] = ("""
+                    SELECT COUNT(*) AS cnt,
+                           MAX(ref_date) AS last_date,
+                           MIN(ref_date) AS first_date
+                    FROM ecb_exchange_rates
+                """, None)
+                continue
+
+            if config.get('product_name'):
+                queries[sheet_id] = ("""
                     SELECT COUNT(*) AS cnt,
                            MAX(price_date) AS last_date,
                            MIN(price_date) AS first_date
-                    FROM metal_prices WHERE {where}
-                """, params)
-                row = cur.fetchone()
-                result[sheet_id] = {
-                    'name':       config['name'],
-                    'count':      int(row['cnt']) if row else 0,
-                    'last_date':  row['last_date'].isoformat() if row and row['last_date'] else None,
-                    'first_date': row['first_date'].isoformat() if row and row['first_date'] else None,
-                    'format':     fmt
-                }
+                    FROM metal_prices WHERE source_product_name = %s
+                """, [config['product_name']])
+                continue
+
+            patterns = config.get('url_patterns') or (
+                [config['url_pattern']] if config.get('url_pattern') else []
+            )
+            if not patterns:
+                result[sheet_id] = {'name': config['name'], 'count': 0,
+                                    'last_date': None, 'first_date': None, 'format': fmt}
+                continue
+
+            clauses, params = [], []
+            for p in patterns:
+                clauses.append('(source_url ILIKE %s OR source_url = %s)')
+                params.extend([f'%{p}%', p])
+            where = ' OR '.join(clauses)
+            queries[sheet_id] = (f"""
+                SELECT COUNT(*) AS cnt,
+                       MAX(price_date) AS last_date,
+                       MIN(price_date) AS first_date
+                FROM metal_prices WHERE {where}
+            """, params)
+
+        rows = run_concurrently({
+            sheet_id: functools.partial(fetch_all, 'api_metals_sheets', query, params)
+            for sheet_id, (query, params) in queries.items()
+        })
+        if any(r is None for r in rows.values()):
+            return jsonify({'status': 'error', 'message': 'DB connection failed'}), 500
+
+        for sheet_id, config in METALS_SOURCE_CONFIGS.items():
+            if sheet_id not in rows:
+                continue
+            row = rows[sheet_id][0] if rows[sheet_id] else None
+            result[sheet_id] = {
+                'name':       config['name'],
+                'count':      int(row['cnt']) if row else 0,
+                'last_date':  row['last_date'].isoformat() if row and row['last_date'] else None,
+                'first_date': row['first_date'].isoformat() if row and row['first_date'] else None,
+                'format':     config.get('format', 'standard')
+            }
+        result = {sheet_id: result[sheet_id] for sheet_id in METALS_SOURCE_CONFIGS if sheet_id in result}
         return jsonify({'status': 'success', 'sheets': result})
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur api_metals_sheets: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
-    finally:
-        conn.close()
-
-@app.route('/api/metals/sheet/<sheet_id>')
-def api_get_sheet_data(sheet_id):
-    if sheet_id == 'summary':
-        return jsonify({'status': 'enhancement', 'sheet_id': 'summary', 'message': 'En cours — Phase Enhancement', 'data': []}), 200
-
-    if sheet_id not in METALS_SOURCE_CONFIGS:
-        return jsonify({'status': 'error',
-                        'message': f"Sheet '{sheet_id}' invalide."}), 400
-
-    config       = METALS_SOURCE_CONFIGS[sheet_id]
-    year_filter  = request.args.get('year',       type=int)
-    month_filter = request.args.get('month',      type=int)
-    start_date   = request.args.get('start_date')
-    end_date     = request.args.get('end_date')
-    metal_type   = request.args.get('metal_type')
 
+def fetch_sheet_data(cur, config, year_filter=None, month_filter=None,
+                     start_date=None, end_date=None, metal_type=None, freq=None, agg=None):
+    """Exécute la requête correspondant au format de l'onglet."""
+    fmt = config.get('format', 'standard')
+    if fmt == 'exchange_matrix':
+        return get_bme_data(cur, year_filter, month_filter)
+    elif fmt == 'year_month':
+        return get_brent_data(cur, config, year_filter, month_filter, start_date, end_date)
+    elif fmt == 'monthly_matrix':
+        return get_shme_data(cur, config, year_filter, month_filter, start_date, end_date)
+    elif fmt == 'yearly_columns':
+        return get_yearly_columns_data(cur, config, year_filter, start_date, end_date)
+    elif fmt == 'monthly_with_conversion':
+        return get_comex_data(cur, config, start_date, end_date, year_filter, month_filter)
+    return get_standard_data(cur, config, start_date, end_date, metal_type, freq, agg)
+
+@single_flight
+def get_sheet_payload(sheet_id, year_filter=None, month_filter=None,
+                      start_date=None, end_date=None, metal_type=None, freq=None, agg=None):
+    """Données + formules d'un onglet du workbook (None si la DB ou les taux ECB sont injoignables)."""
+    config = METALS_SOURCE_CONFIGS[sheet_id]
     conn = get_db_connection()
     if not conn:
-        return jsonify({'status': 'error', 'message': 'DB connection failed'}), 500
-
+        return None
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             fmt = config.get('format', 'standard')
+            data = fetch_sheet_data(cur, config, year_filter, month_filter,
+                                    start_date, end_date, metal_type, freq, agg)
 
             if fmt == 'exchange_matrix':
-                bme = get_bme_data(cur, year_filter, month_filter)
-                return jsonify({
+                return {
                     'status': 'success', 'sheet_id': sheet_id,
                     'sheet_name': config['name'],
-                    'data': bme.get('data', []),
-                    'currencies': bme.get('currencies', []),
-                    'months': bme.get('months', list(range(1, 13))),
-                    'year': bme.get('year'),
+                    'data': data.get('data', []),
+                    'currencies': data.get('currencies', []),
+                    'months': data.get('months', list(range(1, 13))),
+                    'year': data.get('year'),
                     'formulas': {},
                     'config': {'format': fmt, 'formula_type': config.get('formula_type')}
-                })
-            elif fmt == 'year_month':
-                data = get_brent_data(cur, config, year_filter, month_filter, start_date, end_date)
-            elif fmt == 'monthly_matrix':
-                data = get_shme_data(cur, config, year_filter, month_filter, start_date, end_date)
-            elif fmt == 'yearly_columns':
-                data = get_yearly_columns_data(cur, config, year_filter, start_date, end_date)
-            elif fmt == 'monthly_with_conversion':
-                data = get_comex_data(cur, config, start_date, end_date, year_filter, month_filter)
-            else:
-                data = get_standard_data(cur, config, start_date, end_date, metal_type)
+                }
 
+            if fmt in RESAMPLE_SHEET_FORMATS:
+                # prix journaliers : colonne price_eur (rééchantillonnés : taux du dernier jour observé)
+                engine = get_fx_engine() if data else None
+                if data and fx_engine_missing(engine):
+                    return None
+                add_eur_column(data, date_key='last_date' if freq else 'price_date', engine=engine)
             formulas = calculate_formulas(data, config)
-            return jsonify({
+            return {
                 'status':     'success',
                 'sheet_id':   sheet_id,
                 'sheet_name': config['name'],
@@ -1588,14 +4677,59 @@ def api_get_sheet_data(sheet_id):
                     'format':       config.get('format'),
                     'formula_type': config.get('formula_type'),
                 },
-            })
+                'freq': freq,
+                'agg':  agg,
+            }
+    finally:
+        conn.close()
+
+# Seuls les onglets de prix journaliers se rééchantillonnent ; les autres
+# formats sont déjà agrégés par mois dans leur requête
+RESAMPLE_SHEET_FORMATS = ('standard', 'daily')
+
+def sheet_cache_key(sheet_id, year=None, month=None, freq=None, agg=None):
+    key = f"sheet:{sheet_id}:{year or 'all'}:{month or 'all'}"
+    return f"{key}:{freq}:{agg}" if freq else key
+
+@app.route('/api/metals/sheet/<sheet_id>')
+def api_get_sheet_data(sheet_id):
+    if sheet_id == 'summary':
+        return jsonify({'status': 'enhancement', 'sheet_id': 'summary', 'message': 'En cours — Phase Enhancement', 'data': []}), 200
+
+    if sheet_id not in METALS_SOURCE_CONFIGS:
+        return jsonify({'status': 'error',
+                        'message': f"Sheet '{sheet_id}' invalide."}), 400
+
+    year_filter  = request.args.get('year',  type=int)
+    month_filter = request.args.get('month', type=int)
+    start_date   = request.args.get('start_date')
+    end_date     = request.args.get('end_date')
+    metal_type   = request.args.get('metal_type')
+    try:
+        freq, agg = parse_resample_args(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if freq and METALS_SOURCE_CONFIGS[sheet_id].get('format', 'standard') not in RESAMPLE_SHEET_FORMATS:
+        return jsonify({'status': 'error',
+                        'message': f"Sheet '{sheet_id}' déjà agrégé par mois : freq non supporté"}), 400
+    builder = functools.partial(get_sheet_payload, sheet_id, year_filter, month_filter,
+                                start_date, end_date, metal_type, freq, agg)
+    try:
+        if start_date or end_date or (metal_type and metal_type != 'all'):
+            payload = builder()
+            body = dump_json_body(payload) if payload is not None else None
+        else:
+            body = cached_response(sheet_cache_key(sheet_id, year_filter, month_filter, freq, agg), builder)
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur api_get_sheet_data [{sheet_id}]: {e}")
         import traceback
         logger.error(traceback.format_exc())
         return jsonify({'status': 'error', 'message': str(e)}), 500
-    finally:
-        conn.close()
+    if body is None:
+        return jsonify({'status': 'error', 'message': 'DB connection failed'}), 500
+    return json_body_response(body)
 
 @app.route('/api/metals/export/<sheet_id>')
 def export_sheet_excel(sheet_id):
@@ -1608,20 +4742,16 @@ def export_sheet_excel(sheet_id):
         if not conn:
             return jsonify({'status': 'error'}), 500
 
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            fmt = config.get('format', 'standard')
-            if fmt == 'year_month':
-                data = get_brent_data(cur, config)
-            elif fmt == 'monthly_matrix':
-                data = get_shme_data(cur, config)
-            elif fmt == 'yearly_columns':
-                data = get_yearly_columns_data(cur, config)
-            elif fmt == 'monthly_with_conversion':
-                data = get_comex_data(cur, config)
-            else:
-                data = get_standard_data(cur, config)
-        conn.close()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                fmt = config.get('format', 'standard')
+                data = fetch_sheet_data(cur, config)
+        finally:
+            conn.close()
 
+        build_started = time.perf_counter()
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
         wb = Workbook()
         ws = wb.active
         ws.title = config['name']
@@ -1719,10 +4849,13 @@ def export_sheet_excel(sheet_id):
         output = BytesIO()
         wb.save(output)
         output.seek(0)
+        record_export('export_sheet_excel', build_started, output.getbuffer().nbytes)
         filename = f"{config['name'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.xlsx"
         return send_file(output,
                          mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
                          as_attachment=True, download_name=filename)
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur export_sheet_excel [{sheet_id}]: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -1818,6 +4951,10 @@ def export_excel():
         # ----------------------------------------------------------
         # Construction du classeur Excel
         # ----------------------------------------------------------
+        build_started = time.perf_counter()
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+        from openpyxl.utils import get_column_letter
         wb = Workbook()
         ws = wb.active
         ws.title = "Historique Prix Métaux"
@@ -1897,6 +5034,7 @@ def export_excel():
         output = BytesIO()
         wb.save(output)
         output.seek(0)
+        record_export('export_excel', build_started, output.getbuffer().nbytes)
         return send_file(
             output,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
@@ -1904,6 +5042,8 @@ def export_excel():
             download_name=filename
         )
 
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur export Excel: {e}")
         return jsonify({'error': str(e)}), 500
@@ -1917,9 +5057,14 @@ def api_ecb_rates():
     end_date       = request.args.get('end_date')
     quote_currency = request.args.get('quote_currency')
     month          = request.args.get('month')
+    try:
+        freq, agg = parse_resample_args(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     rates = get_ecb_rates(start_date=start_date, end_date=end_date,
-                          quote_currency=quote_currency, month=month)
-    return jsonify({'status': 'success', 'data': [serialize_row(r) for r in rates]})
+                          quote_currency=quote_currency, month=month, freq=freq, agg=agg)
+    return jsonify({'status': 'success', 'data': [serialize_row(r) for r in rates],
+                    'freq': freq, 'agg': agg})
 
 @app.route('/ecb/rates/export')
 def api_ecb_rates_export():
@@ -1933,6 +5078,9 @@ def api_ecb_rates_export():
         if not rates:
             return jsonify({'status': 'error', 'message': 'Aucun taux à exporter'}), 404
 
+        build_started = time.perf_counter()
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
         wb = Workbook()
         ws = wb.active
         ws.title = "ECB FX Rates"
@@ -1967,10 +5115,13 @@ def api_ecb_rates_export():
         output = BytesIO()
         wb.save(output)
         output.seek(0)
+        record_export('api_ecb_rates_export', build_started, output.getbuffer().nbytes)
         filename = f"ECB_Rates_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         return send_file(output,
                          mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
                          as_attachment=True, download_name=filename)
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur export FX Excel: {e}")
         return jsonify({'error': str(e)}), 500
@@ -1988,6 +5139,9 @@ def export_florent():
         if not data:
             return jsonify({'status': 'error', 'message': 'Aucune donnée disponible'}), 404
 
+        build_started = time.perf_counter()
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
         wb = Workbook()
         ws = wb.active
         ws.title = "Monthly FX Report"
@@ -2038,19 +5192,18 @@ def export_florent():
         output = BytesIO()
         wb.save(output)
         output.seek(0)
+        record_export('export_florent', build_started, output.getbuffer().nbytes)
         filename = f"AVO_Monthly_FX_{month:02d}_{year}.xlsx"
         return send_file(output,
                          mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
                          as_attachment=True, download_name=filename)
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur export Florent: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/ecb/monthly-summary')
-def api_monthly_fx_summary():
-    year           = request.args.get('year',           type=int)
-    month          = request.args.get('month',          type=int)
-    quote_currency = request.args.get('quote_currency')
+def build_monthly_fx_summary_payload(year=None, month=None, quote_currency=None):
     summary = get_monthly_fx_summary(year, month, quote_currency)
     data = [serialize_row(r) for r in summary]
     meta_year  = year  or datetime.now().year
@@ -2061,206 +5214,717 @@ def api_monthly_fx_summary():
         'month_name':       datetime(meta_year, meta_month, 1).strftime('%B %Y'),
         'is_current_month': (meta_year == datetime.now().year and meta_month == datetime.now().month)
     }
-    return jsonify({'status': 'success', 'data': data, 'metadata': metadata})
+    return {'status': 'success', 'data': data, 'metadata': metadata}
+
+def fx_summary_cache_key(year=None, month=None, quote_currency=None):
+    """None si la combinaison n'est pas mise en cache (année sans mois…)."""
+    if not year and not month:
+        today = datetime.now()   # get_monthly_fx_summary retombe sur le mois courant
+        year, month = today.year, today.month
+    elif not year or not month:
+        return None
+    quote = quote_currency if quote_currency and quote_currency != 'all' else 'all'
+    return f"fx_summary:{year}-{month:02d}:{quote}"
 
-@app.route('/api/metals/summary')
-def api_metals_summary():
-    months_param = request.args.get('months', type=int, default=12)
-    if months_param < 1 or months_param > 36:
-        months_param = 12
+@app.route('/ecb/monthly-summary')
+def api_monthly_fx_summary():
+    year           = request.args.get('year',           type=int)
+    month          = request.args.get('month',          type=int)
+    quote_currency = request.args.get('quote_currency')
+    key = fx_summary_cache_key(year, month, quote_currency)
+    if key is None:
+        return jsonify(build_monthly_fx_summary_payload(year, month, quote_currency))
+
+    computed = {}
+    def builder():
+        payload = computed['payload'] = build_monthly_fx_summary_payload(year, month, quote_currency)
+        return payload if payload['data'] else None   # vide = DB injoignable ou mois sans taux
+    body = cached_response(key, builder)
+    if body is None:
+        return jsonify(computed['payload'])
+    return json_body_response(body)
+
+@app.route('/api/fx/convert', methods=['POST'])
+def api_fx_convert():
+    """
+    Conversion d'un lot de montants (amount, currency, date[, target]) au taux
+    ECB en vigueur à chaque date. Entrée JSON ({"rows": [...]} ou liste) ou CSV
+    (upload `file` ou corps text/csv) ; réponse diffusée par tranches, CSV pour
+    une entrée CSV et JSON sinon (?format=csv|json pour forcer).
+    """
+    default_target = request.args.get('target') or 'EUR'
+    try:
+        upload = request.files.get('file')
+        if upload is not None or request.mimetype in ('text/csv', 'text/plain'):
+            raw = upload.read() if upload is not None else request.get_data()
+            batch = read_fx_csv(raw.decode('utf-8-sig'), default_target)
+            fmt = 'csv'
+        else:
+            payload = request.get_json(silent=True)
+            if payload is None:
+                return jsonify({'status': 'error', 'message': 'Corps JSON ou CSV attendu'}), 400
+            if isinstance(payload, dict) and payload.get('target'):
+                default_target = payload['target']
+            batch = read_fx_json(payload, default_target)
+            fmt = 'json'
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    fmt = request.args.get('format', fmt)
+    if fmt not in ('csv', 'json'):
+        return jsonify({'status': 'error', 'message': 'format: csv ou json'}), 400
+    if len(batch) > FX_CONVERT_MAX_ROWS:
+        return jsonify({'status': 'error',
+                        'message': f'Lot trop volumineux (max {FX_CONVERT_MAX_ROWS} lignes)'}), 413
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'status': 'error', 'message': 'DB connection failed'}), 500
+    engine = get_fx_engine()
+    if engine is None:
+        return jsonify({'status': 'error', 'message': 'Taux ECB indisponibles'}), 503
+    started = time.perf_counter()
+    result = convert_fx_batch(engine, batch)
+    logger.info(f"Conversion FX: {len(batch)} lignes en {(time.perf_counter() - started) * 1000:.0f} ms")
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/json'
+    return Response(fx_convert_stream(engine.np, batch, result, fmt), mimetype=mimetype)
+
+# ──────────────────────────────────────────
+# ANALYTICS — FENÊTRES GLISSANTES
+# ──────────────────────────────────────────
+# Fenêtres en jours calendaires (30 j = les cotations des 30 derniers jours,
+# trous et week-ends compris). Chaque statistique glissante est tirée de
+# sommes cumulées : O(n) par série et par fenêtre, quelle que soit sa taille.
+ANALYTICS_DEFAULT_METALS  = ('copper', 'zinc', 'tin', 'silver')
+ANALYTICS_DEFAULT_WINDOWS = (30, 90)
+ANALYTICS_MAX_WINDOWS     = 6
+ANALYTICS_MAX_WINDOW_DAYS = 3650
+ANALYTICS_TRADING_DAYS    = 252   # annualisation de la volatilité
+
+def load_daily_series(sheet_id, metals, start, end):
+    """
+    {metal: (dates, prix, devise, unité)} d'un onglet journalier, un point par
+    jour (moyenne des doublons) ; None si la DB est injoignable.
+    """
+    import numpy as np
+    src_clause, params = _build_source_filter(METALS_SOURCE_CONFIGS[sheet_id])
+    rows = fetch_all('load_daily_series', f"""
+        SELECT metal_type, price_date, AVG(price)::float8 AS price,
+               MAX(currency) AS currency, MAX(unit) AS unit
+        FROM metal_prices mp
+        WHERE {src_clause}
+          AND metal_type = ANY(%s) AND price_date >= %s AND price_date <= %s
+          AND price IS NOT NULL AND price > 0
+        GROUP BY metal_type, price_date
+        ORDER BY metal_type, price_date
+    """, params + [list(metals), start, end])
+    if rows is None:
+        return None
+    grouped = {}
+    for row in rows:
+        dates, prices, meta = grouped.setdefault(row['metal_type'], ([], [], {}))
+        dates.append(row['price_date'])
+        prices.append(row['price'])
+        meta.update(currency=row['currency'], unit=row['unit'])
+    return {
+        metal: (np.asarray(dates, dtype='datetime64[D]'), np.asarray(prices, dtype=float),
+                meta['currency'], meta['unit'])
+        for metal, (dates, prices, meta) in grouped.items()
+    }
+
+def window_starts(np, dates, days):
+    """Premier index de la fenêtre de `days` jours se terminant à chaque date."""
+    return np.searchsorted(dates, dates - np.timedelta64(days - 1, 'D'), side='left')
+
+def rolling_sums(np, values, lo):
+    """
+    (n, somme, somme des carrés, centre) de values[lo[i]:i+1] - centre, par
+    différences de sommes cumulées ; les NaN sont ignorés.
+    """
+    valid = ~np.isnan(values)
+    center = float(values[valid].mean()) if valid.any() else 0.0   # limite l'annulation numérique
+    centered = np.where(valid, values - center, 0.0)
+    hi = np.arange(1, len(values) + 1)
+    count = np.concatenate(([0], np.cumsum(valid)))
+    s1 = np.concatenate(([0.0], np.cumsum(centered)))
+    s2 = np.concatenate(([0.0], np.cumsum(centered * centered)))
+    return count[hi] - count[lo], s1[hi] - s1[lo], s2[hi] - s2[lo], center
+
+def rolling_mean_std(np, values, lo):
+    """Moyenne et écart-type (ddof=1) glissants sur [lo[i], i] ; NaN sous 2 points."""
+    n, s1, s2, center = rolling_sums(np, values, lo)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = s1 / n
+        var = (s2 - s1 * mean) / (n - 1)
+    mean = np.where(n > 0, mean + center, np.nan)
+    std = np.where(n > 1, np.sqrt(np.clip(var, 0, None)), np.nan)
+    return mean, std
+
+def rolling_max(values, lo):
+    """Maximum glissant sur [lo[i], i] (lo croissant) en O(n) : file d'indices décroissante."""
+    values = values.tolist()
+    out, queue = [], deque()
+    for i, value in enumerate(values):
+        while queue and values[queue[-1]] <= value:
+            queue.pop()
+        queue.append(i)
+        while queue[0] < lo[i]:
+            queue.popleft()
+        out.append(values[queue[0]])
+    return out
+
+def max_drawdown(np, dates, prices):
+    """Plus forte baisse depuis un plus haut : {value, peak_date, trough_date}."""
+    if not len(prices):
+        return None
+    drawdown = prices / np.maximum.accumulate(prices) - 1
+    trough = int(np.argmin(drawdown))
+    peak = int(np.argmax(prices[:trough + 1]))
+    return {
+        'value':       round(float(drawdown[trough]), 6),
+        'peak_date':   str(dates[peak]),
+        'trough_date': str(dates[trough]),
+    }
+
+def rolling_series_stats(np, dates, prices, windows, first_day):
+    """Statistiques glissantes d'une série pour chaque fenêtre, restituées à partir de first_day."""
+    log_returns = np.concatenate(([np.nan], np.diff(np.log(prices))))
+    keep = dates >= first_day
+    stats = {}
+    for days in windows:
+        lo = window_starts(np, dates, days)
+        mean, std = rolling_mean_std(np, prices, lo)
+        _, returns_std = rolling_mean_std(np, log_returns, lo)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            zscore = (prices - mean) / std
+            drawdown = prices / np.asarray(rolling_max(prices, lo)) - 1
+        # Fenêtre tronquée par le début de l'historique : pas de valeur
+        full = dates - np.timedelta64(days - 1, 'D') >= dates[0]
+        columns = {
+            'mean':       mean,
+            'std':        std,
+            'volatility': returns_std * np.sqrt(ANALYTICS_TRADING_DAYS),
+            'zscore':     zscore,
+            'drawdown':   drawdown,
+        }
+        stats[str(days)] = {
+            name: [None if v != v else round(v, 6) for v in np.where(full, values, np.nan)[keep].tolist()]
+            for name, values in columns.items()
+        }
+    return stats
+
+@single_flight
+def build_rolling_payload(sheet_id, metals, windows, start, end):
+    """Statistiques glissantes par métal (None si la DB est injoignable)."""
+    import numpy as np
+    # Historique chargé une fenêtre plus tôt pour que le premier point soit complet
+    series = load_daily_series(sheet_id, metals, start - timedelta(days=max(windows)), end)
+    if series is None:
+        return None
+    first_day = np.datetime64(start, 'D')
+    result = {}
+    for metal in metals:
+        if metal not in series:
+            continue
+        dates, prices, currency, unit = series[metal]
+        keep = dates >= first_day
+        result[metal] = {
+            'currency':     currency,
+            'unit':         unit,
+            'dates':        [str(d) for d in dates[keep]],
+            'price':        [round(p, 6) for p in prices[keep].tolist()],
+            'windows':      rolling_series_stats(np, dates, prices, windows, first_day),
+            'max_drawdown': max_drawdown(np, dates[keep], prices[keep]),
+        }
+    return {
+        'status':     'success',
+        'sheet_id':   sheet_id,
+        'start_date': start.isoformat(),
+        'end_date':   end.isoformat(),
+        'windows':    list(windows),
+        'series':     result,
+    }
 
+@app.route('/api/analytics/rolling')
+def api_analytics_rolling():
+    """
+    Moyenne, écart-type, volatilité annualisée (rendements log), z-score et
+    drawdown glissants par métal, pour une ou plusieurs fenêtres (?windows=30,90).
+    """
+    if not NUMPY_AVAILABLE:
+        return jsonify({'status': 'error', 'message': 'numpy indisponible'}), 503
+    sheet_id = request.args.get('sheet', 'lme')
+    config = METALS_SOURCE_CONFIGS.get(sheet_id)
+    if not config or config.get('format', 'standard') not in RESAMPLE_SHEET_FORMATS:
+        return jsonify({'status': 'error', 'message': f"Sheet '{sheet_id}' sans prix journaliers"}), 400
+    metals = [m.strip().lower() for m in request.args.get('metals', '').split(',') if m.strip()]
+    metals = metals or [m for m in ANALYTICS_DEFAULT_METALS if m in config['metal_types']]
+    unknown = [m for m in metals if m not in config['metal_types']]
+    if unknown:
+        return jsonify({'status': 'error', 'message': f"Métaux absents de '{sheet_id}' : {', '.join(unknown)}"}), 400
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            today = datetime.now().date()
-            periods = []
-            y, m = today.year, today.month
-            for _ in range(months_param):
-                m -= 1
-                if m == 0:
-                    m = 12; y -= 1
-                periods.append(f"{y}-{m:02d}")
-            periods.sort(reverse=True)
+        windows = sorted({int(w) for w in request.args.get('windows', '').split(',') if w.strip()})
+        windows = windows or list(ANALYTICS_DEFAULT_WINDOWS)
+        if len(windows) > ANALYTICS_MAX_WINDOWS or not all(2 <= w <= ANALYTICS_MAX_WINDOW_DAYS for w in windows):
+            raise ValueError
+    except ValueError:
+        return jsonify({'status': 'error', 'message': (
+            f"windows : jusqu'à {ANALYTICS_MAX_WINDOWS} tailles entre 2 et {ANALYTICS_MAX_WINDOW_DAYS} jours")}), 400
+    try:
+        end = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() \
+            if request.args.get('end_date') else datetime.now().date()
+        start = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() \
+            if request.args.get('start_date') else end - timedelta(days=request.args.get('days', 365, type=int))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Dates au format YYYY-MM-DD'}), 400
+
+    builder = functools.partial(build_rolling_payload, sheet_id, tuple(metals), tuple(windows), start, end)
+    if request.args.get('start_date') or request.args.get('end_date'):
+        payload = builder()
+        body = dump_json_body(payload) if payload is not None else None
+    else:
+        key = f"rolling:{sheet_id}:{','.join(metals)}:{','.join(map(str, windows))}:{start.isoformat()}"
+        body = cached_response(key, builder)
+    if body is None:
+        return jsonify({'status': 'error', 'message': 'DB connection failed'}), 500
+    return json_body_response(body)
 
-            cur.execute("""
+# ──────────────────────────────────────────
+# ANALYTICS — ÉCARTS ENTRE SOURCES CUIVRE
+# ──────────────────────────────────────────
+# Chaque cotation cuivre est ramenée en €/kg avec les règles du tableau de
+# synthèse (build_metals_summary), puis alignée sur une grille commune de
+# dates ou de mois : une matrice sources × périodes, NaN là où une source ne
+# cote pas. Écarts et corrélations se calculent sur les paires de points
+# présents des deux côtés, par produits matriciels sur le panneau.
+SPREAD_COPPER_CURRENCIES = {'lme': 'USD', 'comex': 'USD', 'shme': 'CNY', 'girm': 'EUR', 'lsnikko': 'KRW'}
+SPREAD_GRIDS             = ('day', 'month')
+SPREAD_MIN_OBSERVATIONS  = 3   # en dessous, pas de corrélation
+
+def copper_price_per_kg(np, sheet_id, prices):
+    """Prix cuivre d'une source en devise de cotation par kg."""
+    config = METALS_SOURCE_CONFIGS[sheet_id]
+    if sheet_id == 'comex':
+        return prices * config['conversion_factor']            # USD/lb → USD/kg
+    elif sheet_id == 'shme':
+        return prices / config['vat_divisor'] / 1000           # CNY/t TTC → CNY/kg hors TVA
+    elif sheet_id == 'girm':
+        return np.where(prices > 30, prices / 100, prices)     # saisies en centimes
+    return prices / 1000                                       # /t → /kg
+
+def copper_panel(np, fx, series, sources, grid, start, end):
+    """(périodes, matrice €/kg sources × périodes) alignée sur la grille."""
+    if grid == 'month':
+        periods = np.arange(np.datetime64(start, 'M'), np.datetime64(end, 'M') + 1)
+    else:
+        periods = np.unique(np.concatenate(
+            [series[s][0] for s in sources if s in series] or [np.array([], dtype='datetime64[D]')]))
+    panel = np.full((len(sources), len(periods)), np.nan)
+    for row, sheet_id in enumerate(sources):
+        if sheet_id not in series:
+            continue
+        dates, prices = series[sheet_id][:2]
+        per_kg = copper_price_per_kg(np, sheet_id, prices)
+        currency = SPREAD_COPPER_CURRENCIES[sheet_id]
+        if grid == 'month':
+            # Moyenne mensuelle du prix × moyenne mensuelle des fixings (convention de la synthèse)
+            idx = np.searchsorted(periods, dates.astype('datetime64[M]'))
+            counts = np.bincount(idx, minlength=len(periods))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                average = np.bincount(idx, weights=per_kg, minlength=len(periods)) / counts
+                rates = fx.monthly_average('EUR', periods) / fx.monthly_average(currency, periods)
+            panel[row] = np.where(counts > 0, average * rates, np.nan)
+        else:
+            panel[row, np.searchsorted(periods, dates)] = per_kg * fx.cross_rates(currency, 'EUR', dates)
+    return periods, panel
+
+def pairwise_stats(np, panel):
+    """
+    Matrices sources × sources sur les points communs à chaque paire : nombre
+    de points, écart moyen (ligne − colonne), dernier écart et sa période,
+    corrélation des variations log d'une période à l'autre.
+    """
+    present = ~np.isnan(panel)
+    mask = present.astype(float)
+    values = np.where(present, panel, 0.0)
+    observations = mask @ mask.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_spread = (values @ mask.T - mask @ values.T) / observations
+
+    # Dernier point commun de chaque paire
+    both = present[:, None, :] & present[None, :, :]
+    last = np.where(both.any(axis=2), both.shape[2] - 1 - np.argmax(both[:, :, ::-1], axis=2), -1)
+    i, j = np.indices(last.shape)
+    latest = np.where(last >= 0, panel[i, last.clip(0)] - panel[j, last.clip(0)], np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = np.diff(np.log(panel), axis=1)
+    r_present = ~np.isnan(returns)
+    r_mask = r_present.astype(float)
+    r = np.where(r_present, returns, 0.0)
+    n = r_mask @ r_mask.T
+    sx, sxx, sxy = r @ r_mask.T, (r * r) @ r_mask.T, r @ r.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxy - sx * sx.T / n
+        var_x = sxx - sx * sx / n
+        var_y = sxx.T - sx.T * sx.T / n
+        correlation = cov / np.sqrt(var_x * var_y)
+    correlation = np.where(n >= SPREAD_MIN_OBSERVATIONS, np.clip(correlation, -1, 1), np.nan)
+    return observations, mean_spread, latest, last, correlation
+
+@single_flight
+def build_spreads_payload(sources, grid, start, end):
+    """Panneau cuivre €/kg et matrices d'écarts / corrélations (None si DB ou taux indisponibles)."""
+    import numpy as np
+    tasks = {
+        sheet_id: functools.partial(load_daily_series, sheet_id, ('copper',), start, end)
+        for sheet_id in sources
+    }
+    tasks['fx'] = get_fx_engine
+    results = run_concurrently(tasks)
+    fx = results.pop('fx')
+    if fx is None or any(r is None for r in results.values()):
+        return None
+    series = {sheet_id: r['copper'] for sheet_id, r in results.items() if 'copper' in r}
+    periods, panel = copper_panel(np, fx, series, sources, grid, start, end)
+    observations, mean_spread, latest, last, correlation = pairwise_stats(np, panel)
+    labels = [str(p) for p in periods]
+
+    def matrix(values, digits):
+        return [[None if v != v else round(v, digits) for v in row] for row in values.tolist()]
+
+    return {
+        'status':     'success',
+        'grid':       grid,
+        'unit':       'EUR/kg',
+        'start_date': start.isoformat(),
+        'end_date':   end.isoformat(),
+        'sources':    list(sources),
+        'names':      [METALS_SOURCE_CONFIGS[s]['name'] for s in sources],
+        'periods':    labels,
+        'series':     dict(zip(sources, matrix(panel, 4))),
+        'spread': {
+            'mean':        matrix(mean_spread, 4),
+            'latest':      matrix(latest, 4),
+            'latest_date': [[labels[k] if k >= 0 else None for k in row] for row in last.tolist()],
+        },
+        'correlation':  matrix(correlation, 4),
+        'observations': observations.astype(int).tolist(),
+    }
+
+@app.route('/api/analytics/spreads')
+def api_analytics_spreads():
+    """
+    Cuivre LME, COMEX, SHME, GIRM et LS Nikko en €/kg sur une grille commune
+    (?grid=month|day) : panneau aligné, matrices d'écarts (ligne − colonne) et
+    de corrélation des variations.
+    """
+    if not NUMPY_AVAILABLE:
+        return jsonify({'status': 'error', 'message': 'numpy indisponible'}), 503
+    grid = request.args.get('grid', 'month')
+    if grid not in SPREAD_GRIDS:
+        return jsonify({'status': 'error', 'message': f"grid : {' ou '.join(SPREAD_GRIDS)}"}), 400
+    sources = [s.strip().lower() for s in request.args.get('sources', '').split(',') if s.strip()]
+    sources = sources or list(SPREAD_COPPER_CURRENCIES)
+    unknown = [s for s in sources if s not in SPREAD_COPPER_CURRENCIES]
+    if unknown or len(set(sources)) < 2:
+        return jsonify({'status': 'error', 'message': (
+            f"sources : au moins deux parmi {', '.join(SPREAD_COPPER_CURRENCIES)}")}), 400
+    try:
+        end = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() \
+            if request.args.get('end_date') else datetime.now().date()
+        start = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() \
+            if request.args.get('start_date') else end - timedelta(days=request.args.get('days', 365, type=int))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Dates au format YYYY-MM-DD'}), 400
+    if grid == 'month':
+        start = start.replace(day=1)
+
+    builder = functools.partial(build_spreads_payload, tuple(dict.fromkeys(sources)), grid, start, end)
+    if request.args.get('start_date') or request.args.get('end_date'):
+        payload = builder()
+        body = dump_json_body(payload) if payload is not None else None
+    else:
+        body = cached_response(f"spreads:{grid}:{','.join(dict.fromkeys(sources))}:{start.isoformat()}", builder)
+    if body is None:
+        return jsonify({'status': 'error', 'message': 'DB ou taux ECB indisponibles'}), 503
+    return json_body_response(body)
+
+@single_flight
+@query_label('api_metals_summary')
+def build_metals_summary(months_param):
+    """Tableau de synthèse mensuel multi-marchés (None si la DB ou les taux ECB sont injoignables)."""
+    today = datetime.now().date()
+    periods = []
+    y, m = today.year, today.month
+    for _ in range(months_param):
+        m -= 1
+        if m == 0:
+            m = 12; y -= 1
+        periods.append(f"{y}-{m:02d}")
+    periods.sort(reverse=True)
+    since = date(today.year - 3, 1, 1)
+
+    lme_patterns = ['metals.dev', 'Metal.dev API']
+    lme_clauses  = ' OR '.join(["(source_url ILIKE %s OR source_url = %s)"] * len(lme_patterns))
+    lme_params   = []
+    for p in lme_patterns:
+        lme_params.extend([f'%{p}%', p])
+
+    def lme_metal(metal):
+        return (f"""
+            SELECT TO_CHAR(DATE_TRUNC('month', price_date), 'YYYY-MM') AS period,
+                   AVG(price)/1000 AS avg_price
+            FROM metal_prices
+            WHERE ({lme_clauses}) AND metal_type = %s AND price_date >= %s
+            GROUP BY DATE_TRUNC('month', price_date)
+        """, lme_params + [metal, since])
+
+    # Sous-requêtes indépendantes : lancées en parallèle, chacune sur sa connexion
+    queries = {
+        'lme_copper': lme_metal('copper'),
+        'lme_zinc':   lme_metal('zinc'),
+        'lme_tin':    lme_metal('tin'),
+        'comex': ("""
+            SELECT TO_CHAR(DATE_TRUNC('month', price_date), 'YYYY-MM') AS period,
+                   AVG(price) * 2.203 AS price_kg_usd
+            FROM metal_prices
+            WHERE source_url ILIKE '%%comexlive%%' AND price_date >= %s
+            GROUP BY DATE_TRUNC('month', price_date)
+        """, (since,)),
+        'girm': ("""
+            SELECT TO_CHAR(DATE_TRUNC('month', price_date), 'YYYY-MM') AS period,
+                   AVG(price) AS avg_price
+            FROM metal_prices
+            WHERE source_url ILIKE '%%m-lego%%' AND price_date >= %s
+            GROUP BY DATE_TRUNC('month', price_date)
+        """, (since,)),
+        'lsnikko': ("""
+            SELECT TO_CHAR(DATE_TRUNC('month', price_date), 'YYYY-MM') AS period,
+                   AVG(price) AS avg_price
+            FROM metal_prices WHERE source_product_name = 'LS Nikko' AND price_date >= %s
+            GROUP BY DATE_TRUNC('month', price_date)
+        """, (since,)),
+        'shme': ("""
+            SELECT TO_CHAR(DATE_TRUNC('month', price_date), 'YYYY-MM') AS period,
+                   AVG(price) / 1.13 / 1000 AS cu_nonvat_kg
+            FROM metal_prices
+            WHERE source_url ILIKE '%%shmet%%' AND metal_type = 'copper' AND price_date >= %s
+            GROUP BY DATE_TRUNC('month', price_date)
+        """, (since,)),
+    }
+    if not NUMPY_AVAILABLE:
+        # Sans moteur FX : moyennes mensuelles des fixings calculées en SQL
+        for currency in ('USD', 'KRW', 'CNY'):
+            queries[f'ecb_{currency}'] = ("""
                 SELECT TO_CHAR(DATE_TRUNC('month', ref_date), 'YYYY-MM') AS period,
                        AVG(rate) AS fx_rate
-                FROM ecb_exchange_rates
-                WHERE quote_currency = 'USD'
-                  AND ref_date >= %s
+                FROM ecb_exchange_rates WHERE quote_currency = %s AND ref_date >= %s
                 GROUP BY DATE_TRUNC('month', ref_date)
-                ORDER BY period DESC
-            """, (date(today.year - 3, 1, 1),))
-            fx_map = {r['period']: float(r['fx_rate']) for r in cur.fetchall()}
-
-            result_rows = []
-            result_rows.append({
-                'market': 'FX', 'label': 'USD/EUR', 'metric': 'fx_usd_eur',
-                'currency': 'rate', 'decimals': 4,
-                'values': {p: fx_map.get(p) for p in periods}
-            })
+            """, (currency, since))
+    tasks = {
+        name: functools.partial(fetch_all, f'api_metals_summary.{name}', query, params)
+        for name, (query, params) in queries.items()
+    }
+    if NUMPY_AVAILABLE:
+        tasks['fx'] = get_fx_engine
+    results = run_concurrently(tasks)
+    fx = results.pop('fx', None)
+    if fx_engine_missing(fx) or any(rows is None for rows in results.values()):
+        return None
 
-            lme_patterns = ['metals.dev', 'Metal.dev API']
-            lme_clauses  = ' OR '.join(["(source_url ILIKE %s OR source_url = %s)"] * len(lme_patterns))
-            lme_params   = []
-            for p in lme_patterns:
-                lme_params.extend([f'%{p}%', p])
-
-            for metal, label_usd, label_eur in [
-                ('copper', 'Cu USD/kg', 'Cu €/kg'),
-                ('zinc',   'Zn USD/kg', 'Zn €/kg'),
-                ('tin',    'Sn USD/kg', 'Sn €/kg'),
-            ]:
-                cur.execute(f"""
-                    SELECT TO_CHAR(DATE_TRUNC('month', price_date), 'YYYY-MM') AS period,
-                           AVG(price)/1000 AS avg_price
-                    FROM metal_prices
-                    WHERE ({lme_clauses}) AND metal_type = %s AND price_date >= %s
-                    GROUP BY DATE_TRUNC('month', price_date)
-                    ORDER BY period DESC
-                """, lme_params + [metal, date(today.year - 3, 1, 1)])
-                usd_map = {r['period']: float(r['avg_price']) for r in cur.fetchall()}
-                result_rows.append({
-                    'market': 'LME', 'label': label_usd, 'metric': f'lme_{metal}_usd',
-                    'currency': 'USD', 'decimals': 4,
-                    'values': {p: usd_map.get(p) for p in periods}
-                })
-                result_rows.append({
-                    'market': 'LME', 'label': label_eur, 'metric': f'lme_{metal}_eur',
-                    'currency': 'EUR', 'decimals': 4,
-                    'values': {p: (usd_map[p]/fx_map[p] if p in usd_map and p in fx_map and fx_map[p] else None)
-                               for p in periods}
-                })
-
-            cu_usd_map = next((r['values'] for r in result_rows if r.get('metric') == 'lme_copper_usd'), {})
-            sorted_periods = sorted(periods)
-            var_vals = {}
-            for i, p in enumerate(sorted_periods[1:], 1):
-                prev = sorted_periods[i-1]
-                if cu_usd_map.get(p) and cu_usd_map.get(prev):
-                    var_vals[p] = (cu_usd_map[p] - cu_usd_map[prev]) / cu_usd_map[prev]
-            result_rows.append({
-                'market': 'LME', 'label': 'Var Cu USD Δ%', 'metric': 'lme_cu_var',
-                'currency': 'USD', 'decimals': 4, 'values': var_vals
-            })
+    def period_map(name, column):
+        return {r['period']: float(r[column]) for r in results[name]}
+
+    def monthly_average(currency):
+        if currency == 'EUR':
+            return dict.fromkeys(periods, 1.0)
+        return period_map(f'ecb_{currency}', 'fx_rate')
+
+    def monthly_cross(base, quote):
+        # Moyennes mensuelles des fixings ECB, triangulées via l'EUR
+        if fx:
+            return fx.monthly_cross_rates(base, quote, periods)
+        base_avg, quote_avg = monthly_average(base), monthly_average(quote)
+        return {p: quote_avg[p] / base_avg[p] for p in periods
+                if base_avg.get(p) and quote_avg.get(p)}
+
+    fx_map  = monthly_cross('EUR', 'USD')
+    usd_eur = monthly_cross('USD', 'EUR')
+    krw_eur = monthly_cross('KRW', 'EUR')
+    cny_eur = monthly_cross('CNY', 'EUR')
+
+    result_rows = []
+    result_rows.append({
+        'market': 'FX', 'label': 'USD/EUR', 'metric': 'fx_usd_eur',
+        'currency': 'rate', 'decimals': 4,
+        'values': {p: fx_map.get(p) for p in periods}
+    })
 
-            zn_lme = next((r['values'] for r in result_rows if r.get('metric') == 'lme_zinc_usd'), {})
-            for alloy, cu_pct, zn_pct in [('CuZn30', 0.70, 0.30), ('CuZn33', 0.67, 0.33), ('CuZn36', 0.64, 0.36)]:
-                result_rows.append({
-                    'market': 'LME', 'label': f'{alloy} USD/kg', 'metric': f'lme_{alloy.lower()}_usd',
-                    'currency': 'USD', 'decimals': 4,
-                    'values': {p: (cu_usd_map[p]*cu_pct + zn_lme[p]*zn_pct
-                                   if p in cu_usd_map and p in zn_lme else None)
-                               for p in periods}
-                })
+    for metal, label_usd, label_eur in [
+        ('copper', 'Cu USD/kg', 'Cu €/kg'),
+        ('zinc',   'Zn USD/kg', 'Zn €/kg'),
+        ('tin',    'Sn USD/kg', 'Sn €/kg'),
+    ]:
+        usd_map = period_map(f'lme_{metal}', 'avg_price')
+        result_rows.append({
+            'market': 'LME', 'label': label_usd, 'metric': f'lme_{metal}_usd',
+            'currency': 'USD', 'decimals': 4,
+            'values': {p: usd_map.get(p) for p in periods}
+        })
+        result_rows.append({
+            'market': 'LME', 'label': label_eur, 'metric': f'lme_{metal}_eur',
+            'currency': 'EUR', 'decimals': 4,
+            'values': {p: (usd_map[p] * usd_eur[p] if p in usd_map and p in usd_eur else None)
+                       for p in periods}
+        })
 
-            cur.execute("""
-                SELECT TO_CHAR(DATE_TRUNC('month', price_date), 'YYYY-MM') AS period,
-                       AVG(price) * 2.203 AS price_kg_usd
-                FROM metal_prices
-                WHERE source_url ILIKE '%comexlive%' AND price_date >= %s
-                GROUP BY DATE_TRUNC('month', price_date) ORDER BY period DESC
-            """, (date(today.year - 3, 1, 1),))
-            comex_map = {r['period']: float(r['price_kg_usd']) for r in cur.fetchall()}
-            result_rows.append({
-                'market': 'COMEX', 'label': 'Cu USD/kg', 'metric': 'comex_cu_usd',
-                'currency': 'USD', 'decimals': 4,
-                'values': {p: comex_map.get(p) for p in periods}
-            })
-            result_rows.append({
-                'market': 'COMEX', 'label': 'Cu €/kg', 'metric': 'comex_cu_eur',
-                'currency': 'EUR', 'decimals': 4,
-                'values': {p: (comex_map[p]/fx_map[p] if p in comex_map and p in fx_map and fx_map[p] else None)
-                           for p in periods}
-            })
+    cu_usd_map = next((r['values'] for r in result_rows if r.get('metric') == 'lme_copper_usd'), {})
+    sorted_periods = sorted(periods)
+    var_vals = {}
+    for i, p in enumerate(sorted_periods[1:], 1):
+        prev = sorted_periods[i-1]
+        if cu_usd_map.get(p) and cu_usd_map.get(prev):
+            var_vals[p] = (cu_usd_map[p] - cu_usd_map[prev]) / cu_usd_map[prev]
+    result_rows.append({
+        'market': 'LME', 'label': 'Var Cu USD Δ%', 'metric': 'lme_cu_var',
+        'currency': 'USD', 'decimals': 4, 'values': var_vals
+    })
 
-            cur.execute("""
-                SELECT TO_CHAR(DATE_TRUNC('month', price_date), 'YYYY-MM') AS period,
-                       AVG(price) AS avg_price
-                FROM metal_prices
-                WHERE source_url ILIKE '%m-lego%' AND price_date >= %s
-                GROUP BY DATE_TRUNC('month', price_date) ORDER BY period DESC
-            """, (date(today.year - 3, 1, 1),))
-            girm_map = {r['period']: (float(r['avg_price'])/100 if float(r['avg_price']) > 30 else float(r['avg_price']))
-                        for r in cur.fetchall()}
-            result_rows.append({
-                'market': 'GIRM', 'label': 'Cu €/kg', 'metric': 'girm_cu_eur',
-                'currency': 'EUR', 'decimals': 4,
-                'values': {p: girm_map.get(p) for p in periods}
-            })
+    zn_lme = next((r['values'] for r in result_rows if r.get('metric') == 'lme_zinc_usd'), {})
+    for alloy, cu_pct, zn_pct in [('CuZn30', 0.70, 0.30), ('CuZn33', 0.67, 0.33), ('CuZn36', 0.64, 0.36)]:
+        result_rows.append({
+            'market': 'LME', 'label': f'{alloy} USD/kg', 'metric': f'lme_{alloy.lower()}_usd',
+            'currency': 'USD', 'decimals': 4,
+            'values': {p: (cu_usd_map[p]*cu_pct + zn_lme[p]*zn_pct
+                           if cu_usd_map.get(p) is not None and zn_lme.get(p) is not None else None)
+                       for p in periods}
+        })
 
-            cur.execute("""
-                SELECT TO_CHAR(DATE_TRUNC('month', price_date), 'YYYY-MM') AS period,
-                       AVG(price) AS avg_price
-                FROM metal_prices WHERE source_product_name = 'LS Nikko' AND price_date >= %s
-                GROUP BY DATE_TRUNC('month', price_date) ORDER BY period DESC
-            """, (date(today.year - 3, 1, 1),))
-            lsn_map = {r['period']: float(r['avg_price']) for r in cur.fetchall()}
-            cur.execute("""
-                SELECT TO_CHAR(DATE_TRUNC('month', ref_date), 'YYYY-MM') AS period,
-                       AVG(rate) AS fx_rate
-                FROM ecb_exchange_rates WHERE quote_currency = 'KRW' AND ref_date >= %s
-                GROUP BY DATE_TRUNC('month', ref_date)
-            """, (date(today.year - 3, 1, 1),))
-            krw_map = {r['period']: float(r['fx_rate']) for r in cur.fetchall()}
-            result_rows.append({
-                'market': 'LS NIKKO', 'label': 'Cu €/kg', 'metric': 'lsnikko_cu_eur',
-                'currency': 'EUR', 'decimals': 4,
-                'values': {p: (lsn_map[p] / krw_map[p] / 1000
-                               if p in lsn_map and p in krw_map and krw_map[p] else None)
-                           for p in periods}
-            })
+    comex_map = period_map('comex', 'price_kg_usd')
+    result_rows.append({
+        'market': 'COMEX', 'label': 'Cu USD/kg', 'metric': 'comex_cu_usd',
+        'currency': 'USD', 'decimals': 4,
+        'values': {p: comex_map.get(p) for p in periods}
+    })
+    result_rows.append({
+        'market': 'COMEX', 'label': 'Cu €/kg', 'metric': 'comex_cu_eur',
+        'currency': 'EUR', 'decimals': 4,
+        'values': {p: (comex_map[p] * usd_eur[p] if p in comex_map and p in usd_eur else None)
+                   for p in periods}
+    })
 
-            cur.execute("""
-                SELECT TO_CHAR(DATE_TRUNC('month', price_date), 'YYYY-MM') AS period,
-                       AVG(price) / 1.13 / 1000 AS cu_nonvat_kg
-                FROM metal_prices
-                WHERE source_url ILIKE '%shmet%' AND metal_type = 'copper' AND price_date >= %s
-                GROUP BY DATE_TRUNC('month', price_date) ORDER BY period DESC
-            """, (date(today.year - 3, 1, 1),))
-            shme_map = {r['period']: float(r['cu_nonvat_kg']) for r in cur.fetchall()}
-            cur.execute("""
-                SELECT TO_CHAR(DATE_TRUNC('month', ref_date), 'YYYY-MM') AS period,
-                       AVG(rate) AS fx_rate
-                FROM ecb_exchange_rates WHERE quote_currency = 'CNY' AND ref_date >= %s
-                GROUP BY DATE_TRUNC('month', ref_date)
-            """, (date(today.year - 3, 1, 1),))
-            cny_map = {r['period']: float(r['fx_rate']) for r in cur.fetchall()}
-            result_rows.append({
-                'market': 'SHME', 'label': 'Cu CNY/kg (Non-VAT)', 'metric': 'shme_cu_cny',
-                'currency': 'CNY', 'decimals': 3,
-                'values': {p: shme_map.get(p) for p in periods}
-            })
-            result_rows.append({
-                'market': 'SHME', 'label': 'Cu €/kg', 'metric': 'shme_cu_eur',
-                'currency': 'EUR', 'decimals': 4,
-                'values': {p: (shme_map[p] / cny_map[p]
-                               if p in shme_map and p in cny_map and cny_map[p] else None)
-                           for p in periods}
-            })
+    girm_map = {p: (v/100 if v > 30 else v) for p, v in period_map('girm', 'avg_price').items()}
+    result_rows.append({
+        'market': 'GIRM', 'label': 'Cu €/kg', 'metric': 'girm_cu_eur',
+        'currency': 'EUR', 'decimals': 4,
+        'values': {p: girm_map.get(p) for p in periods}
+    })
 
-            return jsonify({
-                'status': 'success',
-                'periods': periods,
-                'data': result_rows,
-                'metadata': {
-                    'months':       months_param,
-                    'generated_at': datetime.now().isoformat()
-                }
-            })
+    lsn_map = period_map('lsnikko', 'avg_price')
+    result_rows.append({
+        'market': 'LS NIKKO', 'label': 'Cu €/kg', 'metric': 'lsnikko_cu_eur',
+        'currency': 'EUR', 'decimals': 4,
+        'values': {p: (lsn_map[p] * krw_eur[p] / 1000 if p in lsn_map and p in krw_eur else None)
+                   for p in periods}
+    })
+
+    shme_map = period_map('shme', 'cu_nonvat_kg')
+    result_rows.append({
+        'market': 'SHME', 'label': 'Cu CNY/kg (Non-VAT)', 'metric': 'shme_cu_cny',
+        'currency': 'CNY', 'decimals': 3,
+        'values': {p: shme_map.get(p) for p in periods}
+    })
+    result_rows.append({
+        'market': 'SHME', 'label': 'Cu €/kg', 'metric': 'shme_cu_eur',
+        'currency': 'EUR', 'decimals': 4,
+        'values': {p: (shme_map[p] * cny_eur[p] if p in shme_map and p in cny_eur else None)
+                   for p in periods}
+    })
+
+    return {
+        'status': 'success',
+        'periods': periods,
+        'data': result_rows,
+        'metadata': {
+            'months':       months_param,
+            'generated_at': datetime.now().isoformat()
+        }
+    }
+
+@app.route('/api/metals/summary')
+def api_metals_summary():
+    months_param = request.args.get('months', type=int, default=12)
+    if months_param < 1 or months_param > 36:
+        months_param = 12
+
+    try:
+        body = cached_response(f"summary:{months_param}",
+                               functools.partial(build_metals_summary, months_param))
+    except QueryCanceled:
+        raise
     except Exception as e:
         logger.error(f"Erreur api_metals_summary: {e}")
         import traceback
         logger.error(traceback.format_exc())
         return jsonify({'status': 'error', 'message': str(e)}), 500
-    finally:
-        conn.close()
+    if body is None:
+        return jsonify({'status': 'error', 'message': 'DB connection failed'}), 500
+    return json_body_response(body)
+
+# ===============================
+# FABRIQUE D'APPLICATION
+# ===============================
+# gunicorn charge `app:create_app()` (gunicorn.conf.py) : le pool se remplit
+# en tâche de fond et le scheduler est candidat dès le chargement du worker,
+# sans retarder sa première réponse. Avec un autre point d'entrée (`app:app`,
+# client de test, benchmark), ces services démarrent à la première requête,
+# seulement vers une base explicite (DATABASE_URL) et hors app.testing : sans
+# DATABASE_URL, DB_CONFIG vise la base de production.
+_runtime_pid = None
+_runtime_lock = threading.Lock()
+
+def run_schema_migrations():
+    """Triggers et tables dérivées posés au démarrage (idempotent, sous verrou consultatif)."""
+    results = [migrate_latest_prices(), migrate_data_changes()]
+    return all(results)
+
+def start_runtime_services():
+    """Services propres à chaque process (pool chaud, élection du scheduler), une fois par pid."""
+    global _runtime_pid
+    if _runtime_pid == os.getpid():
+        return
+    with _runtime_lock:
+        if _runtime_pid == os.getpid():
+            return
+        _runtime_pid = os.getpid()
+        threading.Thread(target=_warm_db_pool_job, daemon=True, name='db-pool-warmup').start()
+        if not SCHEDULER_AVAILABLE:
+            # Sans scheduler, pas de leader : chaque worker pose le schéma (idempotent, sous verrou)
+            threading.Thread(target=run_schema_migrations, daemon=True, name='schema-migrations').start()
+        start_scheduler_election()
+
+def _warm_db_pool_job():
+    started = time.perf_counter()
+    warmed = warm_db_pool()
+    logger.info(f"🚀 Worker {os.getpid()} : {warmed} connexion(s) DB ouvertes "
+                f"en {(time.perf_counter() - started) * 1000:.0f} ms")
+
+_runtime_skip_logged = [False]
+
+@app.before_request
+def _ensure_runtime_services():
+    if app.testing or not os.environ.get('DATABASE_URL'):
+        if not _runtime_skip_logged[0]:
+            _runtime_skip_logged[0] = True
+            logger.warning("Services d'arrière-plan non démarrés (app.testing ou DATABASE_URL absent) : "
+                           "point d'entrée de production = create_app()")
+        return
+    start_runtime_services()
+
+def create_app():
+    """Point d'entrée WSGI : `gunicorn 'app:create_app()'`."""
+    start_runtime_services()
+    return app
 
 # ===============================
 # POINT D'ENTRÉE
 # ===============================
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    create_app().run(debug=True, port=5000)
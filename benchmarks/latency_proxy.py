@@ -0,0 +1,76 @@
+# benchmarks/latency_proxy.py - Proxy TCP ajoutant une latence réseau
+"""
+Relaie un port TCP local vers PostgreSQL (TCP ou socket Unix) en retardant
+chaque paquet, pour reproduire en local la latence d'une base distante
+(Azure Postgres) avant un benchmark ou un test de charge.
+
+    python benchmarks/latency_proxy.py --listen 127.0.0.1:6543 --target /tmp/pg/.s.PGSQL.5432 --rtt-ms 20
+    DATABASE_URL=postgresql://user@127.0.0.1:6543/lme_bench python benchmarks/run_benchmarks.py …
+"""
+
+import argparse
+import asyncio
+import time
+
+
+async def _pipe(reader, writer, delay):
+    # File ordonnée : chaque paquet part `delay` secondes après sa réception
+    queue = asyncio.Queue()
+
+    async def forward():
+        while True:
+            due, data = await queue.get()
+            if data is None:
+                break
+            pause = due - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+    sender = asyncio.create_task(forward())
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            queue.put_nowait((time.monotonic() + delay, data))
+    except ConnectionError:
+        pass
+    finally:
+        queue.put_nowait((0, None))
+        await sender
+
+
+async def serve(listen_host, listen_port, target, delay):
+    async def handle(client_reader, client_writer):
+        if target.startswith('/'):
+            server_reader, server_writer = await asyncio.open_unix_connection(target)
+        else:
+            host, port = target.rsplit(':', 1)
+            server_reader, server_writer = await asyncio.open_connection(host, int(port))
+        await asyncio.gather(
+            _pipe(client_reader, server_writer, delay),
+            _pipe(server_reader, client_writer, delay),
+            return_exceptions=True,
+        )
+
+    server = await asyncio.start_server(handle, listen_host, listen_port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--listen', default='127.0.0.1:6543')
+    parser.add_argument('--target', required=True, help='host:port ou chemin de socket Unix')
+    parser.add_argument('--rtt-ms', type=float, default=20, help='aller-retour ajouté (ms)')
+    args = parser.parse_args()
+    host, port = args.listen.rsplit(':', 1)
+    print(f"{args.listen} → {args.target} (+{args.rtt_ms} ms RTT)")
+    asyncio.run(serve(host, int(port), args.target, args.rtt_ms / 2000))
+
+
+if __name__ == '__main__':
+    main()
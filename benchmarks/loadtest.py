@@ -0,0 +1,341 @@
+# benchmarks/loadtest.py - Générateur de charge rejouant les sessions du dashboard
+"""
+Simule N utilisateurs concurrents du dashboard contre l'app servie par
+gunicorn, avec les mêmes rafales que le frontend :
+
+- ouverture : page, /api/bootstrap, puis loadData (statistiques + historique
+  en parallèle, comme le Promise.all de templates/index.html) ;
+- rafraîchissement loadData toutes les 5 minutes (--refresh, compressible) ;
+- navigation : changement de filtre, onglet workbook (/api/metals/sheets
+  puis /api/metals/sheet/<id>), page FX, téléchargements d'exports.
+
+Rapporte p50/p95/p99 et taux d'erreur par route, et le nombre de connexions
+PostgreSQL (pg_stat_activity) échantillonné pendant le test.
+
+    python benchmarks/loadtest.py --url http://127.0.0.1:8000 --users 10,25,50 --duration 60
+    python benchmarks/loadtest.py --spawn --workers 4 --dsn postgresql://localhost/lme_bench --users 20
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+SHEET_IDS = ['brent', 'comex', 'girm', 'shme', 'lsnikko', 'silver', 'lme']
+METALS    = ['copper', 'zinc', 'tin', 'silver']
+FX_QUOTES = ['USD', 'CNY', 'KRW', 'GBP', 'JPY']
+
+# Regroupe les URLs par route pour les statistiques
+ROUTE_PATTERNS = [
+    (re.compile(r'^/api/metals/sheet/[^/?]+'),  '/api/metals/sheet/<id>'),
+    (re.compile(r'^/api/metals/export/[^/?]+'), '/api/metals/export/<id>'),
+]
+
+# Poids des actions après l'ouverture de session
+ACTIONS = [
+    ('filter_change', 30),
+    ('sheet_switch',  30),
+    ('fx_page',       20),
+    ('export',         5),
+    ('idle',          15),
+]
+
+
+def route_name(url):
+    path = url.split('?', 1)[0]
+    for pattern, name in ROUTE_PATTERNS:
+        if pattern.match(path):
+            return name
+    return path
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+
+    def record(self, route, elapsed_ms, ok, size):
+        with self._lock:
+            self.latencies[route].append(elapsed_ms)
+            self.bytes[route] += size
+            if not ok:
+                self.errors[route] += 1
+
+    def summary(self, duration):
+        rows = []
+        for route, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+            rows.append({
+                'route':      route,
+                'requests':   len(ordered),
+                'rps':        round(len(ordered) / duration, 2),
+                'p50_ms':     round(pick(0.50), 1),
+                'p95_ms':     round(pick(0.95), 1),
+                'p99_ms':     round(pick(0.99), 1),
+                'max_ms':     round(ordered[-1], 1),
+                'error_rate': round(self.errors[route] / len(ordered), 4),
+                'avg_bytes':  self.bytes[route] // len(ordered),
+            })
+        return rows
+
+
+class VirtualUser(threading.Thread):
+    """Un onglet de navigateur : 6 requêtes parallèles max, comme un navigateur par hôte."""
+
+    def __init__(self, base_url, stats, stop_at, args, seed):
+        super().__init__(daemon=True)
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.stop_at = stop_at
+        self.args = args
+        self.rng = random.Random(seed)
+        self.pool = ThreadPoolExecutor(max_workers=6)
+
+    def get(self, url):
+        started = time.perf_counter()
+        ok, size = False, 0
+        try:
+            with urllib.request.urlopen(self.base_url + url, timeout=self.args.timeout) as resp:
+                size = len(resp.read())
+                ok = resp.status < 400
+        except urllib.error.HTTPError as e:
+            size = len(e.read() or b'')
+        except Exception:
+            pass
+        self.stats.record(route_name(url), (time.perf_counter() - started) * 1000, ok, size)
+
+    def burst(self, urls):
+        list(self.pool.map(self.get, urls))
+
+    def think(self, mean):
+        time.sleep(min(self.rng.expovariate(1 / mean), max(0.0, self.stop_at - time.time())))
+
+    # ── Scénarios ──
+    def history_url(self):
+        url = '/api/prices/history?'
+        if self.rng.random() < 0.5:
+            url += f'metal_type={self.rng.choice(METALS)}&'
+        if self.rng.random() < 0.6:
+            d = date.today().replace(day=1) - timedelta(days=1 + 30 * self.rng.randint(0, 11))
+            url += f'month={d:%Y-%m}&'
+        return url
+
+    def load_data(self):
+        self.burst(['/api/statistics', self.history_url()])
+
+    def open_session(self):
+        self.get('/')
+        self.get('/api/bootstrap')
+        self.load_data()
+
+    def sheet_switch(self):
+        sheet = self.rng.choice(SHEET_IDS)
+        qs = ''
+        if self.rng.random() < 0.4:
+            qs = f'?year={date.today().year - self.rng.randint(0, 2)}'
+        self.burst(['/api/metals/sheets', f'/api/metals/sheet/{sheet}{qs}'])
+
+    def fx_page(self):
+        d = date.today().replace(day=1) - timedelta(days=1)
+        self.burst([f'/ecb/rates?month={d:%Y-%m}&quote_currency={self.rng.choice(FX_QUOTES)}',
+                    '/ecb/monthly-summary'])
+
+    def export(self):
+        self.get(self.rng.choice([
+            '/export/excel?days=30',
+            f'/api/metals/export/{self.rng.choice(SHEET_IDS)}',
+            '/ecb/rates/export',
+            '/api/metals/summary?months=12',
+        ]))
+
+    def run(self):
+        try:
+            self.open_session()
+            next_refresh = time.time() + self.args.refresh
+            names, weights = zip(*ACTIONS)
+            while time.time() < self.stop_at:
+                if time.time() >= next_refresh:
+                    self.load_data()
+                    next_refresh += self.args.refresh
+                action = self.rng.choices(names, weights)[0]
+                if action == 'filter_change':
+                    self.load_data()
+                elif action == 'sheet_switch':
+                    self.sheet_switch()
+                elif action == 'fx_page':
+                    self.fx_page()
+                elif action == 'export':
+                    self.export()
+                self.think(self.args.think)
+        finally:
+            self.pool.shutdown(wait=False)
+
+
+class ConnectionSampler(threading.Thread):
+    """Échantillonne pg_stat_activity (connexions de la base cible) chaque seconde."""
+
+    def __init__(self, dsn):
+        super().__init__(daemon=True)
+        self.dsn = dsn
+        self.samples = []
+        self.stop_event = threading.Event()
+        self.error = None
+
+    def run(self):
+        try:
+            import psycopg2
+            conn = psycopg2.connect(self.dsn)
+            conn.autocommit = True
+        except Exception as e:
+            self.error = str(e)
+            return
+        try:
+            with conn.cursor() as cur:
+                while not self.stop_event.is_set():
+                    cur.execute("""
+                        SELECT COUNT(*),
+                               COUNT(*) FILTER (WHERE state = 'active'),
+                               COUNT(*) FILTER (WHERE state = 'idle in transaction')
+                        FROM pg_stat_activity
+                        WHERE datname = current_database() AND pid <> pg_backend_pid()
+                    """)
+                    self.samples.append(cur.fetchone())
+                    self.stop_event.wait(1)
+        finally:
+            conn.close()
+
+    def summary(self):
+        if not self.samples:
+            return {'error': self.error} if self.error else {}
+        total, active, idle_tx = zip(*self.samples)
+        return {
+            'max_connections':      max(total),
+            'avg_connections':      round(sum(total) / len(total), 1),
+            'max_active':           max(active),
+            'max_idle_in_transaction': max(idle_tx),
+        }
+
+
+def spawn_gunicorn(args):
+    env = dict(os.environ, GUNICORN_PROFILE=getattr(args, 'profile', 'sync'))
+    if args.dsn:
+        env['DATABASE_URL'] = args.dsn
+    cmd = [sys.executable, '-m', 'gunicorn', 'app:create_app()', '-c', 'gunicorn.conf.py',
+           '--bind', args.bind, '--workers', str(args.workers), '--threads', str(args.threads),
+           '--timeout', '120', '--log-level', 'warning']
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    url = f'http://{args.bind}'
+    for _ in range(60):
+        try:
+            urllib.request.urlopen(url + '/metrics', timeout=2).read()
+            return proc, url
+        except Exception:
+            time.sleep(0.5)
+    proc.terminate()
+    raise SystemExit("gunicorn n'a pas démarré")
+
+
+def run_stage(base_url, n_users, args):
+    stats = Stats()
+    sampler = ConnectionSampler(args.dsn) if args.dsn else None
+    if sampler:
+        sampler.start()
+    started = time.time()
+    stop_at = started + args.duration
+    users = []
+    for i in range(n_users):
+        user = VirtualUser(base_url, stats, stop_at, args, seed=args.seed * 1000 + i)
+        user.start()
+        users.append(user)
+        time.sleep(args.ramp_up / max(n_users, 1))
+    for user in users:
+        user.join(timeout=args.duration + args.timeout + 5)
+    elapsed = time.time() - started
+    if sampler:
+        sampler.stop_event.set()
+        sampler.join()
+    routes = stats.summary(elapsed)
+    total = sum(r['requests'] for r in routes)
+    errors = sum(round(r['requests'] * r['error_rate']) for r in routes)
+    return {
+        'users':      n_users,
+        'duration_s': round(elapsed, 1),
+        'requests':   total,
+        'rps':        round(total / elapsed, 2),
+        'error_rate': round(errors / total, 4) if total else 0,
+        'db':         sampler.summary() if sampler else {},
+        'routes':     routes,
+    }
+
+
+def print_stage(stage):
+    print(f"\n== {stage['users']} utilisateurs — {stage['requests']} requêtes, "
+          f"{stage['rps']} req/s, erreurs {stage['error_rate']:.2%} ==")
+    if stage['db']:
+        print(f"   PostgreSQL : {stage['db']}")
+    print(f"   {'route':<32} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>7}")
+    for r in stage['routes']:
+        print(f"   {r['route']:<32} {r['requests']:>6} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['error_rate']:>7.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='app déjà démarrée')
+    parser.add_argument('--spawn', action='store_true', help='démarre gunicorn (gunicorn.conf.py) pour le test')
+    parser.add_argument('--bind', default='127.0.0.1:8765')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--profile', default='sync', choices=['sync', 'gthread', 'gevent'],
+                        help='GUNICORN_PROFILE du worker (cf. gunicorn.conf.py)')
+    parser.add_argument('--dsn', help='base cible : échantillonne pg_stat_activity (et DATABASE_URL avec --spawn)')
+    parser.add_argument('--users', default='10', help='paliers d\'utilisateurs, ex. 5,10,25,50')
+    parser.add_argument('--duration', type=float, default=60, help='secondes par palier')
+    parser.add_argument('--ramp-up', type=float, default=5, help='secondes pour démarrer tous les utilisateurs')
+    parser.add_argument('--refresh', type=float, default=300, help='intervalle loadData (s), 300 comme le frontend')
+    parser.add_argument('--think', type=float, default=5, help='temps de réflexion moyen entre actions (s)')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='écrit les résultats en JSON')
+    args = parser.parse_args()
+
+    proc, base_url = None, args.url
+    if args.spawn:
+        proc, base_url = spawn_gunicorn(args)
+    try:
+        stages = []
+        for n_users in [int(n) for n in args.users.split(',')]:
+            stage = run_stage(base_url, n_users, args)
+            print_stage(stage)
+            stages.append(stage)
+    finally:
+        if proc:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=30)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'url': base_url, 'profile': args.profile if args.spawn else None,
+                       'workers': args.workers if args.spawn else None,
+                       'threads': args.threads if args.spawn else None, 'stages': stages}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+# benchmarks/run_benchmarks.py - Suite de benchmarks reproductible
+"""
+Chronomètre chaque route du dashboard et les fonctions pures de calcul
+contre une base PostgreSQL locale remplie par synthetic_data.py.
+
+    python benchmarks/run_benchmarks.py --dsn postgresql://localhost/lme_bench \
+        --years 5 --sources 7 --generate --output benchmarks/results/base.json
+    python benchmarks/run_benchmarks.py --dsn … --compare benchmarks/results/base.json
+
+Le JSON produit contient, par route et par fonction : premier appel (froid),
+médiane, p95, min, taille de réponse. --compare affiche les écarts de
+médiane avec un résultat précédent (commit de référence).
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+
+def route_cases(app_module):
+    """Toutes les routes à mesurer, avec leurs combinaisons de filtres."""
+    today = date.today()
+    last_month = (today.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+    year_start = f"{today.year}-01-01"
+    cases = [
+        '/api/bootstrap',
+        '/api/prices/latest',
+        '/api/statistics',
+        '/api/sync/logs',
+        '/api/prices/history?days=30',
+        '/api/prices/history?days=365',
+        '/api/prices/history?days=365&metal_type=copper',
+        '/api/prices/history?days=365&source=metals.dev',
+        '/api/prices/history?days=365&metal_type=copper&source=shmet',
+        f'/api/prices/history?month={last_month}',
+        f'/api/prices/history?month={last_month}&metal_type=zinc',
+        f'/api/prices/history?start_date={year_start}&end_date={today.isoformat()}',
+        f'/api/prices/history?start_date={today.year - 3}-01-01',
+        '/api/metals/sheets',
+        '/api/metals/summary?months=12',
+        '/api/metals/summary?months=36',
+        '/ecb/rates',
+        '/ecb/rates?quote_currency=USD',
+        f'/ecb/rates?month={last_month}',
+        '/ecb/monthly-summary',
+        f'/ecb/monthly-summary?year={today.year}&month=1',
+        '/export/excel?days=30',
+        '/export/excel?days=365&metal_type=copper',
+        f'/export/excel?month={last_month}',
+        '/ecb/rates/export',
+        f'/ecb/export-florent?year={today.year}&month={max(today.month - 1, 1)}',
+    ]
+    for sheet_id in app_module.METALS_SOURCE_CONFIGS:
+        cases.append(f'/api/metals/sheet/{sheet_id}')
+        cases.append(f'/api/metals/sheet/{sheet_id}?year={today.year}')
+        cases.append(f'/api/metals/sheet/{sheet_id}?year={today.year - 1}&month=6')
+        cases.append(f'/api/metals/export/{sheet_id}')
+    return cases
+
+
+def _timings(samples_ms):
+    ordered = sorted(samples_ms)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        'median_ms': round(statistics.median(ordered), 3),
+        'p95_ms':    round(p95, 3),
+        'min_ms':    round(ordered[0], 3),
+        'mean_ms':   round(statistics.fmean(ordered), 3),
+    }
+
+
+def bench_routes(app_module, repeat):
+    client = app_module.app.test_client()
+    results = []
+    for url in route_cases(app_module):
+        samples, first_ms, status, size = [], None, None, 0
+        for i in range(repeat + 1):
+            started = time.perf_counter()
+            resp = client.get(url)
+            body = resp.get_data()
+            elapsed = (time.perf_counter() - started) * 1000
+            if i == 0:
+                first_ms, status, size = elapsed, resp.status_code, len(body)
+            else:
+                samples.append(elapsed)
+        results.append({'name': url, 'status': status, 'bytes': size,
+                        'first_ms': round(first_ms, 3), **_timings(samples)})
+        print(f"{status} {results[-1]['median_ms']:>9.2f} ms  {size:>9} B  {url}")
+    return results
+
+
+class _RowsCursor:
+    """Curseur en mémoire : rejoue des lignes fixes pour isoler le calcul Python."""
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return self._rows
+
+
+def bench_functions(app_module, repeat):
+    rng_prices = [{'price': 9000 + (i % 500) * 1.7} for i in range(100_000)]
+    yearly = {'data': [{'month': m, **{f'year_{y}': 8 + m / 10 + y / 1000 for y in range(2005, 2026)}}
+                       for m in range(1, 13)],
+              'years': list(range(2025, 2004, -1))}
+    shme_rows = [
+        {'year': y, 'month': m, 'metal_type': metal, 'avg_price': Decimal(str(base + m * 10)), 'currency': 'CNY'}
+        for y in range(2005, 2026) for m in range(1, 13)
+        for metal, base in (('copper', 70000), ('zinc', 22000), ('tin', 250000))
+    ]
+    raw_rows = [
+        {'metal_type': 'copper', 'price': Decimal('9123.456789'), 'currency': 'USD', 'unit': 'ton',
+         'source_url': 'https://metals.dev/api', 'price_date': date(2025, 1, 1) + timedelta(days=i % 365),
+         'created_at': datetime(2025, 1, 1, 18, 0)}
+        for i in range(50_000)
+    ]
+    shme_config = app_module.METALS_SOURCE_CONFIGS['shme']
+    cases = {
+        'calculate_basic_stats[100k]':      lambda: app_module.calculate_basic_stats(rng_prices),
+        'calculate_basic_stats[yearly]':    lambda: app_module.calculate_basic_stats(yearly),
+        'calculate_yearly_stats[21y]':      lambda: app_module.calculate_yearly_stats(yearly),
+        'get_shme_data[21y alloys]':        lambda: app_module.get_shme_data(_RowsCursor(shme_rows), shme_config),
+        'calculate_alloy_stats[21y]':       lambda: app_module.calculate_alloy_stats(
+            app_module.get_shme_data(_RowsCursor(shme_rows), shme_config)),
+        'serialize_row[50k]':               lambda: [app_module.serialize_row(r) for r in raw_rows],
+    }
+    results = []
+    for name, fn in cases.items():
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1000)
+        results.append({'name': name, **_timings(samples)})
+        print(f"    {results[-1]['median_ms']:>9.2f} ms  {name}")
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=HERE, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nComparaison avec {baseline_path} (commit {baseline['meta'].get('commit')})")
+    for section in ('routes', 'functions'):
+        before = {r['name']: r for r in baseline.get(section, [])}
+        for r in current[section]:
+            b = before.get(r['name'])
+            if not b or not b['median_ms']:
+                continue
+            ratio = r['median_ms'] / b['median_ms']
+            flag = '⚠️ ' if ratio > 1.2 else '   '
+            print(f"{flag}{ratio:6.2f}x  {b['median_ms']:>9.2f} → {r['median_ms']:>9.2f} ms  {r['name']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', required=True, help='postgresql://… (base locale)')
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--sources', type=int, default=7)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--generate', action='store_true', help='(re)génère les données avant de mesurer')
+    parser.add_argument('--repeat', type=int, default=5, help='mesures par cas, hors premier appel')
+    parser.add_argument('--output', help='fichier JSON (défaut: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='JSON de référence à comparer')
+    args = parser.parse_args()
+
+    counts = None
+    if args.generate:
+        from synthetic_data import prepare_database
+        counts = prepare_database(args.dsn, args.years, args.sources, args.seed, reset=True)
+
+    os.environ['DATABASE_URL'] = args.dsn
+    os.environ.setdefault('SCHEDULER_ENABLED', '0')
+    import app as app_module
+    app_module.app.logger.setLevel('WARNING')
+    app_module.logger.setLevel('WARNING')
+
+    print("== Routes ==")
+    routes = bench_routes(app_module, args.repeat)
+    print("== Fonctions ==")
+    functions = bench_functions(app_module, args.repeat)
+
+    result = {
+        'meta': {
+            'commit':    _git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'python':    platform.python_version(),
+            'platform':  platform.platform(),
+            'years':     args.years,
+            'sources':   args.sources,
+            'seed':      args.seed,
+            'repeat':    args.repeat,
+            'rows':      counts,
+        },
+        'routes':    routes,
+        'functions': functions,
+    }
+    output = args.output or os.path.join(HERE, 'results', f"{result['meta']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nRésultats → {output}")
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == '__main__':
+    main()
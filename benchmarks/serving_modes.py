@@ -0,0 +1,97 @@
+# benchmarks/serving_modes.py - Débit des profils gunicorn sous charge I/O
+"""
+Compare les profils GUNICORN_PROFILE (sync, gthread, gevent) à nombre de
+workers égal : C clients en boucle fermée appellent une route dont le coût
+est dominé par l'attente de Postgres, derrière benchmarks/latency_proxy.py
+pour reproduire la latence d'Azure Postgres.
+
+    python benchmarks/latency_proxy.py --target /tmp/pg/.s.PGSQL.5432 --rtt-ms 20 &
+    python benchmarks/serving_modes.py --dsn postgresql://user@127.0.0.1:6543/lme_bench \
+        --workers 2 --concurrency 50 --duration 20
+
+/api/sync/logs n'est pas coalescé (single-flight) : chaque requête client
+fait bien son aller-retour vers la base.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from loadtest import spawn_gunicorn
+
+
+def closed_loop(base_url, path, concurrency, duration, timeout):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client():
+        while time.time() < stop_at:
+            started = time.perf_counter()
+            ok = False
+            try:
+                with urllib.request.urlopen(base_url + path, timeout=timeout) as resp:
+                    resp.read()
+                    ok = resp.status < 400
+            except (urllib.error.URLError, OSError):
+                pass
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    started = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - started
+    ordered = sorted(latencies) or [0]
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        'requests': len(latencies),
+        'rps':      round(len(latencies) / elapsed, 1),
+        'p50_ms':   round(pick(0.50), 1),
+        'p95_ms':   round(pick(0.95), 1),
+        'errors':   errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', required=True)
+    parser.add_argument('--profiles', default='sync,gthread,gevent')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='threads par worker (gthread)')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--path', default='/api/sync/logs')
+    parser.add_argument('--bind', default='127.0.0.1:8766')
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, {args.concurrency} clients, {args.duration}s sur {args.path}")
+    print(f"{'profil':<10} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'erreurs':>8}")
+    for profile in args.profiles.split(','):
+        spawn_args = SimpleNamespace(profile=profile, dsn=args.dsn, bind=args.bind, workers=args.workers,
+                                     threads=args.threads if profile == 'gthread' else 1)
+        proc, base_url = spawn_gunicorn(spawn_args)
+        try:
+            closed_loop(base_url, args.path, args.concurrency, 2, args.timeout)   # chauffe du pool
+            r = closed_loop(base_url, args.path, args.concurrency, args.duration, args.timeout)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+        print(f"{profile:<10} {r['rps']:>8} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# benchmarks/startup.py - Temps de démarrage d'un worker
+"""
+Mesure ce que paie chaque nouveau worker (scale-out, redémarrage App Service) :
+
+- import : `import app` dans un interpréteur neuf, et les modules lourds
+  (openpyxl, apscheduler, flask_mail) chargés ou non à l'import ;
+- premier appel : gunicorn lancé à froid jusqu'à la première réponse de
+  /health, puis latence de la première et de la deuxième requête API.
+
+    python benchmarks/startup.py --dsn postgresql://user@127.0.0.1:6543/lme_bench --runs 5
+    python benchmarks/startup.py --dsn … --entry app:app     # sans la fabrique
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('openpyxl', 'apscheduler', 'flask_mail')
+
+IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({{'import_ms': elapsed * 1000,
+                  'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(env):
+    out = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def timed_get(url, timeout=30):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        resp.read()
+    return (time.perf_counter() - started) * 1000
+
+
+def measure_first_request(env, args):
+    cmd = [sys.executable, '-m', 'gunicorn', args.entry, '-c', 'gunicorn.conf.py',
+           '--bind', args.bind, '--workers', '1', '--log-level', 'warning']
+    base_url = f'http://{args.bind}'
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(base_url + '/health', timeout=5).read()
+                break
+            except Exception:
+                if proc.poll() is not None or time.perf_counter() - started > 60:
+                    raise SystemExit("gunicorn n'a pas démarré")
+                time.sleep(0.01)
+        ready_ms = (time.perf_counter() - started) * 1000
+        first_ms = timed_get(base_url + args.path)
+        second_ms = timed_get(base_url + args.path)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {'ready_ms': ready_ms, 'first_request_ms': first_ms, 'second_request_ms': second_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', required=True)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--entry', default='app:create_app()', help="point d'entrée WSGI passé à gunicorn")
+    parser.add_argument('--path', default='/api/sync/logs', help='requête chronométrée après /health')
+    parser.add_argument('--bind', default='127.0.0.1:8767')
+    parser.add_argument('--output', help='écrit les mesures brutes en JSON')
+    args = parser.parse_args()
+
+    # Un seul worker, sans scheduler : on mesure le démarrage, pas les jobs
+    env = dict(os.environ, DATABASE_URL=args.dsn, SCHEDULER_ENABLED='0')
+    imports = [measure_import(env) for _ in range(args.runs)]
+    starts = [measure_first_request(env, args) for _ in range(args.runs)]
+
+    median = lambda rows, key: round(statistics.median(r[key] for r in rows), 1)
+    summary = {
+        'entry':             args.entry,
+        'import_ms':         median(imports, 'import_ms'),
+        'heavy_loaded':      imports[-1]['loaded'],
+        'ready_ms':          median(starts, 'ready_ms'),
+        'first_request_ms':  median(starts, 'first_request_ms'),
+        'second_request_ms': median(starts, 'second_request_ms'),
+    }
+    print(f"Point d'entrée           {summary['entry']}")
+    print(f"import app               {summary['import_ms']} ms "
+          f"(modules lourds chargés : {', '.join(summary['heavy_loaded']) or 'aucun'})")
+    print(f"gunicorn → /health OK    {summary['ready_ms']} ms")
+    print(f"1re requête {args.path:<12} {summary['first_request_ms']} ms")
+    print(f"2e requête  {args.path:<12} {summary['second_request_ms']} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'summary': summary, 'imports': imports, 'starts': starts}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
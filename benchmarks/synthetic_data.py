@@ -0,0 +1,204 @@
+# benchmarks/synthetic_data.py - Générateur de données synthétiques
+"""
+Remplit une base PostgreSQL locale avec des données synthétiques aux
+colonnes utilisées par app.py : metal_prices, ecb_exchange_rates,
+fx_budget_rates et sync_logs.
+
+Les 7 premières sources reproduisent METALS_SOURCE_CONFIGS (mêmes URLs,
+métaux, devises et unités) ; au-delà, des sources fictives sont ajoutées.
+Les séries sont des marches aléatoires avec graine fixe : même échelle
+→ mêmes données, donc des benchmarks comparables d'un commit à l'autre.
+
+    python benchmarks/synthetic_data.py --dsn postgresql://localhost/lme_bench --years 5 --sources 7 --reset
+"""
+
+import argparse
+import io
+import math
+import random
+from datetime import date, datetime, timedelta
+
+import psycopg2
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS metal_prices (
+    id                  BIGSERIAL PRIMARY KEY,
+    metal_type          TEXT,
+    price               NUMERIC,
+    currency            TEXT,
+    unit                TEXT,
+    source_url          TEXT,
+    source_product_name TEXT,
+    price_date          DATE,
+    created_at          TIMESTAMP DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS ecb_exchange_rates (
+    id             BIGSERIAL PRIMARY KEY,
+    ref_date       DATE,
+    base_currency  TEXT DEFAULT 'EUR',
+    quote_currency TEXT,
+    rate           NUMERIC,
+    source_url     TEXT,
+    metadata       JSONB,
+    created_at     TIMESTAMP DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS fx_budget_rates (
+    year        INTEGER,
+    currency    TEXT,
+    budget_rate NUMERIC,
+    updated_at  TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS sync_logs (
+    id               BIGSERIAL PRIMARY KEY,
+    sync_type        TEXT,
+    status           TEXT,
+    metals_updated   INTEGER,
+    error_message    TEXT,
+    duration_seconds NUMERIC,
+    created_at       TIMESTAMP DEFAULT NOW()
+);
+"""
+
+DROP_SQL = """
+DROP TABLE IF EXISTS metal_prices, ecb_exchange_rates, fx_budget_rates, sync_logs,
+                     latest_prices, table_counts CASCADE;
+"""
+
+# (metal_type, source_url, source_product_name, devise, unité, prix initial)
+BASE_SOURCES = [
+    [('brent_oil', 'https://www.insee.fr/fr/statistiques/serie/010002077', None, 'EUR', 'barrel', 75.0)],
+    [('copper', 'https://comexlive.org/copper/', None, 'USD', 'lb', 4.2)],
+    [('copper', 'https://www.m-lego.com/cours-metaux', None, 'EUR', 'ton', 850.0)],
+    [('copper', 'https://www.shmet.com/', None, 'CNY', 'ton', 70000.0),
+     ('zinc',   'https://www.shmet.com/', None, 'CNY', 'ton', 22000.0),
+     ('tin',    'https://www.shmet.com/', None, 'CNY', 'ton', 250000.0)],
+    [('copper', None, 'LS Nikko', 'KRW', 'ton', 12000000.0)],
+    [('silver', 'https://www.agosi.de/silber', None, 'EUR', 'troy_oz', 28.0)],
+    [('copper', 'https://metals.dev/api', None, 'USD', 'ton', 9000.0),
+     ('zinc',   'https://metals.dev/api', None, 'USD', 'ton', 2800.0),
+     ('tin',    'https://metals.dev/api', None, 'USD', 'ton', 30000.0),
+     ('silver', 'https://metals.dev/api', None, 'USD', 'ton', 800000.0)],
+]
+EXTRA_METALS = ['copper', 'zinc', 'tin', 'silver', 'aluminium', 'nickel', 'lead']
+
+ECB_CURRENCIES = {
+    'USD': 1.10, 'JPY': 160.0, 'BGN': 1.956, 'CZK': 25.0, 'DKK': 7.46, 'GBP': 0.86,
+    'HUF': 390.0, 'PLN': 4.3, 'RON': 4.97, 'SEK': 11.3, 'CHF': 0.95, 'ISK': 150.0,
+    'NOK': 11.6, 'TRY': 35.0, 'AUD': 1.65, 'BRL': 6.0, 'CAD': 1.5, 'CNY': 7.8,
+    'HKD': 8.5, 'IDR': 17500.0, 'ILS': 4.0, 'INR': 90.0, 'KRW': 1450.0, 'MXN': 19.0,
+    'MYR': 4.9, 'NZD': 1.8, 'PHP': 62.0, 'SGD': 1.45, 'THB': 38.0, 'ZAR': 20.0,
+}
+BUDGET_CURRENCIES = ['USD', 'CNY', 'INR', 'KRW', 'MXN', 'TND']
+
+
+def business_days(start, end):
+    d = start
+    while d <= end:
+        if d.weekday() < 5:
+            yield d
+        d += timedelta(days=1)
+
+
+def build_series(n_sources, rng):
+    """Liste des séries (métal, url, produit, devise, unité, prix initial)."""
+    series = [s for group in BASE_SOURCES[:n_sources] for s in group]
+    for i in range(len(BASE_SOURCES), n_sources):
+        url = f'https://source-{i:02d}.example.com/prices'
+        for metal in rng.sample(EXTRA_METALS, 2):
+            series.append((metal, url, None, 'USD', 'ton', rng.uniform(1000, 30000)))
+    return series
+
+
+def _random_walk(rng, start, steps, vol=0.012):
+    price = start
+    for _ in range(steps):
+        price *= math.exp(rng.gauss(0, vol))
+        yield price
+
+
+def _copy(cur, table, columns, rows):
+    buf = io.StringIO()
+    for row in rows:
+        buf.write('\t'.join('\\N' if v is None else str(v) for v in row) + '\n')
+    buf.seek(0)
+    cur.copy_from(buf, table, columns=columns)
+
+
+def generate(conn, years=1, sources=7, seed=42, end=None):
+    """Insère `years` années de données pour `sources` sources ; retourne les volumes."""
+    rng   = random.Random(seed)
+    end   = end or date.today()
+    start = date(end.year - years + 1, 1, 1)
+    days  = list(business_days(start, end))
+    counts = {}
+
+    with conn.cursor() as cur:
+        rows = []
+        for metal, url, product, ccy, unit, p0 in build_series(sources, rng):
+            for d, price in zip(days, _random_walk(rng, p0, len(days))):
+                created = datetime(d.year, d.month, d.day, 18, rng.randint(0, 59), rng.randint(0, 59))
+                rows.append((metal, round(price, 6), ccy, unit, url, product, d, created))
+        rows.sort(key=lambda r: r[7])   # ordre d'ingestion réaliste (id croissant avec created_at)
+        _copy(cur, 'metal_prices',
+              ('metal_type', 'price', 'currency', 'unit', 'source_url',
+               'source_product_name', 'price_date', 'created_at'), rows)
+        counts['metal_prices'] = len(rows)
+
+        rows = []
+        for ccy, r0 in ECB_CURRENCIES.items():
+            for d, rate in zip(days, _random_walk(rng, r0, len(days), vol=0.004)):
+                rows.append((d, 'EUR', ccy, round(rate, 6),
+                             'https://www.ecb.europa.eu/stats/eurofxref/',
+                             datetime(d.year, d.month, d.day, 16, 30)))
+        rows.sort(key=lambda r: r[0])
+        _copy(cur, 'ecb_exchange_rates',
+              ('ref_date', 'base_currency', 'quote_currency', 'rate', 'source_url', 'created_at'), rows)
+        counts['ecb_exchange_rates'] = len(rows)
+
+        rows = [(y, ccy, round(ECB_CURRENCIES.get(ccy, 3.3) * rng.uniform(0.95, 1.05), 4),
+                 datetime(y - 1, 11, 15))
+                for y in range(start.year, end.year + 2) for ccy in BUDGET_CURRENCIES]
+        _copy(cur, 'fx_budget_rates', ('year', 'currency', 'budget_rate', 'updated_at'), rows)
+        counts['fx_budget_rates'] = len(rows)
+
+        rows = [('daily', 'success' if rng.random() > 0.02 else 'error', rng.randint(5, 15), None,
+                 round(rng.uniform(1, 30), 2), datetime(d.year, d.month, d.day, 18, 59))
+                for d in days]
+        _copy(cur, 'sync_logs',
+              ('sync_type', 'status', 'metals_updated', 'error_message', 'duration_seconds', 'created_at'),
+              rows)
+        counts['sync_logs'] = len(rows)
+
+        cur.execute("ANALYZE metal_prices; ANALYZE ecb_exchange_rates; ANALYZE fx_budget_rates; ANALYZE sync_logs;")
+    conn.commit()
+    return counts
+
+
+def prepare_database(dsn, years=1, sources=7, seed=42, reset=True):
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            if reset:
+                cur.execute(DROP_SQL)
+            cur.execute(SCHEMA_SQL)
+        conn.commit()
+        return generate(conn, years=years, sources=sources, seed=seed)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', required=True, help='postgresql://… (base locale, jamais la prod)')
+    parser.add_argument('--years', type=int, default=1, help='années d\'historique (1 → 20)')
+    parser.add_argument('--sources', type=int, default=7, help='nombre de sources (7 → 50)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='supprime les tables avant génération')
+    args = parser.parse_args()
+    counts = prepare_database(args.dsn, args.years, args.sources, args.seed, args.reset)
+    for table, n in counts.items():
+        print(f"{table:<20} {n:>10,} lignes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# gunicorn.conf.py - chargé automatiquement par gunicorn (répertoire courant)
+"""
+Configuration gunicorn du dashboard.
+
+Les métriques Prometheus de chaque worker sont écrites dans
+PROMETHEUS_MULTIPROC_DIR pour que /metrics agrège tous les workers.
+
+Profils de service (GUNICORN_PROFILE) :
+- sync    (défaut) : un worker = une requête à la fois ;
+- gthread : GUNICORN_THREADS threads par worker ;
+- gevent  : GUNICORN_WORKER_CONNECTIONS greenlets par worker. psycopg2 est
+  rendu coopératif (wait callback) : une requête qui attend Postgres ou le
+  SMTP libère le worker. Nécessite le paquet gevent. Seul profil où le flux
+  SSE /api/stream est actif (STREAM_ENABLED).
+Comparaison sous charge I/O : benchmarks/serving_modes.py.
+
+Point d'entrée : app:create_app(), qui chauffe le pool de connexions et
+lance l'élection du scheduler avant la première requête du worker
+(temps de démarrage : benchmarks/startup.py).
+"""
+
+import os
+import shutil
+import tempfile
+
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'lme_prometheus'),
+)
+
+wsgi_app = 'app:create_app()'
+
+GUNICORN_PROFILE = os.environ.get('GUNICORN_PROFILE', 'sync')
+
+# Un flux /api/stream ouvert bloque un worker sync ou un thread gthread
+os.environ.setdefault('STREAM_ENABLED', '1' if GUNICORN_PROFILE == 'gevent' else '0')
+
+if GUNICORN_PROFILE == 'gthread':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+elif GUNICORN_PROFILE == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+
+
+def gevent_wait_callback(conn, timeout=None):
+    """Attente coopérative des E/S psycopg2 (équivalent de psycogreen.gevent)."""
+    from gevent.socket import wait_read, wait_write
+    from psycopg2 import OperationalError, extensions
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f"Bad result from poll: {state!r}")
+
+
+def on_starting(server):
+    # Repartir d'un répertoire vide : les fichiers d'anciens workers fausseraient les totaux
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def post_worker_init(worker):
+    # Après le monkey-patching de gevent, avant la première requête
+    if GUNICORN_PROFILE == 'gevent':
+        from psycopg2 import extensions
+        extensions.set_wait_callback(gevent_wait_callback)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,1938 @@
+// ==========================================
+// DARK MODE
+// ==========================================
+function toggleTheme() {
+  const html = document.documentElement;
+  const icon = document.getElementById("themeIcon");
+  if (html.getAttribute("data-theme") === "dark") {
+    html.removeAttribute("data-theme");
+    icon.className = "fas fa-moon";
+    localStorage.setItem("theme", "light");
+  } else {
+    html.setAttribute("data-theme", "dark");
+    icon.className = "fas fa-sun";
+    localStorage.setItem("theme", "dark");
+  }
+}
+
+window.addEventListener("DOMContentLoaded", () => {
+  const savedTheme = localStorage.getItem("theme");
+  if (savedTheme === "dark") {
+    document.documentElement.setAttribute("data-theme", "dark");
+    document.getElementById("themeIcon").className = "fas fa-sun";
+  }
+  createParticles();
+});
+
+// ==========================================
+// PARTICLES
+// ==========================================
+function createParticles() {
+  const container = document.getElementById("particles");
+  for (let i = 0; i < 15; i++) {
+    const p = document.createElement("div");
+    p.className = "particle";
+    p.style.left = Math.random() * 100 + "%";
+    p.style.animationDelay = Math.random() * 20 + "s";
+    p.style.animationDuration = 15 + Math.random() * 10 + "s";
+    container.appendChild(p);
+  }
+}
+
+// ==========================================
+// ✅ TRANSLATION SYSTEM
+// Défini AVANT translations{} pour que t() soit disponible
+// ==========================================
+let currentLang = localStorage.getItem("dashboardLanguage") || "fr";
+
+function t(key) {
+  return translations[currentLang] && translations[currentLang][key]
+    ? translations[currentLang][key]
+    : key;
+}
+
+// ⚠️ IMPORTANT: Ne plus appeler t() à l'intérieur de translations{}
+// L'objet est défini statiquement ici
+const translations = {
+  fr: {
+    dashboard_title: "Tableau de Bord",
+    loading: "Chargement...",
+    tab_metals: "Prix des Métaux",
+    tab_fx: "Taux de change ECB",
+    stats_summary: "Résumé par métal",
+    filters_title: "Filtres",
+    filter_metal_type: "Type de métal",
+    filter_all_metals: "Tous les métaux",
+    filter_source: "Source",
+    filter_all_sources: "Toutes les sources",
+    filter_month: "Filtre par mois",
+    filter_start_date: "Date de début",
+    filter_end_date: "Date de fin",
+    filter_reset: "Réinitialiser",
+    table_product: "Produit",
+    table_price: "Prix",
+    table_currency: "Devise",
+    table_unit: "Unité",
+    table_source: "Source",
+    table_price_date: "Date de prix",
+    table_date: "Date",
+    table_rate: "Taux",
+    btn_export_excel: "Exporter Excel",
+    btn_refresh: "Actualiser",
+    section_history: "Historique des Prix",
+    section_monthly_report: "Rapport mensuel",
+    section_monthly_summary: "Résumé Mensuel des Taux",
+    monthly_report_desc:
+      "Génère le rapport mensuel avec Closing Rate, Period Rate Average (M-1) et Moyenne YTD.",
+    monthly_report_choose: "Choisir le mois :",
+    no_data: "Aucune donnée disponible",
+    loading_data: "Chargement des données...",
+    error_loading: "Erreur lors du chargement des données",
+    fx_filters: "Filtres Taux de change ECB (EUR base)",
+    fx_quote_currency: "Devise cotée",
+    fx_all_currencies: "Toutes les devises",
+    footer_rights: "Tous droits réservés.",
+    wb_year: "Année",
+    wb_month: "Mois",
+    wb_all_years: "Toutes",
+    wb_all_months: "Tous",
+    wb_start_date: "Début",
+    wb_end_date: "Fin",
+    wb_metal: "Métal",
+    wb_all_metals: "Tous",
+    wb_reset: "Réinitialiser",
+    wb_refresh: "Actualiser",
+    wb_export: "Export Excel",
+    wb_search: "Rechercher...",
+    wb_per_page: "/ page",
+    wb_rows_of: "sur",
+    wb_rows: "lignes",
+    wb_no_data: "Aucune donnée disponible",
+    wb_no_data_period: "Aucune donnée pour la période sélectionnée",
+    wb_avg_annual: "Moy. annuelle = AVG(Jan→Déc)",
+    wb_base_metals: "Métaux de base (Non-VAT CNY/t)",
+    wb_alloy_brass: "Alliages Laiton (Non-VAT CNY/kg)",
+    wb_alloy_bronze: "Alliages Bronze (Non-VAT CNY/kg)",
+    wb_dev_title: "En cours de développement",
+    wb_dev_msg:
+      "La synthèse multi-sources sera disponible prochainement.",
+  },
+  en: {
+    dashboard_title: "Dashboard",
+    loading: "Loading...",
+    tab_metals: "Metal Prices",
+    tab_fx: "ECB Exchange Rates",
+    stats_summary: "Summary by metal",
+    filters_title: "Filters",
+    filter_metal_type: "Metal type",
+    filter_all_metals: "All metals",
+    filter_source: "Source",
+    filter_all_sources: "All sources",
+    filter_month: "Filter by month",
+    filter_start_date: "Start date",
+    filter_end_date: "End date",
+    filter_reset: "Reset",
+    table_product: "Product",
+    table_price: "Price",
+    table_currency: "Currency",
+    table_unit: "Unit",
+    table_source: "Source",
+    table_price_date: "Price date",
+    table_date: "Date",
+    table_rate: "Rate",
+    btn_export_excel: "Export Excel",
+    btn_refresh: "Refresh",
+    section_history: "Price History",
+    section_monthly_report: "Monthly Report",
+    section_monthly_summary: "Monthly FX Summary",
+    monthly_report_desc:
+      "Generate monthly report with Closing Rate, Period Rate Average (M-1) and YTD Average.",
+    monthly_report_choose: "Choose month:",
+    no_data: "No data available",
+    loading_data: "Loading data...",
+    error_loading: "Error loading data",
+    fx_filters: "ECB Exchange Rate Filters (EUR base)",
+    fx_quote_currency: "Quote currency",
+    fx_all_currencies: "All currencies",
+    footer_rights: "All rights reserved.",
+    wb_year: "Year",
+    wb_month: "Month",
+    wb_all_years: "All",
+    wb_all_months: "All",
+    wb_start_date: "Start",
+    wb_end_date: "End",
+    wb_metal: "Metal",
+    wb_all_metals: "All",
+    wb_reset: "Reset",
+    wb_refresh: "Refresh",
+    wb_export: "Export Excel",
+    wb_search: "Search...",
+    wb_per_page: "/ page",
+    wb_rows_of: "of",
+    wb_rows: "rows",
+    wb_no_data: "No data available",
+    wb_no_data_period: "No data available for selected period",
+    wb_avg_annual: "Annual avg = AVG(Jan→Dec)",
+    wb_base_metals: "Base metals (Non-VAT CNY/t)",
+    wb_alloy_brass: "Brass alloys (Non-VAT CNY/kg)",
+    wb_alloy_bronze: "Bronze alloys (Non-VAT CNY/kg)",
+    wb_dev_title: "Under Development",
+    wb_dev_msg: "Multi-source synthesis coming soon.",
+  },
+};
+
+function updateTranslations() {
+  document.querySelectorAll("[data-i18n]").forEach((el) => {
+    const key = el.getAttribute("data-i18n");
+    const translation = t(key);
+    if (el.tagName === "INPUT" && el.type !== "button") {
+      el.placeholder = translation;
+    } else {
+      el.textContent = translation;
+    }
+  });
+  document
+    .querySelectorAll(".lang-btn-dash")
+    .forEach((btn) => btn.classList.remove("active"));
+  const langBtn = document.getElementById(`lang-${currentLang}`);
+  if (langBtn) langBtn.classList.add("active");
+}
+
+function switchLanguage(lang) {
+  currentLang = lang;
+  localStorage.setItem("dashboardLanguage", lang);
+  updateTranslations();
+  loadData();
+}
+
+// ==========================================
+// UTILITIES
+// ==========================================
+function formatDate(dateInput) {
+  const d = new Date(dateInput);
+  if (isNaN(d.getTime())) return "";
+  return d.toLocaleString("fr-FR", {
+    year: "numeric",
+    month: "2-digit",
+    day: "2-digit",
+    hour: "2-digit",
+    minute: "2-digit",
+  });
+}
+function formatDateOnly(dateInput) {
+  const d = new Date(dateInput);
+  if (isNaN(d.getTime())) return "";
+  return d.toLocaleDateString("fr-FR", {
+    year: "numeric",
+    month: "2-digit",
+    day: "2-digit",
+  });
+}
+function formatPrice(price) {
+  if (price === null || price === undefined || isNaN(price)) return "--";
+  return new Intl.NumberFormat("fr-FR", {
+    minimumFractionDigits: 2,
+    maximumFractionDigits: 4,
+  }).format(price);
+}
+function formatSource(sourceUrl) {
+  if (!sourceUrl) return { label: "--", class: "source-unknown" };
+  const url = String(sourceUrl).trim().toLowerCase();
+  if (url.includes("agosi.de"))
+    return { label: "AGOSI", class: "source-agosi" };
+  if (url.includes("m-lego.com"))
+    return { label: "GIRM", class: "source-girm" };
+  if (url.includes("comexlive.org"))
+    return { label: "COMEX", class: "source-comex" };
+  if (url.includes("shmet.com"))
+    return { label: "SHMET", class: "source-shmet" };
+  if (url.includes("insee.fr"))
+    return { label: "BRENT LONDON", class: "source-brent" };
+  if (url.includes("metals.dev") || url.includes("metal.dev"))
+    return { label: "LME", class: "source-girm" };
+  return { label: "AUTRE", class: "source-unknown" };
+}
+function getCurrencyBadgeClass(code) {
+  switch ((code || "").toUpperCase()) {
+    case "EUR":
+      return "currency-badge currency-eur";
+    case "USD":
+      return "currency-badge currency-usd";
+    case "CNY":
+      return "currency-badge currency-cny";
+    case "GBP":
+      return "currency-badge currency-gbp";
+    default:
+      return "currency-badge currency-other";
+  }
+}
+
+// ==========================================
+// GLOBAL STATE
+// ==========================================
+let currentFilters = {
+  metalType: "all",
+  startDate: null,
+  endDate: null,
+  source: "all",
+  month: null,
+};
+let allPrices = [],
+  filteredPrices = [];
+let currentPage = 1;
+const pageSize = 15;
+
+let fxFilters = {
+  quoteCurrency: "all",
+  startDate: null,
+  endDate: null,
+  month: null,
+};
+let fxData = [],
+  fxFilteredData = [];
+let fxCurrentPage = 1;
+const fxPageSize = 15;
+
+// ==========================================
+// ✅ CHARGEMENT DYNAMIQUE DES FILTRES
+// ==========================================
+
+// Toutes les listes de filtres arrivent en une requête /api/bootstrap
+let bootstrapPromise = null;
+function loadBootstrap() {
+  if (!bootstrapPromise) {
+    bootstrapPromise = fetch("/api/bootstrap")
+      .then((r) => r.json())
+      .then((j) => (j.status === "success" ? j.data : null))
+      .catch(() => null);
+  }
+  return bootstrapPromise;
+}
+
+/** Lit une liste depuis /api/bootstrap, sinon via son endpoint dédié */
+async function fetchDimension(key, url) {
+  const boot = await loadBootstrap();
+  if (boot && boot[key] !== undefined) {
+    return { status: "success", data: boot[key] };
+  }
+  const r = await fetch(url);
+  return r.json();
+}
+
+/** Charge les types de métaux depuis la DB et peuple le dropdown */
+async function loadMetalTypeOptions() {
+  const indicator = document.getElementById("metalsFilterLoading");
+  if (indicator) indicator.classList.add("visible");
+  try {
+    const j = await fetchDimension("metal_types", "/api/metals/metal-types");
+    if (j.status === "success" && j.data.length > 0) {
+      const select = document.getElementById("filterMetalType");
+      const current = select.value;
+      select.innerHTML = `<option value="all">${t("filter_all_metals")}</option>`;
+      j.data.forEach((type) => {
+        const opt = document.createElement("option");
+        opt.value = type.toLowerCase();
+        opt.textContent = type.charAt(0).toUpperCase() + type.slice(1);
+        select.appendChild(opt);
+      });
+      if (current && current !== "all") select.value = current;
+    }
+  } catch (e) {
+    console.warn("Impossible de charger les types de métaux:", e);
+  } finally {
+    if (indicator) indicator.classList.remove("visible");
+  }
+}
+
+/** Charge les sources depuis la DB et peuple le dropdown */
+async function loadSourceOptions() {
+  try {
+    const j = await fetchDimension("sources", "/api/metals/sources");
+    if (j.status === "success" && j.data.length > 0) {
+      const select = document.getElementById("filterSource");
+      const current = select.value;
+      select.innerHTML = `<option value="all">${t("filter_all_sources")}</option>`;
+      const labelsSet = new Set();
+      j.data.forEach((url) => {
+        const s = formatSource(url);
+        if (s.label && s.label !== "--" && !labelsSet.has(s.label)) {
+          labelsSet.add(s.label);
+        }
+      });
+      Array.from(labelsSet)
+        .sort()
+        .forEach((label) => {
+          const opt = document.createElement("option");
+          opt.value = label.toLowerCase();
+          opt.textContent = label;
+          select.appendChild(opt);
+        });
+      if (current && current !== "all") select.value = current;
+    }
+  } catch (e) {
+    console.warn("Impossible de charger les sources:", e);
+  }
+}
+
+/** Charge les date ranges depuis la DB et configure les datepickers */
+async function loadMetalsDateRange() {
+  try {
+    const j = await fetchDimension("metals_date_range", "/api/metals/date-range");
+    if (j.status === "success" && j.data) {
+      const { min_date, max_date } = j.data;
+      ["filterStartDate", "filterEndDate"].forEach((id) => {
+        const el = document.getElementById(id);
+        if (el) {
+          if (min_date) el.min = min_date;
+          if (max_date) el.max = max_date;
+        }
+      });
+      // Configurer le filtre mois aussi
+      if (min_date) {
+        const minMonth = min_date.substring(0, 7);
+        document.getElementById("filterMonth").min = minMonth;
+      }
+      if (max_date) {
+        const maxMonth = max_date.substring(0, 7);
+        document.getElementById("filterMonth").max = maxMonth;
+      }
+    }
+  } catch (e) {
+    console.warn("Impossible de charger date range métaux:", e);
+  }
+}
+
+/** Charge les devises FX depuis la DB et peuple le dropdown */
+async function loadFxCurrencyOptions() {
+  const indicator = document.getElementById("fxFilterLoading");
+  if (indicator) indicator.classList.add("visible");
+  try {
+    const j = await fetchDimension("fx_currencies", "/api/fx/currencies");
+    if (j.status === "success" && j.data.length > 0) {
+      const select = document.getElementById("fxQuoteCurrency");
+      const current = select.value;
+      select.innerHTML = `<option value="all">${t("fx_all_currencies")}</option>`;
+      j.data.forEach((code) => {
+        const opt = document.createElement("option");
+        opt.value = code;
+        opt.textContent = code;
+        select.appendChild(opt);
+      });
+      if (current && current !== "all") select.value = current;
+    }
+  } catch (e) {
+    console.warn("Impossible de charger les devises FX:", e);
+  } finally {
+    if (indicator) indicator.classList.remove("visible");
+  }
+}
+
+/** Charge les date ranges FX depuis la DB */
+async function loadFxDateRange() {
+  try {
+    const j = await fetchDimension("fx_date_range", "/api/fx/date-range");
+    if (j.status === "success" && j.data) {
+      const { min_date, max_date } = j.data;
+      ["fxStartDate", "fxEndDate"].forEach((id) => {
+        const el = document.getElementById(id);
+        if (el) {
+          if (min_date) el.min = min_date;
+          if (max_date) el.max = max_date;
+        }
+      });
+      if (min_date)
+        document.getElementById("fxFilterMonth").min = min_date.substring(
+          0,
+          7,
+        );
+      if (max_date)
+        document.getElementById("fxFilterMonth").max = max_date.substring(
+          0,
+          7,
+        );
+    }
+  } catch (e) {
+    console.warn("Impossible de charger date range FX:", e);
+  }
+}
+
+// ==========================================
+// METALS FILTERS
+// ==========================================
+function handleFilterChange() {
+  applyFilters();
+}
+function handleFxFilterChange() {
+  applyFxFilters();
+}
+
+function handleMonthFilterChange() {
+  const monthValue = document.getElementById("filterMonth").value;
+  const startInput = document.getElementById("filterStartDate");
+  const endInput = document.getElementById("filterEndDate");
+  if (monthValue) {
+    const [year, month] = monthValue.split("-");
+    const firstDay = new Date(year, month - 1, 1)
+      .toISOString()
+      .split("T")[0];
+    const lastDay = new Date(year, month, 0).toISOString().split("T")[0];
+    startInput.min = firstDay;
+    startInput.max = lastDay;
+    endInput.min = firstDay;
+    endInput.max = lastDay;
+    if (
+      startInput.value &&
+      (startInput.value < firstDay || startInput.value > lastDay)
+    )
+      startInput.value = "";
+    if (
+      endInput.value &&
+      (endInput.value < firstDay || endInput.value > lastDay)
+    )
+      endInput.value = "";
+  } else {
+    startInput.removeAttribute("min");
+    startInput.removeAttribute("max");
+    endInput.removeAttribute("min");
+    endInput.removeAttribute("max");
+  }
+  applyFilters();
+}
+
+function applyFilters() {
+  currentFilters.metalType =
+    document.getElementById("filterMetalType").value;
+  currentFilters.month =
+    document.getElementById("filterMonth").value || null;
+  currentFilters.source = document.getElementById("filterSource").value;
+
+  if (currentFilters.month) {
+    const [year, month] = currentFilters.month.split("-");
+    const firstDay = new Date(year, month - 1, 1);
+    const lastDay = new Date(year, month, 0);
+    const sd = document.getElementById("filterStartDate").value;
+    const ed = document.getElementById("filterEndDate").value;
+    currentFilters.startDate = sd
+      ? sd
+      : firstDay.toISOString().split("T")[0];
+    currentFilters.endDate = ed
+      ? ed
+      : lastDay.toISOString().split("T")[0];
+  } else {
+    currentFilters.startDate =
+      document.getElementById("filterStartDate").value || null;
+    currentFilters.endDate =
+      document.getElementById("filterEndDate").value || null;
+  }
+  currentPage = 1;
+  loadPriceHistory();
+}
+
+function resetFilters() {
+  [
+    "filterMetalType",
+    "filterSource",
+    "filterMonth",
+    "filterStartDate",
+    "filterEndDate",
+  ].forEach((id) => {
+    const el = document.getElementById(id);
+    if (el) el.value = "";
+  });
+  ["filterStartDate", "filterEndDate"].forEach((id) => {
+    const el = document.getElementById(id);
+    if (el) {
+      el.removeAttribute("min");
+      el.removeAttribute("max");
+      el.disabled = false;
+    }
+  });
+  currentFilters = {
+    metalType: "all",
+    startDate: null,
+    endDate: null,
+    source: "all",
+    month: null,
+  };
+  currentPage = 1;
+  loadPriceHistory();
+}
+
+function updateActiveFiltersDisplay() {
+  const container = document.getElementById("activeFiltersContainer");
+  const badges = [];
+  if (currentFilters.metalType && currentFilters.metalType !== "all") {
+    const sel = document.getElementById("filterMetalType");
+    badges.push({
+      key: "metalType",
+      label: `Métal: ${sel.options[sel.selectedIndex]?.text || currentFilters.metalType}`,
+    });
+  }
+  if (currentFilters.source && currentFilters.source !== "all") {
+    const sel = document.getElementById("filterSource");
+    badges.push({
+      key: "source",
+      label: `Source: ${sel.options[sel.selectedIndex]?.text || currentFilters.source}`,
+    });
+  }
+  if (currentFilters.month)
+    badges.push({ key: "month", label: `Mois: ${currentFilters.month}` });
+  if (currentFilters.startDate)
+    badges.push({
+      key: "startDate",
+      label: `Début: ${currentFilters.startDate}`,
+    });
+  if (currentFilters.endDate)
+    badges.push({
+      key: "endDate",
+      label: `Fin: ${currentFilters.endDate}`,
+    });
+
+  if (badges.length > 0) {
+    container.style.display = "flex";
+    container.innerHTML = badges
+      .map(
+        (b) => `
+    <div class="filter-badge">
+      <span>${b.label}</span>
+      <span class="remove-filter" onclick="removeActiveFilter('${b.key}')">×</span>
+    </div>`,
+      )
+      .join("");
+  } else {
+    container.style.display = "none";
+  }
+}
+
+function removeActiveFilter(key) {
+  const map = {
+    metalType: () => {
+      document.getElementById("filterMetalType").value = "all";
+      currentFilters.metalType = "all";
+    },
+    source: () => {
+      document.getElementById("filterSource").value = "all";
+      currentFilters.source = "all";
+    },
+    month: () => {
+      document.getElementById("filterMonth").value = "";
+      currentFilters.month = null;
+    },
+    startDate: () => {
+      document.getElementById("filterStartDate").value = "";
+      currentFilters.startDate = null;
+    },
+    endDate: () => {
+      document.getElementById("filterEndDate").value = "";
+      currentFilters.endDate = null;
+    },
+  };
+  if (map[key]) {
+    map[key]();
+    currentPage = 1;
+    loadPriceHistory();
+  }
+}
+
+function updateFxActiveFiltersDisplay() {
+  const container = document.getElementById("fxActiveFiltersContainer");
+  const badges = [];
+  if (fxFilters.quoteCurrency && fxFilters.quoteCurrency !== "all")
+    badges.push({
+      key: "quoteCurrency",
+      label: `Devise: ${fxFilters.quoteCurrency}`,
+    });
+  if (fxFilters.month)
+    badges.push({ key: "month", label: `Mois: ${fxFilters.month}` });
+  if (fxFilters.startDate)
+    badges.push({
+      key: "startDate",
+      label: `Début: ${fxFilters.startDate}`,
+    });
+  if (fxFilters.endDate)
+    badges.push({ key: "endDate", label: `Fin: ${fxFilters.endDate}` });
+  if (badges.length > 0) {
+    container.style.display = "flex";
+    container.innerHTML = badges
+      .map(
+        (b) => `
+    <div class="filter-badge">
+      <span>${b.label}</span>
+      <span class="remove-filter" onclick="removeFxActiveFilter('${b.key}')">×</span>
+    </div>`,
+      )
+      .join("");
+  } else {
+    container.style.display = "none";
+  }
+}
+
+function removeFxActiveFilter(key) {
+  const map = {
+    quoteCurrency: () => {
+      document.getElementById("fxQuoteCurrency").value = "all";
+      fxFilters.quoteCurrency = "all";
+    },
+    month: () => {
+      document.getElementById("fxFilterMonth").value = "";
+      fxFilters.month = null;
+    },
+    startDate: () => {
+      document.getElementById("fxStartDate").value = "";
+      fxFilters.startDate = null;
+    },
+    endDate: () => {
+      document.getElementById("fxEndDate").value = "";
+      fxFilters.endDate = null;
+    },
+  };
+  if (map[key]) {
+    map[key]();
+    fxCurrentPage = 1;
+    loadFxRates();
+  }
+}
+
+function exportToExcel() {
+  let url = "/export/excel?";
+  if (currentFilters.metalType !== "all")
+    url += `metal_type=${currentFilters.metalType}&`;
+  if (currentFilters.month) {
+    url += `month=${currentFilters.month}&`;
+  } else {
+    if (currentFilters.startDate)
+      url += `start_date=${currentFilters.startDate}&`;
+    if (currentFilters.endDate)
+      url += `end_date=${currentFilters.endDate}&`;
+    if (!currentFilters.startDate && !currentFilters.endDate)
+      url += "days=30";
+  }
+  window.location.href = url;
+}
+
+// ==========================================
+// STATISTICS
+// ==========================================
+async function loadStatistics() {
+  try {
+    const r = await fetch("/api/statistics");
+    const result = await r.json();
+    if (result.status === "success") {
+      const data = result.data || {};
+      const variations = data.variations || [];
+      const summaryEl = document.getElementById("statsSummary");
+      if (summaryEl) {
+        summaryEl.textContent = `${data.total_records || 0} enregistrements • ${data.total_metals || 0} métaux suivis`;
+      }
+      const container = document.getElementById("statsContainer");
+      container.innerHTML = "";
+      if (!variations.length) {
+        container.innerHTML =
+          '<div class="no-data">Aucune statistique disponible</div>';
+        return;
+      }
+      variations.forEach((v, i) => {
+        const variation = parseFloat(v.variation_percent);
+        const isPositive = isNaN(variation) || variation >= 0;
+        const card = document.createElement("div");
+        card.className = "stat-card";
+        card.style.animationDelay = `${i * 0.1}s`;
+        card.innerHTML = `
+        <div class="stat-header">
+          <span class="stat-title">${(v.metal_type || "").toUpperCase()}</span>
+          <i class="fas fa-medal stat-icon"></i>
+        </div>
+        <div class="stat-value">${v.current_price != null ? formatPrice(v.current_price) + " " + (v.currency || "") : "--"}</div>
+        <div class="stat-change ${isPositive ? "change-positive" : "change-negative"}">
+          <i class="fas fa-arrow-${isPositive ? "up" : "down"}"></i>
+          <span>${isNaN(variation) ? "0" : (isPositive ? "+" : "") + formatPrice(variation)}% (24h)</span>
+        </div>`;
+        container.appendChild(card);
+      });
+    }
+  } catch (err) {
+    console.error("Erreur statistiques:", err);
+    document.getElementById("statsContainer").innerHTML =
+      '<div class="error-message"><i class="fas fa-exclamation-triangle"></i> Erreur de connexion à la base de données</div>';
+  }
+}
+
+// ==========================================
+// PRICE HISTORY TABLE
+// ==========================================
+function applyTableFiltersAndRender() {
+  const tableContainer = document.getElementById("tableContainer");
+  const paginationCtrls = document.getElementById("paginationControls");
+  if (!allPrices.length) {
+    tableContainer.innerHTML =
+      '<div class="no-data">Aucune donnée disponible pour ces filtres</div>';
+    if (paginationCtrls) paginationCtrls.style.display = "none";
+    return;
+  }
+  const sourceFilter = (currentFilters.source || "all").toLowerCase();
+  filteredPrices =
+    sourceFilter === "all"
+      ? allPrices.slice()
+      : allPrices.filter(
+          (p) =>
+            (formatSource(p.source_url).label || "").toLowerCase() ===
+            sourceFilter,
+        );
+
+  if (!filteredPrices.length) {
+    tableContainer.innerHTML =
+      '<div class="no-data">Aucune donnée pour ces filtres</div>';
+    if (paginationCtrls) paginationCtrls.style.display = "none";
+    return;
+  }
+  const totalPages = Math.max(
+    1,
+    Math.ceil(filteredPrices.length / pageSize),
+  );
+  if (currentPage > totalPages) currentPage = totalPages;
+  renderTablePage(currentPage, totalPages);
+}
+
+function renderTablePage(page, totalPages) {
+  const tableContainer = document.getElementById("tableContainer");
+  const paginationCtrls = document.getElementById("paginationControls");
+  const start = (page - 1) * pageSize;
+  const end = start + pageSize;
+  const pageData = filteredPrices.slice(start, end);
+
+  let html = `<table><thead><tr>
+  <th>Produit</th><th>Prix</th><th>Devise</th><th>Unité</th><th>Source</th><th>Date de prix</th>
+</tr></thead><tbody>`;
+
+  pageData.forEach((price) => {
+    const metalClass = `metal-${(price.metal_type || "default").toLowerCase()}`;
+    const source = formatSource(price.source_url);
+    html += `<tr>
+    <td><span class="metal-badge ${metalClass}">${price.metal_type || ""}</span></td>
+    <td><span class="price-value">${formatPrice(price.price)}</span></td>
+    <td>${price.currency || ""}</td>
+    <td>${price.unit || ""}</td>
+    <td><span class="source-badge ${source.class}">${source.label}</span></td>
+    <td>${price.price_date ? formatDateOnly(price.price_date) : ""}</td>
+  </tr>`;
+  });
+  html += "</tbody></table>";
+  tableContainer.innerHTML = html;
+
+  if (paginationCtrls) {
+    paginationCtrls.innerHTML = `
+    <div class="pagination-info">Affichage de ${start + 1} à ${Math.min(end, filteredPrices.length)} sur ${filteredPrices.length}</div>
+    <div class="pagination-buttons">
+      <button class="pagination-button" onclick="changePage(${page - 1})" ${page <= 1 ? "disabled" : ""}>‹ Précédent</button>
+      <span>Page ${page} / ${totalPages}</span>
+      <button class="pagination-button" onclick="changePage(${page + 1})" ${page >= totalPages ? "disabled" : ""}>Suivant ›</button>
+    </div>`;
+    paginationCtrls.style.display = "flex";
+  }
+}
+
+function changePage(p) {
+  const total = Math.max(1, Math.ceil(filteredPrices.length / pageSize));
+  if (p < 1 || p > total) return;
+  currentPage = p;
+  renderTablePage(currentPage, total);
+}
+
+// Dernier historique chargé : tant que les filtres ne changent pas, les
+// rafraîchissements ne demandent que les lignes ajoutées (?since=). Après une
+// correction ou une suppression côté base (revision changée), le serveur
+// renvoie tout l'historique (delta = false).
+let historyCache = { url: null, watermark: null, revision: null };
+
+function compareHistoryRows(a, b) {
+  if (a.metal_type !== b.metal_type)
+    return a.metal_type < b.metal_type ? -1 : 1;
+  if (a.price_date !== b.price_date)
+    return a.price_date < b.price_date ? 1 : -1;
+  return (b.created_at || "").localeCompare(a.created_at || "");
+}
+
+async function loadPriceHistory() {
+  const tableContainer = document.getElementById("tableContainer");
+  try {
+    let url = "/api/prices/history?";
+    if (currentFilters.metalType !== "all")
+      url += `metal_type=${currentFilters.metalType}&`;
+    if (currentFilters.month) {
+      url += `month=${currentFilters.month}&`;
+      if (currentFilters.startDate)
+        url += `start_date=${currentFilters.startDate}&`;
+      if (currentFilters.endDate)
+        url += `end_date=${currentFilters.endDate}&`;
+    } else {
+      if (currentFilters.startDate)
+        url += `start_date=${currentFilters.startDate}&`;
+      if (currentFilters.endDate)
+        url += `end_date=${currentFilters.endDate}&`;
+    }
+    const isDelta =
+      historyCache.url === url && historyCache.watermark && allPrices.length;
+    if (!isDelta)
+      tableContainer.innerHTML =
+        '<div class="loading"><div class="spinner"></div><p>Chargement...</p></div>';
+    const r = await fetch(
+      isDelta
+        ? `${url}since=${encodeURIComponent(historyCache.watermark)}&revision=${historyCache.revision}`
+        : url,
+    );
+    // ✅ Vérifier le Content-Type avant de parser JSON
+    const contentType = r.headers.get("content-type");
+    if (!contentType || !contentType.includes("application/json")) {
+      throw new Error(`Réponse non-JSON reçue (${r.status})`);
+    }
+    const result = await r.json();
+    if (result.status === "success") {
+      historyCache = { url, watermark: result.watermark, revision: result.revision };
+      if (result.delta) {
+        // Fusion par id : la marge de recouvrement renvoie des lignes déjà connues
+        const byId = new Map(allPrices.map((p) => [p.id, p]));
+        result.data.forEach((p) => byId.set(p.id, p));
+        result.data = [...byId.values()].sort(compareHistoryRows);
+      }
+    } else {
+      historyCache = { url: null, watermark: null, revision: null };
+    }
+    if (result.status === "success" && result.data.length > 0) {
+      allPrices = result.data;
+      applyTableFiltersAndRender();
+      updateActiveFiltersDisplay();
+    } else {
+      allPrices = [];
+      filteredPrices = [];
+      tableContainer.innerHTML =
+        '<div class="no-data">Aucune donnée disponible pour ces filtres</div>';
+      document.getElementById("paginationControls").style.display =
+        "none";
+      updateActiveFiltersDisplay();
+    }
+  } catch (err) {
+    console.error("Erreur historique:", err);
+    tableContainer.innerHTML = `<div class="error-message"><i class="fas fa-exclamation-triangle"></i> ${err.message || "Erreur de connexion"}</div>`;
+    document.getElementById("paginationControls").style.display = "none";
+  }
+}
+
+// ==========================================
+// FX FUNCTIONS
+// ==========================================
+function renderFxTable() {
+  const container = document.getElementById("fxTableContainer");
+  const fxPagCtrl = document.getElementById("fxPaginationControls");
+  if (!fxData.length) {
+    container.innerHTML =
+      '<div class="no-data">Aucun taux disponible</div>';
+    if (fxPagCtrl) fxPagCtrl.style.display = "none";
+    return;
+  }
+  const quoteFilter = fxFilters.quoteCurrency || "all";
+  fxFilteredData =
+    quoteFilter === "all"
+      ? fxData.slice()
+      : fxData.filter((r) => r.quote_currency === quoteFilter);
+
+  if (!fxFilteredData.length) {
+    container.innerHTML =
+      '<div class="no-data">Aucun taux pour ces filtres</div>';
+    if (fxPagCtrl) fxPagCtrl.style.display = "none";
+    return;
+  }
+  const totalPages = Math.max(
+    1,
+    Math.ceil(fxFilteredData.length / fxPageSize),
+  );
+  if (fxCurrentPage > totalPages) fxCurrentPage = totalPages;
+  renderFxTablePage(fxCurrentPage, totalPages);
+}
+
+function renderFxTablePage(page, totalPages) {
+  const container = document.getElementById("fxTableContainer");
+  const fxPagCtrl = document.getElementById("fxPaginationControls");
+  const start = (page - 1) * fxPageSize;
+  const end = start + fxPageSize;
+  const pageData = fxFilteredData.slice(start, end);
+
+  let html = `<table><thead><tr><th>Date</th><th>Devise</th><th>Taux</th></tr></thead><tbody>`;
+  pageData.forEach((row) => {
+    html += `<tr>
+    <td>${row.ref_date ? formatDateOnly(row.ref_date) : ""}</td>
+    <td><span class="${getCurrencyBadgeClass(row.quote_currency)}">${row.quote_currency || ""}</span></td>
+    <td>${row.rate != null ? formatPrice(row.rate) : "--"}</td>
+  </tr>`;
+  });
+  html += "</tbody></table>";
+  container.innerHTML = html;
+
+  if (fxPagCtrl) {
+    fxPagCtrl.innerHTML = `
+    <div>Affichage de ${start + 1} à ${Math.min(end, fxFilteredData.length)} sur ${fxFilteredData.length}</div>
+    <div class="pagination-buttons">
+      <button class="pagination-button" onclick="changeFxPage(${page - 1})" ${page <= 1 ? "disabled" : ""}>‹ Précédent</button>
+      <span>Page ${page} / ${totalPages}</span>
+      <button class="pagination-button" onclick="changeFxPage(${page + 1})" ${page >= totalPages ? "disabled" : ""}>Suivant ›</button>
+    </div>`;
+    fxPagCtrl.style.display = "flex";
+  }
+}
+
+function changeFxPage(p) {
+  const total = Math.max(
+    1,
+    Math.ceil(fxFilteredData.length / fxPageSize),
+  );
+  if (p < 1 || p > total) return;
+  fxCurrentPage = p;
+  renderFxTablePage(fxCurrentPage, total);
+}
+
+function applyFxFilters() {
+  fxFilters.quoteCurrency =
+    document.getElementById("fxQuoteCurrency").value || "all";
+  fxFilters.month =
+    document.getElementById("fxFilterMonth").value || null;
+  fxFilters.startDate =
+    document.getElementById("fxStartDate").value || null;
+  fxFilters.endDate = document.getElementById("fxEndDate").value || null;
+  if (fxFilters.month) {
+    fxFilters.startDate = null;
+    fxFilters.endDate = null;
+  }
+  fxCurrentPage = 1;
+  loadFxRates();
+}
+
+function resetFxFilters() {
+  [
+    "fxQuoteCurrency",
+    "fxFilterMonth",
+    "fxStartDate",
+    "fxEndDate",
+  ].forEach((id) => {
+    const el = document.getElementById(id);
+    if (el) el.value = "";
+  });
+  fxFilters = {
+    quoteCurrency: "all",
+    startDate: null,
+    endDate: null,
+    month: null,
+  };
+  // Restaurer le mois précédent par défaut
+  const prev = getPreviousMonth();
+  document.getElementById("fxFilterMonth").value = prev;
+  fxFilters.month = prev;
+  fxCurrentPage = 1;
+  loadFxRates();
+}
+
+function exportFxToExcel() {
+  let url = "/ecb/rates/export?";
+  if (fxFilters.month) url += `month=${fxFilters.month}&`;
+  else {
+    if (fxFilters.startDate) url += `start_date=${fxFilters.startDate}&`;
+    if (fxFilters.endDate) url += `end_date=${fxFilters.endDate}&`;
+  }
+  if (fxFilters.quoteCurrency && fxFilters.quoteCurrency !== "all")
+    url += `quote_currency=${fxFilters.quoteCurrency}&`;
+  window.location.href = url;
+}
+
+function downloadFlorentReport() {
+  const picker = document.getElementById("florent_report_date").value;
+  if (!picker) {
+    alert("Veuillez sélectionner un mois valide.");
+    return;
+  }
+  const [year, month] = picker.split("-");
+  window.location.href = `/ecb/export-florent?year=${year}&month=${parseInt(month, 10)}`;
+}
+
+// ==========================================
+// MONTHLY FX SUMMARY
+// ==========================================
+async function loadMonthlySummary() {
+  const container = document.getElementById("monthlySummaryContainer");
+  const periodText = document.getElementById("summaryPeriodText");
+  try {
+    let url = "/ecb/monthly-summary?";
+    if (fxFilters.month) {
+      const [y, m] = fxFilters.month.split("-");
+      url += `year=${y}&month=${parseInt(m, 10)}&`;
+    } else if (fxFilters.startDate) {
+      const d = new Date(fxFilters.startDate);
+      url += `year=${d.getFullYear()}&month=${d.getMonth() + 1}&`;
+    }
+    if (fxFilters.quoteCurrency && fxFilters.quoteCurrency !== "all")
+      url += `quote_currency=${fxFilters.quoteCurrency}&`;
+
+    const r = await fetch(url);
+    const result = await r.json();
+
+    if (
+      result.status === "success" &&
+      result.data &&
+      result.data.length > 0
+    ) {
+      const meta = result.metadata || {};
+      if (periodText)
+        periodText.textContent =
+          (meta.month_name || "") +
+          (meta.is_current_month ? " (En direct)" : "");
+
+      const getMonthAbbr = (n) =>
+        [
+          "Jan",
+          "Fév",
+          "Mar",
+          "Avr",
+          "Mai",
+          "Jun",
+          "Jul",
+          "Aoû",
+          "Sep",
+          "Oct",
+          "Nov",
+          "Déc",
+        ][(n || 1) - 1];
+
+      let html = `<table class="summary-table"><thead><tr>
+      <th>Devise</th>
+      <th>Closing Rate<br><small>(${getMonthAbbr(meta.month)} ${meta.year})</small></th>
+      <th>Period Rate<br><small>(M-1)</small></th>
+      <th>Budget Rate<br><small>(Budget ${meta.year})</small></th>
+      <th>Average YTD<br><small>(Jan - ${getMonthAbbr(meta.month)})</small></th>
+    </tr></thead><tbody>`;
+
+      result.data.forEach((row) => {
+        const cr =
+          row.closing_rate != null
+            ? formatPrice(row.closing_rate)
+            : "N/A";
+        const pr =
+          row.period_rate != null ? formatPrice(row.period_rate) : "N/A";
+        const br =
+          row.budget_rate != null ? formatPrice(row.budget_rate) : "—";
+        const ya =
+          row.ytd_average != null ? formatPrice(row.ytd_average) : "N/A";
+        const cd = row.closing_date
+          ? formatDateOnly(row.closing_date)
+          : "";
+        const pd = row.period_date ? formatDateOnly(row.period_date) : "";
+        html += `<tr>
+        <td><span class="${getCurrencyBadgeClass(row.quote_currency)}">${row.quote_currency || ""}</span></td>
+        <td><span class="rate-value">${cr}</span>${cd ? `<span class="rate-date">au ${cd}</span>` : ""}</td>
+        <td><span class="rate-value">${pr}</span>${pd ? `<span class="rate-date">au ${pd}</span>` : ""}</td>
+        <td><span class="rate-value">${br}</span></td>
+        <td><span class="rate-value">${ya}</span></td>
+      </tr>`;
+      });
+      html += "</tbody></table>";
+      container.innerHTML = html;
+    } else {
+      container.innerHTML =
+        '<div style="text-align:center;padding:30px;color:var(--text-secondary);">Aucun résumé disponible pour cette période</div>';
+      if (periodText) periodText.textContent = "Aucune donnée";
+    }
+  } catch (err) {
+    console.error("Erreur résumé mensuel:", err);
+    container.innerHTML =
+      '<div class="error-message">Erreur chargement résumé mensuel</div>';
+    if (periodText) periodText.textContent = "Erreur";
+  }
+}
+
+async function loadFxRates() {
+  const container = document.getElementById("fxTableContainer");
+  if (container)
+    container.innerHTML =
+      '<div class="loading"><div class="spinner"></div><p>Chargement...</p></div>';
+  try {
+    let url = "/ecb/rates?";
+    if (fxFilters.month) url += `month=${fxFilters.month}&`;
+    else {
+      if (fxFilters.startDate)
+        url += `start_date=${fxFilters.startDate}&`;
+      if (fxFilters.endDate) url += `end_date=${fxFilters.endDate}&`;
+    }
+    if (fxFilters.quoteCurrency && fxFilters.quoteCurrency !== "all")
+      url += `quote_currency=${fxFilters.quoteCurrency}&`;
+
+    const r = await fetch(url);
+    const contentType = r.headers.get("content-type");
+    if (!contentType || !contentType.includes("application/json")) {
+      throw new Error(`Réponse non-JSON (${r.status})`);
+    }
+    const result = await r.json();
+
+    if (
+      result.status === "success" &&
+      result.data &&
+      result.data.length > 0
+    ) {
+      fxData = result.data;
+      fxCurrentPage = 1;
+      renderFxTable();
+      updateFxActiveFiltersDisplay();
+    } else {
+      fxData = [];
+      fxFilteredData = [];
+      if (container)
+        container.innerHTML =
+          '<div class="no-data">Aucun taux pour ces filtres</div>';
+    }
+    await loadMonthlySummary();
+  } catch (err) {
+    console.error("Erreur FX:", err);
+    if (container)
+      container.innerHTML = `<div class="error-message"><i class="fas fa-exclamation-triangle"></i> ${err.message}</div>`;
+  }
+}
+
+// ==========================================
+// COLLAPSIBLE
+// ==========================================
+function toggleFxDetailsSection() {
+  const content = document.getElementById("fxDetailsContent");
+  const icon = document.getElementById("fxDetailsToggleIcon");
+  if (content.classList.contains("expanded")) {
+    content.classList.remove("expanded");
+    icon.classList.remove("rotated");
+  } else {
+    content.classList.add("expanded");
+    icon.classList.add("rotated");
+    if (!fxData.length) loadFxRates();
+  }
+}
+
+// ==========================================
+// PAGE NAVIGATION — ✅ FX chargé en lazy
+// ==========================================
+let fxInitialized = false;
+let wbInitialized = false;
+
+function showPage(page) {
+  ["metals", "fx", "workbook"].forEach((p) => {
+    document.getElementById(`page-${p}`).style.display = "none";
+    document.getElementById(`tab-${p}`).classList.remove("active");
+  });
+  document.getElementById(`page-${page}`).style.display = "block";
+  document.getElementById(`tab-${page}`).classList.add("active");
+
+  if (page === "fx" && !fxInitialized) {
+    fxInitialized = true;
+    // Charger filtres dynamiques FX + données
+    loadFxCurrencyOptions();
+    loadFxDateRange();
+    loadFxRates();
+  } else if (page === "fx") {
+    // Juste recharger le résumé si changement onglet
+    loadMonthlySummary();
+  }
+  if (page === "workbook" && !wbInitialized) {
+    wbInitialized = true;
+    wbInit();
+  }
+}
+
+// ==========================================
+// MAIN LOAD — ✅ FX non chargé au démarrage
+// ==========================================
+async function loadData() {
+  document.getElementById("lastUpdate").textContent =
+    "Mise à jour en cours...";
+  await Promise.all([loadStatistics(), loadPriceHistory()]);
+  // FX seulement si la page est visible
+  if (document.getElementById("page-fx").style.display !== "none") {
+    await loadFxRates();
+  }
+  document.getElementById("lastUpdate").textContent = formatDate(
+    new Date(),
+  );
+}
+
+// ==========================================
+// HELPERS DATE
+// ==========================================
+function getPreviousMonth() {
+  const d = new Date();
+  d.setMonth(d.getMonth() - 1);
+  return `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, "0")}`;
+}
+
+// ==========================================
+// INITIALISATION
+// ==========================================
+function initDefaults() {
+  const prev = getPreviousMonth();
+  const florentPicker = document.getElementById("florent_report_date");
+  if (florentPicker) florentPicker.value = prev;
+}
+
+// ✅ Démarrage
+initDefaults();
+// 1. Charger les filtres dynamiques (metals) en parallèle
+Promise.all([
+  loadMetalTypeOptions(),
+  loadSourceOptions(),
+  loadMetalsDateRange(),
+]).then(() => {
+  // 2. Charger les données
+  loadData();
+});
+showPage("metals");
+// Rafraîchissement après chaque sync, poussé par /api/stream (SSE) ;
+// repli sur l'auto-refresh toutes les 5 minutes si le flux est indisponible
+let dataVersion = null,
+  pollTimer = null;
+function startPolling() {
+  if (!pollTimer) pollTimer = setInterval(loadData, 5 * 60 * 1000);
+}
+function startDataStream() {
+  if (!window.EventSource) return startPolling();
+  const es = new EventSource("/api/stream");
+  es.addEventListener("data-version", (e) => {
+    const { version } = JSON.parse(e.data);
+    if (dataVersion !== null && version !== dataVersion) {
+      wbCache = {};
+      loadData();
+    }
+    dataVersion = version;
+  });
+  es.onerror = () => {
+    // Réponse 204 ou erreur définitive : le navigateur ne se reconnecte pas
+    if (es.readyState === EventSource.CLOSED) startPolling();
+  };
+}
+startDataStream();
+
+// ==========================================
+// AUTO-OPEN CALENDAR
+// ==========================================
+document.addEventListener("DOMContentLoaded", () => {
+  [
+    "filterMonth",
+    "fxFilterMonth",
+    "filterStartDate",
+    "filterEndDate",
+    "fxStartDate",
+    "fxEndDate",
+    "florent_report_date",
+  ].forEach((id) => {
+    const el = document.getElementById(id);
+    if (el)
+      el.addEventListener("focus", () => {
+        try {
+          if (el.showPicker) el.showPicker();
+        } catch (e) {}
+      });
+  });
+});
+
+// ============================================================
+// WORKBOOK ENGINE — (identique, conservé intégralement)
+// ============================================================
+const WB_SHEETS = [
+  {
+    id: "brent",
+    name: "Brent London",
+    icon: "fa-oil-can",
+    color: "#e67e22",
+  },
+  { id: "comex", name: "COMEX", icon: "fa-building", color: "#2980b9" },
+  { id: "girm", name: "GIRM", icon: "fa-industry", color: "#27ae60" },
+  { id: "shme", name: "SHME", icon: "fa-chart-bar", color: "#c0392b" },
+  {
+    id: "lsnikko",
+    name: "LS NIKKO",
+    icon: "fa-yen-sign",
+    color: "#8e44ad",
+  },
+  { id: "silver", name: "SILVER", icon: "fa-coins", color: "#7f8c8d" },
+  { id: "lme", name: "LME", icon: "fa-globe", color: "#16a085" },
+  { id: "summary", name: "SUMMARY", icon: "fa-table", color: "#2c3e50" },
+];
+let wbCurrentSheet = null,
+  wbCache = {},
+  wbFilters = {};
+const WB_MN = [
+  "Jan",
+  "Fév",
+  "Mar",
+  "Avr",
+  "Mai",
+  "Juin",
+  "Juil",
+  "Août",
+  "Sep",
+  "Oct",
+  "Nov",
+  "Déc",
+];
+
+async function wbInit() {
+  wbBuildTabs();
+  const now = new Date();
+  const prevM = now.getMonth() === 0 ? 12 : now.getMonth();
+  const prevY =
+    now.getMonth() === 0 ? now.getFullYear() - 1 : now.getFullYear();
+  wbFilters["silver"] = { year: prevY, month: prevM };
+  await wbLoadBadges();
+  wbSwitchSheet(WB_SHEETS[0].id);
+}
+
+function wbBuildTabs() {
+  const bar = document.getElementById("wbTabBar");
+  bar.innerHTML = "";
+  WB_SHEETS.forEach((s) => {
+    const tab = document.createElement("div");
+    tab.className = "wb-tab";
+    tab.id = `wbtab-${s.id}`;
+    tab.onclick = () => wbSwitchSheet(s.id);
+    tab.innerHTML = `<i class="fas ${s.icon}" style="color:${s.color}"></i><span>${s.name}</span><span class="wb-badge" id="wbbadge-${s.id}">–</span>`;
+    bar.appendChild(tab);
+  });
+}
+
+async function wbLoadBadges() {
+  try {
+    const r = await fetch("/api/metals/sheets");
+    const j = await r.json();
+    if (j.status === "success") {
+      WB_SHEETS.forEach((s) => {
+        const b = document.getElementById(`wbbadge-${s.id}`);
+        if (b && j.sheets[s.id])
+          b.textContent = j.sheets[s.id].count || 0;
+      });
+      const lu = document.getElementById("wbLastUpdate");
+      if (lu)
+        lu.textContent =
+          "Dernière MàJ: " + new Date().toLocaleString("fr-FR");
+    }
+  } catch (e) {
+    console.warn("wbLoadBadges", e);
+  }
+}
+
+async function wbSwitchSheet(id) {
+  document
+    .querySelectorAll(".wb-tab")
+    .forEach((t) => t.classList.remove("active"));
+  const tab = document.getElementById(`wbtab-${id}`);
+  if (tab) tab.classList.add("active");
+  wbCurrentSheet = id;
+  if (wbCache[id]) {
+    wbRender(id, wbCache[id]);
+    return;
+  }
+  await wbLoad(id);
+}
+
+function wbQS(id) {
+  const f = wbFilters[id] || {};
+  return Object.entries(f)
+    .filter(([, v]) => v)
+    .map(([k, v]) => `${k}=${encodeURIComponent(v)}`)
+    .join("&");
+}
+
+async function wbLoad(id) {
+  const c = document.getElementById("wbSheetContainer");
+  const sh = WB_SHEETS.find((s) => s.id === id);
+  c.innerHTML = `<div class="wb-loading"><div class="wb-spinner"></div><p>Chargement ${sh.name}…</p></div>`;
+  try {
+    const qs = wbQS(id);
+    const r = await fetch(`/api/metals/sheet/${id}${qs ? "?" + qs : ""}`);
+    const j = await r.json();
+    if (j.status === "success") {
+      wbCache[id] = j;
+      wbRender(id, j);
+    } else
+      c.innerHTML = `<div class="wb-no-data"><i class="fas fa-exclamation-triangle"></i><p>${j.message || "Erreur"}</p></div>`;
+  } catch (e) {
+    c.innerHTML = `<div class="wb-no-data"><i class="fas fa-wifi"></i><p>Erreur réseau</p></div>`;
+  }
+}
+
+async function wbOnFilterChange(id) {
+  const f = {};
+  const mapping = {
+    wbfy: "year",
+    wbfm: "month",
+    wbfsd: "start_date",
+    wbfed: "end_date",
+    wbfmt: "metal_type",
+  };
+  Object.entries(mapping).forEach(([pfx, key]) => {
+    const el = document.getElementById(`${pfx}-${id}`);
+    if (el && el.value) f[key] = el.value;
+  });
+  wbFilters[id] = f;
+  delete wbCache[id];
+  await wbLoad(id);
+}
+
+async function wbReset(id) {
+  wbFilters[id] = {};
+  delete wbCache[id];
+  ["wbfy", "wbfm", "wbfsd", "wbfed", "wbfmt"].forEach((pfx) => {
+    const el = document.getElementById(`${pfx}-${id}`);
+    if (el) el.value = "";
+  });
+  await wbLoad(id);
+}
+
+function wbExport(id) {
+  window.location.href = `/api/metals/export/${id}`;
+}
+async function wbRefresh(id) {
+  delete wbCache[id];
+  await wbLoad(id);
+}
+
+function wbFilterPanel(id, opts = {}) {
+  const f = wbFilters[id] || {};
+  const years = [2026, 2025, 2024, 2023, 2022, 2021, 2020, 2019];
+  const change = `wbOnFilterChange('${id}')`;
+  const yearSel = `<div class="wb-filter-group"><label class="wb-filter-label">${t("wb_year")}</label>
+  <select class="wb-filter-select" id="wbfy-${id}" onchange="${change}">
+    <option value="">${t("wb_all_years")}</option>
+    ${years.map((y) => `<option value="${y}" ${f.year == y ? "selected" : ""}>${y}</option>`).join("")}
+  </select></div>`;
+  const monthSel = opts.noMonth
+    ? ""
+    : `<div class="wb-filter-group"><label class="wb-filter-label">${t("wb_month")}</label>
+  <select class="wb-filter-select" id="wbfm-${id}" onchange="${change}">
+    <option value="">${t("wb_all_months")}</option>
+    ${WB_MN.map((n, i) => `<option value="${i + 1}" ${f.month == i + 1 ? "selected" : ""}>${n}</option>`).join("")}
+  </select></div>`;
+  const dateRange = opts.noDate
+    ? ""
+    : `<div class="wb-filter-group"><label class="wb-filter-label">${t("wb_start_date")}</label>
+  <input type="date" class="wb-filter-input" id="wbfsd-${id}" value="${f.start_date || ""}" onchange="${change}"></div>
+  <div class="wb-filter-group"><label class="wb-filter-label">${t("wb_end_date")}</label>
+  <input type="date" class="wb-filter-input" id="wbfed-${id}" value="${f.end_date || ""}" onchange="${change}"></div>`;
+  const metalSel = opts.hasMetal
+    ? `<div class="wb-filter-group"><label class="wb-filter-label">${t("wb_metal")}</label>
+  <select class="wb-filter-select" id="wbfmt-${id}" onchange="${change}">
+    <option value="">${t("wb_all_metals")}</option>
+    <option value="copper"  ${f.metal_type === "copper" ? "selected" : ""}>Copper</option>
+    <option value="zinc"    ${f.metal_type === "zinc" ? "selected" : ""}>Zinc</option>
+    <option value="tin"     ${f.metal_type === "tin" ? "selected" : ""}>Tin</option>
+    <option value="silver"  ${f.metal_type === "silver" ? "selected" : ""}>Silver</option>
+  </select></div>`
+    : "";
+  const resetBtn = `<div class="wb-filter-group"><label class="wb-filter-label">&nbsp;</label>
+  <button class="wb-btn wb-btn-gray" onclick="wbReset('${id}')"><i class="fas fa-times"></i> ${t("wb_reset")}</button></div>`;
+  return `<div class="wb-filters">${yearSel}${monthSel}${dateRange}${metalSel}${resetBtn}</div>`;
+}
+
+function wbRender(id, data) {
+  const c = document.getElementById("wbSheetContainer");
+  const sh = WB_SHEETS.find((s) => s.id === id);
+  const fmt = data.config?.format;
+  let html = `<div class="wb-sheet-header">
+  <div class="wb-sheet-title"><i class="fas ${sh.icon}" style="color:${sh.color}"></i>${sh.name}</div>
+  <div class="wb-actions">
+    <button class="wb-btn wb-btn-primary" onclick="wbRefresh('${id}')"><i class="fas fa-sync-alt"></i> ${t("wb_refresh")}</button>
+    <button class="wb-btn wb-btn-success" onclick="wbExport('${id}')"><i class="fas fa-file-excel"></i> ${t("wb_export")}</button>
+  </div></div>`;
+
+  if (fmt === "year_month") html += wbBrent(id, data);
+  else if (fmt === "monthly_matrix") html += wbSHME(id, data);
+  else if (fmt === "yearly_columns") html += wbYearly(id, data);
+  else if (fmt === "monthly_with_conversion") html += wbCOMEX(id, data);
+  else if (id === "silver") html += wbSilver(id, data);
+  else if (id === "summary") {
+    html += `<div style="text-align:center;padding:60px 30px;">
+    <div style="display:inline-block;background:#f0f6ff;border:2px solid #0066b2;border-radius:16px;padding:40px 50px;max-width:540px;box-shadow:0 4px 20px rgba(0,102,178,0.12);">
+      <div style="margin-bottom:18px;">
+        <span style="display:inline-flex;align-items:center;gap:8px;background:#0066b2;color:white;font-size:12px;font-weight:700;padding:5px 14px;border-radius:20px;letter-spacing:1px;text-transform:uppercase;">
+          <span style="width:8px;height:8px;background:#4fc3f7;border-radius:50%;display:inline-block;animation:pulse-dot 1.5s infinite;"></span>
+          Phase Enhancement
+        </span>
+      </div>
+      <i class="fas fa-tools" style="font-size:48px;color:#0066b2;margin-bottom:16px;display:block;"></i>
+      <h3 style="margin:0 0 10px;color:#2c3e50;font-size:20px;">En cours de développement</h3>
+      <p style="margin:0 0 18px;color:#7f8c8d;font-size:14px;line-height:1.6;">La synthèse multi-sources est en cours d'amélioration.<br>Cette fonctionnalité sera disponible prochainement.</p>
+      <div style="background:white;border:1px solid #dee2e6;border-radius:10px;padding:14px 20px;display:inline-block;">
+        <span style="font-size:13px;color:#495057;font-weight:600;"><i class="fas fa-code-branch" style="color:#0066b2;margin-right:6px;"></i>Enhancement in progress…</span>
+      </div>
+    </div>
+  </div>`;
+    c.innerHTML = html;
+    return;
+  } else html += wbStandard(id, data);
+
+  html += wbFormulaNote(id);
+  html = html.replace(
+    '<div class="wb-table-wrap">',
+    `<div class="wb-table-wrap" id="${id}-tablewrap">`,
+  );
+  c.innerHTML = html;
+  requestAnimationFrame(() => wbMakeTableDynamic(`${id}-tablewrap`, 25));
+}
+
+function wbBrent(id, data) {
+  let html = wbFilterPanel(id);
+  if (!data.data?.length)
+    return (
+      html +
+      `<div class="wb-no-data"><i class="fas fa-database"></i><p>${t("wb_no_data")}</p></div>`
+    );
+  const rows = [...data.data]
+    .sort((a, b) => b.year - a.year || b.month - a.month)
+    .map(
+      (r) => `<tr>
+  <td>${r.year}</td><td>${WB_MN[(r.month || 1) - 1]}</td>
+  <td class="wb-num">${r.price != null ? Number(r.price).toFixed(2) : "–"}</td></tr>`,
+    )
+    .join("");
+  return (
+    html +
+    `<div class="wb-table-wrap"><div class="wb-table-scroll"><table class="wb-table"><thead><tr>
+  <th>${t("wb_year")}</th><th>${t("wb_month")}</th><th>Prix moy. (€/baril)</th>
+</tr></thead><tbody>${rows}</tbody></table></div></div>`
+  );
+}
+
+function wbCOMEX(id, data) {
+  let html = wbFilterPanel(id);
+  if (!data.data?.length)
+    return (
+      html +
+      `<div class="wb-no-data"><i class="fas fa-database"></i><p>${t("wb_no_data")}</p></div>`
+    );
+  const rows = [...data.data]
+    .sort((a, b) => b.year - a.year || b.month - a.month)
+    .map(
+      (r) => `<tr>
+  <td>${r.year}</td><td>${WB_MN[(r.month || 1) - 1]}</td>
+  <td class="wb-num">${r.price_lb != null ? Number(r.price_lb).toFixed(4) : "–"}</td>
+  <td class="wb-formula" title="= price_lb × 2.203">${r.price_kg_usd != null ? Number(r.price_kg_usd).toFixed(4) : "–"}</td></tr>`,
+    )
+    .join("");
+  return (
+    html +
+    `<div class="wb-table-wrap"><div class="wb-table-scroll"><table class="wb-table"><thead><tr>
+  <th>${t("wb_year")}</th><th>${t("wb_month")}</th><th>Prix USD/lb</th><th>🔢 Prix USD/kg</th>
+</tr></thead><tbody>${rows}</tbody></table></div></div>`
+  );
+}
+
+function wbYearly(id, data) {
+  let html = wbFilterPanel(id, { noMonth: true });
+  const inner = data.data || {};
+  const years = inner.years || [];
+  const rows = inner.data || [];
+  if (!rows.length)
+    return (
+      html +
+      `<div class="wb-no-data"><i class="fas fa-database"></i><p>${t("wb_no_data")}</p></div>`
+    );
+  const isGirm = id === "girm";
+  const unitLabel = isGirm ? "€/kg" : "USD/t";
+  let body = "";
+  for (let m = 1; m <= 12; m++) {
+    const rd = rows.find((r) => r.month === m);
+    body += `<tr><td><strong>${WB_MN[m - 1]}</strong></td>`;
+    years.forEach((yr) => {
+      let v = rd?.[`year_${yr}`];
+      if (isGirm && v != null && Number(v) > 30) v = Number(v) / 100;
+      body += `<td class="wb-num">${v != null ? Number(v).toFixed(4) : "–"}</td>`;
+    });
+    body += `</tr>`;
+  }
+  body += `<tr class="wb-row-avg"><td>📊 ${t("wb_avg_annual")}</td>`;
+  years.forEach((yr) => {
+    let prices = rows
+      .map((r) => r[`year_${yr}`])
+      .filter((v) => v != null);
+    if (isGirm)
+      prices = prices.map((v) =>
+        Number(v) > 30 ? Number(v) / 100 : Number(v),
+      );
+    const avg = prices.length
+      ? (
+          prices.reduce((a, b) => a + Number(b), 0) / prices.length
+        ).toFixed(4)
+      : "–";
+    body += `<td class="wb-num" style="color:#0066b2;">${avg}</td>`;
+  });
+  body += `</tr>`;
+  return (
+    html +
+    `<div class="wb-table-wrap"><div class="wb-table-scroll"><table class="wb-table"><thead><tr>
+  <th>Mois</th>${years.map((y) => `<th>${y} (${unitLabel})</th>`).join("")}
+</tr></thead><tbody>${body}</tbody></table></div></div>`
+  );
+}
+
+function calcSHMEAlloys(cu, zn, sn) {
+  if (cu == null) return {};
+  const V = 1.13;
+  return {
+    H62: (
+      (cu * 0.62 * 1.05 + zn * 0.38 * 1.05 + 4000 / V) /
+      1000
+    ).toFixed(3),
+    H65: (
+      (cu * 0.65 * 1.05 + zn * 0.35 * 1.05 + 4000 / V) /
+      1000
+    ).toFixed(3),
+    H68: (
+      (cu * 0.68 * 1.05 + zn * 0.32 * 1.05 + 4000 / V) /
+      1000
+    ).toFixed(3),
+    H70: ((cu * 0.7 * 1.05 + zn * 0.3 * 1.05 + 4500 / V) / 1000).toFixed(
+      3,
+    ),
+    H85: (
+      (cu * 0.85 * 1.05 + zn * 0.15 * 1.05 + 5800 / V) /
+      1000
+    ).toFixed(3),
+    Qsn4:
+      sn != null
+        ? (
+            (cu * 0.96 * 1.05 + sn * 0.04 * 1.05 + 3000 / V) /
+            1000
+          ).toFixed(3)
+        : null,
+    Qsn65:
+      sn != null
+        ? (
+            (cu * 0.935 * 1.05 + sn * 0.065 * 1.05 + 3000 / V) /
+            1000
+          ).toFixed(3)
+        : null,
+    Qsn8:
+      sn != null
+        ? (
+            (cu * 0.92 * 1.05 + sn * 0.08 * 1.05 + 5750 / V) /
+            1000
+          ).toFixed(3)
+        : null,
+    T2: ((cu * 1.05 + 5500 / V) / 1000).toFixed(3),
+  };
+}
+
+function wbSHME(id, data) {
+  let html = wbFilterPanel(id);
+  if (!data.data?.length)
+    return (
+      html +
+      `<div class="wb-no-data"><i class="fas fa-database"></i><p>${t("wb_no_data")}</p></div>`
+    );
+  const rows = [...data.data]
+    .sort((a, b) => b.year - a.year || b.month - a.month)
+    .map((r) => {
+      const al = calcSHMEAlloys(r.copper_base, r.zinc_base, r.tin_base);
+      const f0 = (v) => (v != null ? Number(v).toFixed(0) : "–");
+      const fa = (v) => (v != null ? v : "–");
+      return `<tr>
+    <td><strong>${r.year}-${String(r.month).padStart(2, "0")}</strong></td>
+    <td class="wb-num wb-row-base">${f0(r.copper_base)}</td>
+    <td class="wb-num wb-row-base">${f0(r.zinc_base)}</td>
+    <td class="wb-num wb-row-base">${f0(r.tin_base)}</td>
+    <td class="wb-formula wb-row-brass">${fa(al.H62)}</td>
+    <td class="wb-formula wb-row-brass">${fa(al.H65)}</td>
+    <td class="wb-formula wb-row-brass">${fa(al.H68)}</td>
+    <td class="wb-formula wb-row-brass">${fa(al.H70)}</td>
+    <td class="wb-formula wb-row-brass">${fa(al.H85)}</td>
+    <td class="wb-formula wb-row-bronze">${fa(al.Qsn4)}</td>
+    <td class="wb-formula wb-row-bronze">${fa(al.Qsn65)}</td>
+    <td class="wb-formula wb-row-bronze">${fa(al.Qsn8)}</td>
+    <td class="wb-formula wb-row-bronze">${fa(al.T2)}</td>
+  </tr>`;
+    })
+    .join("");
+  return (
+    html +
+    `<div class="wb-table-wrap"><div class="wb-table-scroll"><table class="wb-table"><thead>
+  <tr>
+    <th rowspan="2" style="vertical-align:middle;">${t("wb_month")}</th>
+    <th colspan="3" style="text-align:center;background:#f0f0f0;">${t("wb_base_metals")}</th>
+    <th colspan="5" style="text-align:center;background:#fffbf0;">${t("wb_alloy_brass")}</th>
+    <th colspan="4" style="text-align:center;background:#f5f0fb;">${t("wb_alloy_bronze")}</th>
+  </tr>
+  <tr>
+    <th>Copper</th><th>0# Zn99.995</th><th>Tin</th>
+    <th>H62</th><th>H65</th><th>H68</th><th>H70</th><th>H85</th>
+    <th>Qsn4-0.1</th><th>Qsn6.5-0.1</th><th>Qsn8-0.3</th><th>T2</th>
+  </tr>
+</thead><tbody>${rows}</tbody></table></div></div>`
+  );
+}
+
+function wbSilver(id, data) {
+  let html = wbFilterPanel(id);
+  if (!data.data?.length)
+    return (
+      html +
+      `<div class="wb-no-data"><i class="fas fa-database"></i><p>${t("wb_no_data_period")}</p></div>`
+    );
+  const rows = [...data.data]
+    .sort((a, b) => new Date(b.price_date) - new Date(a.price_date))
+    .map(
+      (r) => `<tr>
+  <td>${r.price_date ? new Date(r.price_date).toLocaleDateString("fr-FR") : "–"}</td>
+  <td class="wb-num">${r.price != null ? Number(r.price).toFixed(2) : "–"}</td>
+  <td style="text-align:center;">${r.currency || "–"}</td>
+  <td style="text-align:center;">${r.unit || "–"}</td>
+</tr>`,
+    )
+    .join("");
+  return (
+    html +
+    `<div class="wb-table-wrap"><div class="wb-table-scroll"><table class="wb-table"><thead><tr>
+  <th>${t("table_date")}</th><th>Prix</th><th>${t("table_currency")}</th><th>${t("table_unit")}</th>
+</tr></thead><tbody>${rows}</tbody></table></div></div>`
+  );
+}
+
+function wbStandard(id, data) {
+  const isYearly = data.config?.format === "yearly_columns";
+  if (isYearly) return wbYearly(id, data);
+  let html = wbFilterPanel(id, { hasMetal: true });
+  if (!data.data?.length)
+    return (
+      html +
+      `<div class="wb-no-data"><i class="fas fa-database"></i><p>${t("wb_no_data")}</p></div>`
+    );
+  const rows = [...data.data]
+    .sort((a, b) => new Date(b.price_date) - new Date(a.price_date))
+    .map(
+      (r) => `<tr>
+  <td>${r.price_date ? new Date(r.price_date).toLocaleDateString("fr-FR") : "–"}</td>
+  <td><span style="background:#e8f4fd;color:#0066b2;padding:2px 8px;border-radius:10px;font-size:11px;font-weight:700;">${r.metal_type || "–"}</span></td>
+  <td class="wb-num">${r.price != null ? Number(r.price).toFixed(4) : "–"}</td>
+  <td style="text-align:center;">${r.currency || "–"}</td>
+  <td style="text-align:center;">${r.unit || "–"}</td>
+</tr>`,
+    )
+    .join("");
+  return (
+    html +
+    `<div class="wb-table-wrap"><div class="wb-table-scroll"><table class="wb-table"><thead><tr>
+  <th>${t("table_date")}</th><th>${t("table_product")}</th><th>Prix</th><th>${t("table_currency")}</th><th>${t("table_unit")}</th>
+</tr></thead><tbody>${rows}</tbody></table></div></div>`
+  );
+}
+
+function wbFormulaNote(id) {
+  const notes = {
+    brent:
+      "📐 <strong>Brent London (INSEE)</strong> — <code>AVG(prix quotidiens)</code> · EUR/baril",
+    comex:
+      "📐 <strong>COMEX</strong> — <code>Prix USD/kg = Prix USD/lb × 2.203</code>",
+    girm: "📐 <strong>GIRM</strong> — Cuivre EUR/kg · <code>Moy. annuelle = AVG(Jan→Déc)</code>",
+    shme: "📐 <strong>SHME</strong> — Laiton: <code>H62=(Cu×0.62×1.05+Zn×0.38×1.05+4000/1.13)/1000</code> · TVA diviseur=1.13",
+    lsnikko: "📐 <strong>LS NIKKO</strong> — Cuivre USD/tonne",
+    silver:
+      "📐 <strong>Silver (AGOSI)</strong> — Prix journalier EUR · mois précédent par défaut",
+    lme: "📐 <strong>LME</strong> — Cu, Zn, Sn, Ag en USD/tonne",
+  };
+  return notes[id]
+    ? `<div class="wb-formula-note">${notes[id]}</div>`
+    : "";
+}
+
+function wbMakeTableDynamic(containerId, pageSize = 20) {
+  const wrap = document.getElementById(containerId);
+  if (!wrap) return;
+  const table = wrap.querySelector(".wb-table");
+  if (!table) return;
+  const tbody = table.querySelector("tbody");
+  if (!tbody) return;
+  let allRows = Array.from(tbody.querySelectorAll("tr"));
+  let filtered = allRows.slice();
+  let page = 1;
+  const ctrl = document.createElement("div");
+  ctrl.className = "wb-dt-controls";
+  ctrl.innerHTML = `<div style="display:flex;align-items:center;gap:10px;">
+  <div class="wb-dt-search"><i class="fas fa-search"></i><input type="text" placeholder="${t("wb_search")}" id="${containerId}-search" autocomplete="off"></div>
+  <select class="wb-dt-pagesize" id="${containerId}-psize">
+    ${[10, 20, 50, 100].map((n) => `<option value="${n}" ${n == pageSize ? "selected" : ""}>${n} ${t("wb_per_page")}</option>`).join("")}
+  </select></div>
+  <div style="display:flex;align-items:center;gap:12px;">
+    <span class="wb-dt-info" id="${containerId}-info"></span>
+    <div class="wb-dt-pagination" id="${containerId}-pages"></div>
+  </div>`;
+  wrap.insertBefore(ctrl, wrap.querySelector(".wb-table-wrap"));
+
+  function getPS() {
+    return parseInt(
+      document.getElementById(`${containerId}-psize`)?.value || pageSize,
+    );
+  }
+  function updateInfo() {
+    const ps = getPS(),
+      total = filtered.length,
+      from = total ? (page - 1) * ps + 1 : 0,
+      to = Math.min(page * ps, total);
+    const el = document.getElementById(`${containerId}-info`);
+    if (el)
+      el.textContent = `${from}–${to} ${t("wb_rows_of")} ${total} ${t("wb_rows")}`;
+  }
+  function renderPage() {
+    const ps = getPS(),
+      totalP = Math.max(1, Math.ceil(filtered.length / ps));
+    if (page > totalP) page = 1;
+    const start = (page - 1) * ps,
+      end = start + ps;
+    allRows.forEach((r) => r.classList.add("wb-row-hidden"));
+    filtered
+      .slice(start, end)
+      .forEach((r) => r.classList.remove("wb-row-hidden"));
+    updateInfo();
+    const pagesEl = document.getElementById(`${containerId}-pages`);
+    if (!pagesEl) return;
+    let btns = `<button class="wb-dt-page" ${page <= 1 ? "disabled" : ""} onclick="wbDTGoPage('${containerId}',${page - 1})">‹</button>`;
+    const range = [];
+    for (let i = 1; i <= totalP; i++) {
+      if (i === 1 || i === totalP || (i >= page - 2 && i <= page + 2))
+        range.push(i);
+      else if (range[range.length - 1] !== "…") range.push("…");
+    }
+    range.forEach((i) => {
+      if (i === "…")
+        btns += `<span style="padding:5px 4px;color:#999;">…</span>`;
+      else
+        btns += `<button class="wb-dt-page${i === page ? " active" : ""}" onclick="wbDTGoPage('${containerId}',${i})">${i}</button>`;
+    });
+    btns += `<button class="wb-dt-page" ${page >= totalP ? "disabled" : ""} onclick="wbDTGoPage('${containerId}',${page + 1})">›</button>`;
+    pagesEl.innerHTML = btns;
+  }
+  function applySearch() {
+    const q = (
+      document.getElementById(`${containerId}-search`)?.value || ""
+    ).toLowerCase();
+    filtered = q
+      ? allRows.filter((r) => r.textContent.toLowerCase().includes(q))
+      : allRows.slice();
+    page = 1;
+    renderPage();
+  }
+  const searchEl = document.getElementById(`${containerId}-search`);
+  if (searchEl) searchEl.addEventListener("input", applySearch);
+  const psizeEl = document.getElementById(`${containerId}-psize`);
+  if (psizeEl)
+    psizeEl.addEventListener("change", () => {
+      page = 1;
+      renderPage();
+    });
+  wrap._wbDTRenderPage = renderPage;
+  wrap._wbDTSetPage = (p) => {
+    page = p;
+    renderPage();
+  };
+  renderPage();
+}
+
+function wbDTGoPage(containerId, p) {
+  const wrap = document.getElementById(containerId);
+  if (wrap?._wbDTSetPage) wrap._wbDTSetPage(p);
+}
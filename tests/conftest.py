@@ -0,0 +1,39 @@
+# tests/conftest.py - Environnement commun des tests
+"""
+app.py lit DATABASE_URL à l'import : on le fixe ici, avant que le premier
+module de test n'importe app, pour que tous les tests partagent la base de
+LME_TEST_DATABASE_URL (tests de plans) et qu'aucun ne démarre le scheduler.
+Les tests unitaires (fonctions pures, fixture fx_engine) n'ouvrent pas de
+connexion.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+if os.environ.get('LME_TEST_DATABASE_URL'):
+    os.environ['DATABASE_URL'] = os.environ['LME_TEST_DATABASE_URL']
+os.environ.setdefault('SCHEDULER_ENABLED', '0')
+
+# Fixings ECB de référence (1 EUR = rate devise) : vendredi 2024-06-07 puis
+# lundi 2024-06-10, USD publié aussi le jeudi, CNY pas
+FX_ROWS = [
+    ('USD', '2024-06-06', 1.0870),
+    ('USD', '2024-06-07', 1.0890),
+    ('USD', '2024-06-10', 1.0750),
+    ('CNY', '2024-06-07', 7.8900),
+    ('CNY', '2024-06-10', 7.7900),
+]
+
+
+@pytest.fixture
+def fx_engine():
+    """FxEngine en mémoire sur FX_ROWS (sans base)."""
+    np = pytest.importorskip('numpy')
+    import app
+    return app.FxEngine([(c, np.datetime64(d), r) for c, d, r in FX_ROWS])
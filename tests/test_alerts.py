@@ -0,0 +1,160 @@
+# tests/test_alerts.py - Règles d'alerte : validation et franchissements
+"""
+validate_alert_rule() normalise le JSON reçu par /api/alerts/rules ;
+check_price_rule() / check_fx_rule() décident d'un événement pour une ligne
+ingérée (seuil franchi, au-delà de threshold %, sens demandé) ; le mail
+échappe tout ce qui vient de l'API.
+"""
+
+from datetime import date
+
+import pytest
+
+import app
+
+
+# ── Validation ──
+
+def test_validate_price_rule_normalizes():
+    rule = app.validate_alert_rule({'name': ' Cu > 10k ', 'kind': 'price_level', 'threshold': '10000',
+                                    'metal_type': ' Copper ', 'direction': 'up',
+                                    'recipients': ['achats@example.com']})
+    assert rule == {'name': 'Cu > 10k', 'kind': 'price_level', 'threshold': 10000.0, 'direction': 'up',
+                    'recipients': ['achats@example.com'], 'metal_type': 'copper', 'sheet_id': 'lme',
+                    'quote_currency': None}
+
+
+def test_validate_fx_rule_defaults():
+    rule = app.validate_alert_rule({'name': 'CNY', 'kind': 'fx_vs_budget', 'threshold': 3,
+                                    'quote_currency': 'cny'})
+    assert (rule['quote_currency'], rule['direction'], rule['metal_type'], rule['sheet_id']) == ('CNY', 'both', None, None)
+    assert rule['recipients'] == app.ALERT_DEFAULT_RECIPIENTS
+
+
+@pytest.mark.parametrize('changes', [
+    {'kind': 'price_drop'},
+    {'direction': 'sideways'},
+    {'threshold': None},
+    {'threshold': 'abc'},
+    {'threshold': 0},
+    {'threshold': -5},
+    {'threshold': float('nan')},
+    {'threshold': float('inf')},
+    {'threshold': True},
+    {'recipients': 'achats@example.com'},
+    {'recipients': ['pas-une-adresse']},
+    {'metal_type': 'brent_oil'},                    # pas coté par le LME
+    {'sheet_id': 'inconnue'},
+    {'sheet_id': ['lme']},
+    {'name': '  '},
+])
+def test_validate_rejects(changes):
+    data = {'name': 'r', 'kind': 'price_move', 'threshold': 5, 'metal_type': 'copper', **changes}
+    with pytest.raises(ValueError):
+        app.validate_alert_rule(data)
+
+
+@pytest.mark.parametrize('data', [None, [], 'x', {'name': 'r', 'kind': 'fx_vs_budget', 'threshold': 1,
+                                                  'quote_currency': 'EURO'}])
+def test_validate_rejects_payload(data):
+    with pytest.raises(ValueError):
+        app.validate_alert_rule(data)
+
+
+# ── Franchissements de prix ──
+
+def price_rule(kind, threshold, direction='both'):
+    return {'id': 1, 'kind': kind, 'threshold': threshold, 'direction': direction,
+            'metal_type': 'copper', 'sheet_id': 'lme'}
+
+
+def price_row(previous, price):
+    return {'price': price, 'prev_price': previous, 'price_date': date(2024, 6, 10),
+            'currency': 'USD', 'source': 'metals.dev'}
+
+
+def fired(rule, *path):
+    """Sens des événements le long d'une suite de prix (None = pas d'événement)."""
+    events = [app.check_price_rule(rule, price_row(a, b)) for a, b in zip(path, path[1:])]
+    return [e and ('up' if e['value'] > e['reference'] else 'down') for e in events]
+
+
+@pytest.mark.parametrize('path, expected', [
+    ((99, 101),            ['up']),
+    ((101, 99),            ['down']),
+    ((99, 100, 101),       [None, 'up']),          # touche puis franchit : un seul événement
+    ((101, 100, 99),       ['down', None]),        # le seuil compte comme « pas au-dessus »
+    ((99, 100, 99),        [None, None]),          # touche sans franchir
+    ((101, 100, 101),      ['down', 'up']),
+    ((101, 102, 103),      [None, None]),          # déjà au-dessus
+    ((99, 100.0001),       ['up']),
+])
+def test_price_level_crossings(path, expected):
+    assert fired(price_rule('price_level', 100), *path) == expected
+
+
+def test_price_level_direction_filter():
+    assert fired(price_rule('price_level', 100, 'up'), 99, 101, 99) == ['up', None]
+    assert fired(price_rule('price_level', 100, 'down'), 99, 101, 99) == [None, 'down']
+
+
+def test_price_level_event():
+    event = app.check_price_rule(price_rule('price_level', 10000), price_row(9950.0, 10050.0))
+    assert event['dedup_key'] == 'metals.dev|2024-06-10'
+    assert (event['value'], event['reference'], event['change_pct']) == (10050.0, 9950.0, 1.005)
+    assert 'au-dessus du seuil 10,000.00' in event['message']
+
+
+@pytest.mark.parametrize('direction, previous, price, expected', [
+    ('both', 100, 105,    None),        # exactement 5 % (105/100 - 1 = 0.05000000000000004) : pas au-delà
+    ('both', 100, 95,     None),
+    ('both', 100, 105.01, 'up'),
+    ('both', 100, 94.99,  'down'),
+    ('up',   100, 94.99,  None),
+    ('down', 100, 105.01, None),
+])
+def test_price_move_threshold_edges(direction, previous, price, expected):
+    assert fired(price_rule('price_move', 5, direction), previous, price) == [expected]
+
+
+def test_price_rule_without_previous_price():
+    for previous in (None, 0):
+        assert app.check_price_rule(price_rule('price_move', 1), price_row(previous, 10)) is None
+
+
+# ── Écart au budget FX ──
+
+def fx_row(rate, prev_rate, budget=7.5):
+    return {'quote_currency': 'CNY', 'rate': rate, 'prev_rate': prev_rate,
+            'budget_rate': budget, 'ref_date': date(2024, 6, 10)}
+
+
+@pytest.mark.parametrize('direction, rate, prev_rate, fires', [
+    ('both', 7.9,   7.8,   True),         # +5.33 % : franchit 5 %
+    ('both', 7.875, 7.8,   False),        # exactement +5 %
+    ('both', 7.9,   7.88,  False),        # déjà au-delà au fixing précédent
+    ('both', 7.1,   7.2,   True),         # -5.33 %
+    ('up',   7.1,   7.2,   False),
+    ('down', 7.1,   7.2,   True),
+    ('up',   7.9,   7.1,   True),         # de -5.33 % à +5.33 % : franchit vers le haut
+    ('both', 7.9,   None,  True),         # premier fixing
+])
+def test_fx_vs_budget_crossings(direction, rate, prev_rate, fires):
+    rule = {'id': 2, 'threshold': 5, 'direction': direction}
+    event = app.check_fx_rule(rule, fx_row(rate, prev_rate))
+    assert (event is not None) == fires
+    if fires:
+        assert event['dedup_key'] == 'CNY|2024-06-10' and event['reference'] == 7.5
+
+
+def test_fx_vs_budget_without_budget():
+    assert app.check_fx_rule({'id': 2, 'threshold': 1, 'direction': 'both'}, fx_row(8.0, 7.0, budget=None)) is None
+
+
+# ── Mail ──
+
+def test_alert_email_escapes_api_values():
+    body = app.get_alert_email_html('<script>alert(1)</script>',
+                                    [{'observed_on': date(2024, 6, 10), 'message': 'Cu <b>&</b> "x"'}])
+    assert '<script>' not in body and '&lt;script&gt;' in body
+    assert 'Cu &lt;b&gt;&amp;&lt;/b&gt; &quot;x&quot;' in body
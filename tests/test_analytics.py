@@ -0,0 +1,162 @@
+# tests/test_analytics.py - Statistiques glissantes et écarts entre sources
+"""
+Les calculs vectoriels de /api/analytics/* (sommes cumulées, file monotone,
+produits matriciels masqués) comparés à une boucle naïve sur des séries
+synthétiques avec trous (week-ends, NaN) et niveaux élevés (annulation
+numérique des sommes de carrés).
+"""
+
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import app
+
+
+@pytest.fixture
+def series():
+    """~2 ans de cours ouvrés, niveau ~9 000 avec marche aléatoire, quelques jours manquants."""
+    rng = np.random.default_rng(7)
+    days = np.arange(np.datetime64('2023-01-02'), np.datetime64('2025-01-01'))
+    weekday = (days.astype('datetime64[D]').view('int64') - 4) % 7   # 0 = lundi
+    days = days[(weekday < 5) & (rng.random(len(days)) > 0.05)]
+    prices = 9000 * np.exp(np.cumsum(rng.normal(0, 0.01, len(days))))
+    return days, prices
+
+
+def naive_window(dates, i, days):
+    return [j for j in range(i + 1) if (dates[i] - dates[j]).astype(int) < days]
+
+
+@pytest.mark.parametrize('days', [1, 7, 30, 90])
+def test_window_starts(series, days):
+    dates, _ = series
+    lo = app.window_starts(np, dates, days)
+    assert lo.tolist() == [naive_window(dates, i, days)[0] for i in range(len(dates))]
+
+
+@pytest.mark.parametrize('days', [7, 30, 90])
+def test_rolling_mean_std_matches_naive(series, days):
+    dates, prices = series
+    values = prices.copy()
+    values[::17] = np.nan                               # NaN ignorés
+    lo = app.window_starts(np, dates, days)
+    mean, std = app.rolling_mean_std(np, values, lo)
+    for i in range(len(values)):
+        window = values[lo[i]:i + 1]
+        window = window[~np.isnan(window)]
+        if len(window) == 0:
+            assert math.isnan(mean[i])
+            continue
+        assert mean[i] == pytest.approx(window.mean(), rel=1e-12, abs=1e-9)
+        if len(window) < 2:
+            assert math.isnan(std[i])
+        else:
+            assert std[i] == pytest.approx(window.std(ddof=1), rel=1e-7, abs=1e-9)
+
+
+def test_rolling_mean_std_constant_series_has_zero_std():
+    values = np.full(50, 12345.678)
+    mean, std = app.rolling_mean_std(np, values, np.maximum(np.arange(50) - 9, 0))
+    assert np.allclose(mean, 12345.678)
+    assert math.isnan(std[0]) and np.all(std[1:] == 0)
+
+
+@pytest.mark.parametrize('days', [1, 7, 30])
+def test_rolling_max_matches_naive(series, days):
+    dates, prices = series
+    lo = app.window_starts(np, dates, days)
+    assert app.rolling_max(prices, lo) == [prices[lo[i]:i + 1].max() for i in range(len(prices))]
+
+
+def test_max_drawdown_matches_naive(series):
+    dates, prices = series
+    prices = prices[:300]
+    worst, peak, trough = 0.0, 0, 0
+    for j in range(len(prices)):
+        for i in range(j + 1):
+            change = prices[j] / prices[i] - 1
+            if change < worst:
+                worst, peak, trough = change, i, j
+    result = app.max_drawdown(np, dates[:300], prices)
+    assert result == {'value': round(worst, 6), 'peak_date': str(dates[peak]), 'trough_date': str(dates[trough])}
+
+
+def test_max_drawdown_edge_cases():
+    dates = np.arange(np.datetime64('2024-01-01'), np.datetime64('2024-01-04'))
+    assert app.max_drawdown(np, dates[:0], np.array([])) is None
+    assert app.max_drawdown(np, dates, np.array([1.0, 2.0, 3.0]))['value'] == 0.0
+
+
+def test_rolling_series_stats(series):
+    dates, prices = series
+    first_day = np.datetime64('2024-01-01')
+    stats = app.rolling_series_stats(np, dates, prices, [30], first_day)['30']
+    keep = np.flatnonzero(dates >= first_day)
+    assert all(len(column) == len(keep) for column in stats.values())
+    log_returns = [math.log(prices[j] / prices[j - 1]) if j else None for j in range(len(prices))]
+    for k in range(0, len(keep), 25):
+        i = keep[k]
+        members = naive_window(dates, i, 30)
+        window = prices[members]
+        # Variation log de chaque jour de la fenêtre par rapport au jour coté précédent
+        returns = np.array([log_returns[j] for j in members if log_returns[j] is not None])
+        assert stats['mean'][k] == pytest.approx(window.mean(), abs=1e-5)
+        assert stats['std'][k] == pytest.approx(window.std(ddof=1), abs=1e-5)
+        assert stats['zscore'][k] == pytest.approx((prices[i] - window.mean()) / window.std(ddof=1), abs=1e-5)
+        assert stats['drawdown'][k] == pytest.approx(prices[i] / window.max() - 1, abs=1e-6)
+        assert stats['volatility'][k] == pytest.approx(
+            returns.std(ddof=1) * math.sqrt(app.ANALYTICS_TRADING_DAYS), abs=1e-5)
+
+
+def test_rolling_series_stats_blanks_truncated_windows(series):
+    dates, prices = series
+    stats = app.rolling_series_stats(np, dates, prices, [90], dates[0])['90']
+    truncated = int(np.sum(dates - np.timedelta64(89, 'D') < dates[0]))
+    assert stats['mean'][:truncated] == [None] * truncated
+    assert None not in stats['mean'][truncated:]
+
+
+# ── Écarts entre sources ──
+
+@pytest.fixture
+def panel():
+    """4 sources × 60 périodes, niveaux décalés, trous indépendants ; la dernière source quasi vide."""
+    rng = np.random.default_rng(11)
+    base = 9.0 * np.exp(np.cumsum(rng.normal(0, 0.02, 60)))
+    panel = np.vstack([base * (1 + k * 0.01) * np.exp(rng.normal(0, 0.005, 60)) for k in range(4)])
+    panel[rng.random(panel.shape) < 0.15] = np.nan
+    panel[3, :-2] = np.nan
+    return panel
+
+
+def test_pairwise_stats_matches_naive(panel):
+    observations, mean_spread, latest, last, correlation = app.pairwise_stats(np, panel)
+    returns = np.diff(np.log(panel), axis=1)
+    for i in range(len(panel)):
+        for j in range(len(panel)):
+            common = np.flatnonzero(~np.isnan(panel[i]) & ~np.isnan(panel[j]))
+            assert observations[i, j] == len(common)
+            if len(common) == 0:
+                assert math.isnan(mean_spread[i, j]) and math.isnan(latest[i, j]) and last[i, j] == -1
+            else:
+                spreads = panel[i, common] - panel[j, common]
+                assert mean_spread[i, j] == pytest.approx(spreads.mean(), abs=1e-12)
+                assert (last[i, j], latest[i, j]) == (common[-1], pytest.approx(spreads[-1], abs=1e-12))
+            both = ~np.isnan(returns[i]) & ~np.isnan(returns[j])
+            if both.sum() < app.SPREAD_MIN_OBSERVATIONS:
+                assert math.isnan(correlation[i, j])
+            else:
+                expected = np.corrcoef(returns[i, both], returns[j, both])[0, 1]
+                assert correlation[i, j] == pytest.approx(expected, abs=1e-9)
+
+
+def test_pairwise_stats_is_antisymmetric(panel):
+    observations, mean_spread, latest, last, correlation = app.pairwise_stats(np, panel)
+    assert np.array_equal(observations, observations.T) and np.array_equal(last, last.T)
+    assert np.allclose(mean_spread, -mean_spread.T, equal_nan=True)
+    assert np.allclose(latest, -latest.T, equal_nan=True)
+    assert np.allclose(correlation, correlation.T, equal_nan=True)
+    assert np.allclose(np.diag(correlation)[:3], 1.0)
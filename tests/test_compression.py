@@ -0,0 +1,52 @@
+# tests/test_compression.py - Négociation et compression des réponses
+"""
+negotiate_encoding() choisit br puis gzip selon Accept-Encoding (q=0 exclut),
+et les flux compressés morceau par morceau se décompressent à l'identique.
+"""
+
+import gzip
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None,                        None),
+    ('',                          None),
+    ('gzip',                      'gzip'),
+    ('GZIP, deflate',             'gzip'),
+    ('gzip, deflate, br',         'br'),
+    ('br;q=0, gzip',              'gzip'),
+    ('br;q=0.1, gzip;q=1.0',      'br'),     # br dès qu'il est accepté
+    ('gzip;q=0',                  None),
+    ('gzip;q=abc',                None),     # q illisible = refusé
+    ('identity',                  None),
+    ('deflate, br ; q=0.5',       'br'),
+])
+def test_negotiate_encoding(monkeypatch, header, expected):
+    monkeypatch.setattr(app, 'BROTLI_AVAILABLE', True)
+    assert app.negotiate_encoding(header) == expected
+
+
+def test_negotiate_encoding_without_brotli(monkeypatch):
+    monkeypatch.setattr(app, 'BROTLI_AVAILABLE', False)
+    assert app.negotiate_encoding('br, gzip') == 'gzip'
+    assert app.negotiate_encoding('br') is None
+
+
+def test_gzip_stream_round_trip(monkeypatch):
+    monkeypatch.setattr(app, 'COMPRESS_STREAM_FLUSH_BYTES', 64)
+    chunks = [f'{{"row":{i},"price":{i * 1.5}}},' for i in range(500)]
+    out = list(app.compress_stream(chunks, 'gzip'))
+    assert len(out) > 2                        # flushs intermédiaires : le client lit au fil de l'eau
+    assert gzip.decompress(b''.join(out)) == ''.join(chunks).encode()
+    assert gzip.decompress(app.compress_bytes(b'abc' * 100, 'gzip')) == b'abc' * 100
+
+
+def test_brotli_stream_round_trip():
+    brotli = pytest.importorskip('brotli')
+    chunks = [b'x' * 1000, 'é' * 10, b'', b'fin']
+    body = b''.join(app.compress_stream(chunks, 'br'))
+    assert brotli.decompress(body) == b''.join(c.encode() if isinstance(c, str) else c for c in chunks)
+    assert brotli.decompress(app.compress_bytes(b'abc' * 100, 'br')) == b'abc' * 100
@@ -0,0 +1,98 @@
+# tests/test_db_connection.py - Emprunt des connexions au pool
+"""
+get_db_connection() applique le statement_timeout demandé (0 = sans limite,
+None = budget de l'endpoint ou du fond) une seule fois par connexion, et rend
+la connexion au pool si sa préparation échoue. Pool et connexions factices.
+"""
+
+import pytest
+
+import app
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if self.conn.fail_with:
+            raise self.conn.fail_with
+        self.conn.executed.append((query, params))
+
+
+class FakeConnection:
+    statement_timeout_ms = None
+    closed = 0
+
+    def __init__(self, fail_with=None):
+        self.executed = []
+        self.fail_with = fail_with
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, conns):
+        self.conns = list(conns)
+        self.returned = []
+
+    def getconn(self):
+        return self.conns.pop(0)
+
+    def putconn(self, conn, close=False):
+        self.returned.append((conn, close))
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    def install(*conns):
+        fake = FakePool(conns)
+        monkeypatch.setattr(app, 'get_db_pool', lambda: fake)
+        return fake
+    return install
+
+
+def test_zero_disables_the_timeout(pool):
+    conn = FakeConnection()
+    pool(conn)
+    assert app.get_db_connection(statement_timeout_ms=0) is not None
+    assert conn.executed == [("SET statement_timeout = %s", (0,))]
+    assert conn.statement_timeout_ms == 0
+
+
+def test_default_is_the_background_budget(pool):
+    conn = FakeConnection()
+    pool(conn)
+    app.get_db_connection()
+    budgets = app.app.config['STATEMENT_TIMEOUTS_MS']
+    assert conn.executed == [("SET statement_timeout = %s", (budgets.get('background', budgets['default']),))]
+
+
+def test_timeout_already_applied_is_not_set_again(pool):
+    conn = FakeConnection()
+    conn.statement_timeout_ms = 5000
+    pool(conn)
+    app.get_db_connection(statement_timeout_ms=5000)
+    assert conn.executed == []
+
+
+def test_failed_setup_returns_the_connection(pool):
+    broken, fine = FakeConnection(app.psycopg2.OperationalError()), FakeConnection()
+    fake = pool(broken, fine)
+    assert app.get_db_connection(statement_timeout_ms=0)._conn is fine
+    assert fake.returned == [(broken, True)]
+
+    failing = FakeConnection(ValueError())
+    fake = pool(failing)
+    assert app.get_db_connection() is None
+    assert fake.returned == [(failing, True)]
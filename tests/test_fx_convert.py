@@ -0,0 +1,155 @@
+# tests/test_fx_convert.py - Conversion FX en lot (POST /api/fx/convert)
+"""
+Lecture des lots CSV / JSON, analyse stricte des montants et des dates,
+conversion vectorielle (codes d'erreur, taux croisé, date du fixing retenu)
+et sérialisation en flux CSV / JSON, sur un moteur FX construit en mémoire.
+"""
+
+import csv
+import io
+import json
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import app
+
+
+# ── Lecture des lots ──
+
+@pytest.mark.parametrize('text', [
+    'amount,currency,date,target\n100,usd,2024-06-07,eur\n',
+    'montant;devise;date;cible\n100;usd;2024-06-07;eur\n',
+    'date\tcurrency\tamount\n2024-06-07\tusd\t100\n',          # colonnes dans le désordre, cible par défaut
+    '100,usd,2024-06-07\n',                                    # sans en-tête
+])
+def test_read_fx_csv_layouts(text):
+    batch = app.read_fx_csv(text)
+    assert len(batch) == 1
+    assert (batch.amounts, batch.currencies, batch.dates, batch.targets) == (
+        ['100'], ['USD'], ['2024-06-07'], ['EUR'])
+
+
+def test_read_fx_csv_default_target():
+    batch = app.read_fx_csv('amount,currency,date\n5,EUR,2024-06-07\n', default_target=' cny ')
+    assert batch.targets == ['CNY']
+
+
+def test_read_fx_json_objects_and_lists():
+    objects = app.read_fx_json({'rows': [{'amount': 1, 'currency': 'usd', 'date': '2024-06-07'}]})
+    lists = app.read_fx_json([[1, 'usd', '2024-06-07']])
+    for batch in (objects, lists):
+        assert (batch.amounts, batch.currencies, batch.dates, batch.targets) == (
+            [1], ['USD'], ['2024-06-07'], ['EUR'])
+
+
+@pytest.mark.parametrize('payload', [
+    {'data': []},
+    'amount,currency',
+    [{'amount': 1}, [1, 'USD']],
+    [{'amount': 1, 'currency': 3.5, 'date': '2024-06-07'}, {'amount': 1, 'currency': ['USD']}],
+])
+def test_read_fx_json_rejects_malformed_payloads(payload):
+    with pytest.raises(ValueError):
+        app.read_fx_json(payload)
+
+
+# ── Montants et dates ──
+
+@pytest.mark.parametrize('value, expected', [
+    (12, 12.0),
+    ('1 234,56', 1234.56),
+    ('1\u00a0234,56', 1234.56),         # espace insécable (Excel FR)
+    ('1,234.56', 1234.56),
+    ('1.234,56', 1234.56),
+    ('-7.5', -7.5),
+])
+def test_parse_fx_amount(value, expected):
+    assert app.parse_fx_amount(value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('value', ['abc', '', None, True, False])
+def test_parse_fx_amount_invalid(value):
+    assert math.isnan(app.parse_fx_amount(value))
+
+
+def test_parse_fx_amounts_rejects_booleans():
+    assert math.isnan(app.parse_fx_amounts(np, [True, 2.0])[0])
+    assert app.parse_fx_amounts(np, [1, 2.5]).tolist() == [1.0, 2.5]
+    assert app.parse_fx_amounts(np, ['1 000,5', 3]).tolist() == [1000.5, 3.0]
+
+
+def test_parse_fx_dates_accepts_only_iso_and_french_formats():
+    values = ['2024-06-07', '07/06/2024', ' 2024-06-07 ', 20240607, '20240607', '2024',
+              '2024-06', '2024-06-07T10:00', '2024-13-01', None]
+    parsed = [str(d) for d in app.parse_fx_dates(np, values)]
+    assert parsed == ['2024-06-07'] * 3 + ['NaT'] * 7
+    assert [str(d) for d in app.parse_fx_dates(np, ['2024-06-07', '2024-06-10'])] == ['2024-06-07', '2024-06-10']
+
+
+# ── Conversion ──
+
+def test_convert_fx_batch(fx_engine):
+    batch = app.read_fx_json([
+        [100, 'USD', '2024-06-09', 'CNY'],    # week-end : fixings du vendredi
+        [100, 'EUR', '2024-06-10', 'USD'],
+        [100, 'EUR', '2024-06-10', 'EUR'],
+        ['x', 'USD', '2024-06-07', 'EUR'],
+        [100, 'USD', 'demain', 'EUR'],
+        [100, 'XXX', '2024-06-07', 'EUR'],
+        [100, 'USD', '2024-06-06', 'CNY'],    # pas de fixing CNY ce jour-là
+    ])
+    result = app.convert_fx_batch(fx_engine, batch)
+    assert result['errors'].tolist() == [0, 0, 0, 1, 2, 3, 4]
+    assert result['rates'][:3].tolist() == pytest.approx([7.89 / 1.089, 1.075, 1.0])
+    assert result['converted'][:3].tolist() == pytest.approx([100 * 7.89 / 1.089, 107.5, 100.0])
+    assert [str(d) for d in result['rate_dates']] == ['2024-06-07', '2024-06-10'] + ['NaT'] * 5
+    assert np.isnan(result['rates'][3:]).all()
+
+
+def test_convert_fx_batch_rate_date_is_oldest_leg():
+    engine = app.FxEngine([(c, np.datetime64(d), r) for c, d, r in
+                           [('USD', '2024-06-10', 1.075), ('CNY', '2024-06-07', 7.89)]])
+    result = app.convert_fx_batch(engine, app.read_fx_json([[1, 'USD', '2024-06-10', 'CNY']]))
+    assert str(result['rate_dates'][0]) == '2024-06-07'
+
+
+# ── Sérialisation ──
+
+def convert_and_serialize(fx_engine, rows, fmt, chunk_rows=None, monkeypatch=None):
+    if chunk_rows:
+        monkeypatch.setattr(app, 'FX_CONVERT_CHUNK_ROWS', chunk_rows)
+    batch = app.read_fx_json(rows)
+    result = app.convert_fx_batch(fx_engine, batch)
+    return ''.join(app.fx_convert_stream(np, batch, result, fmt))
+
+
+ROWS_TO_SERIALIZE = [
+    [100, 'USD', '2024-06-07', 'EUR'],
+    ['1,5"', 'USD', '07/06/2024', 'EUR'],
+    [250, 'CNY', '2024-06-10', 'USD'],
+    [10, 'USD', '20240607', 'EUR'],
+]
+
+
+def test_fx_convert_stream_json(fx_engine, monkeypatch):
+    body = json.loads(convert_and_serialize(fx_engine, ROWS_TO_SERIALIZE, 'json', 3, monkeypatch))
+    assert (body['count'], body['failed']) == (4, 2)
+    first, bad_amount, cross, bad_date = body['data']
+    assert first == {'amount': 100.0, 'currency': 'USD', 'date': '2024-06-07', 'target': 'EUR',
+                     'rate': round(1 / 1.089, 8), 'converted': round(100 / 1.089, 6),
+                     'rate_date': '2024-06-07', 'error': None}
+    assert (bad_amount['amount'], bad_amount['date'], bad_amount['error']) == ('1,5"', '2024-06-07', 'montant invalide')
+    assert cross['rate'] == pytest.approx(1.075 / 7.79)
+    assert (bad_date['date'], bad_date['rate'], bad_date['error']) == ('20240607', None, 'date invalide')
+
+
+def test_fx_convert_stream_csv_matches_json(fx_engine, monkeypatch):
+    text = convert_and_serialize(fx_engine, ROWS_TO_SERIALIZE, 'csv', 3, monkeypatch)
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert list(rows[0]) == list(app.FX_CONVERT_OUTPUT)
+    data = json.loads(convert_and_serialize(fx_engine, ROWS_TO_SERIALIZE, 'json'))['data']
+    for row, expected in zip(rows, data):
+        assert row == {k: '' if v is None else str(v) for k, v in expected.items()}
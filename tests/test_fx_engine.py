@@ -0,0 +1,80 @@
+# tests/test_fx_engine.py - Moteur FX as-of (taux ECB préchargés)
+"""
+FxEngine sur les fixings ECB de conftest.FX_ROWS : taux en vigueur à une date
+(dernier fixing publié, au plus FX_ASOF_MAX_DAYS jours avant), dates de
+fixing retenues et conversion en EUR.
+"""
+
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import app
+
+
+def test_rates_asof_forward_fills_last_fixing(fx_engine):
+    rates = fx_engine.rates_asof('USD', ['2024-06-06', '2024-06-08', '2024-06-09', '2024-06-10', '2024-06-12'])
+    assert rates.tolist() == [1.0870, 1.0890, 1.0890, 1.0750, 1.0750]
+
+
+def test_rates_asof_without_cover_is_nan(fx_engine):
+    stale = str(np.datetime64('2024-06-10') + app.FX_ASOF_MAX_DAYS + 1)
+    rates = fx_engine.rates_asof('USD', ['2024-06-05', stale, 'NaT'])
+    assert all(math.isnan(r) for r in rates.tolist())
+    assert fx_engine.rates_asof('USD', [str(np.datetime64('2024-06-10') + app.FX_ASOF_MAX_DAYS)])[0] == 1.0750
+
+
+def test_rates_asof_eur_and_unknown_currency(fx_engine):
+    assert fx_engine.rates_asof('EUR', ['2024-06-07', '1999-01-01']).tolist() == [1.0, 1.0]
+    assert math.isnan(fx_engine.rates_asof('XXX', ['2024-06-07'])[0])
+
+
+def test_fixing_dates(fx_engine):
+    fixes = fx_engine.fixing_dates('CNY', ['2024-06-06', '2024-06-09', '2024-06-11'])
+    assert [str(d) for d in fixes] == ['NaT', '2024-06-07', '2024-06-10']
+    assert str(fx_engine.fixing_dates('EUR', ['2024-06-07'])[0]) == 'NaT'
+
+
+def test_to_eur(fx_engine):
+    converted = fx_engine.to_eur([108.90, 1000.0], ['2024-06-09', '2024-06-10'], 'USD')
+    assert converted.tolist() == pytest.approx([100.0, 1000.0 / 1.0750])
+
+
+def test_engine_length_and_currencies(fx_engine):
+    assert len(fx_engine) == 2
+    assert fx_engine.currencies == ['EUR', 'CNY', 'USD']
+    assert not app.FxEngine([])                  # aucun taux : moteur « vide »
+
+
+# ── Taux croisés via l'EUR ──
+
+def test_cross_rates_divide_the_eur_legs(fx_engine):
+    cross = fx_engine.cross_rates('USD', 'CNY', ['2024-06-07', '2024-06-09', '2024-06-10'])
+    assert cross.tolist() == pytest.approx([7.89 / 1.089, 7.89 / 1.089, 7.79 / 1.075])
+    inverse = fx_engine.cross_rates('CNY', 'USD', ['2024-06-07'])
+    assert inverse[0] == pytest.approx(1 / cross[0])
+    assert fx_engine.cross_rates('EUR', 'USD', ['2024-06-07'])[0] == 1.0890
+    assert fx_engine.cross_rates('USD', 'EUR', ['2024-06-07'])[0] == pytest.approx(1 / 1.0890)
+    assert fx_engine.cross_rates('CNY', 'CNY', ['2024-06-07', '1999-01-01']).tolist() == [1.0, 1.0]
+
+
+def test_cross_rate_missing_leg_is_nan(fx_engine):
+    # CNY n'a pas de fixing le 06/06 : la paire n'a pas de taux ce jour-là
+    cross = fx_engine.cross_rates('USD', 'CNY', ['2024-06-06', '2024-06-10'])
+    assert math.isnan(cross[0]) and cross[1] == pytest.approx(7.79 / 1.075)
+
+
+def test_convert(fx_engine):
+    assert fx_engine.convert([100.0], ['2024-06-10'], 'USD', 'CNY')[0] == pytest.approx(100 * 7.79 / 1.075)
+
+
+def test_monthly_cross_rates_use_monthly_average(fx_engine):
+    periods = ['2024-05', '2024-06']
+    usd = (1.0870 + 1.0890 + 1.0750) / 3
+    cny = (7.8900 + 7.7900) / 2
+    assert fx_engine.monthly_average('USD', periods)[1] == pytest.approx(usd)
+    # mai sans fixing : omis
+    assert fx_engine.monthly_cross_rates('USD', 'CNY', periods) == {'2024-06': pytest.approx(cny / usd)}
+    assert fx_engine.monthly_cross_rates('EUR', 'USD', periods) == {'2024-06': pytest.approx(usd)}
@@ -0,0 +1,201 @@
+# tests/test_query_plans.py - Non-régression des plans d'exécution SQL
+"""
+Rend chaque variante de requête des onglets (format × filtres), l'exécute
+sous EXPLAIN (FORMAT JSON) sur une base locale remplie par
+benchmarks/synthetic_data.py et vérifie :
+
+- aucun Seq Scan sur metal_prices / ecb_exchange_rates au-delà de
+  PLAN_SEQSCAN_ROW_THRESHOLD lignes ;
+- la forme des accès (type de scan, table, index) identique au snapshot
+  de tests/plan_snapshots/.
+
+Les plans sont calculés avec enable_seqscan = off : à l'échelle des données
+de test un Seq Scan peut être légitimement le moins cher, on vérifie donc
+qu'un chemin indexé *existe*. Une modification qui rend l'index inutilisable
+(fonction sur la colonne, cast…) fait réapparaître un Seq Scan.
+
+    LME_TEST_DATABASE_URL=postgresql://localhost/lme_test python -m pytest tests/test_query_plans.py
+    UPDATE_PLAN_SNAPSHOTS=1 …   # régénère les snapshots après un changement voulu
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+TEST_DSN = os.environ.get('LME_TEST_DATABASE_URL')
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plan_snapshots')
+UPDATE_SNAPSHOTS = os.environ.get('UPDATE_PLAN_SNAPSHOTS') == '1'
+SEQSCAN_ROW_THRESHOLD = int(os.environ.get('PLAN_SEQSCAN_ROW_THRESHOLD', 10000))
+WATCHED_TABLES = {'metal_prices', 'ecb_exchange_rates'}
+
+pytestmark = pytest.mark.skipif(not TEST_DSN, reason='LME_TEST_DATABASE_URL non défini')
+
+FILTER_CASES = {
+    'all':         {},
+    'year':        {'year_filter': 2024},
+    'year_month':  {'year_filter': 2024, 'month_filter': 6},
+    'month':       {'month_filter': 6},
+    'start':       {'start_date': '2024-01-01'},
+    'start_end':   {'start_date': '2024-01-01', 'end_date': '2024-06-30'},
+    'year_start':  {'year_filter': 2024, 'start_date': '2024-03-01'},
+    'metal':       {'metal_type': 'copper'},
+}
+
+
+class RecordingCursor:
+    """Enregistre les requêtes émises par les constructeurs sans les exécuter."""
+
+    def __init__(self):
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append((query, list(params or [])))
+
+    def fetchall(self):
+        return []
+
+    def fetchone(self):
+        return None
+
+
+@pytest.fixture(scope='module')
+def app_module():
+    from synthetic_data import prepare_database
+    prepare_database(TEST_DSN, years=5, sources=7, seed=42, reset=True)
+    os.environ['DATABASE_URL'] = TEST_DSN
+    os.environ.setdefault('SCHEDULER_ENABLED', '0')
+    import app
+    if not app.ensure_performance_indexes():
+        pytest.skip("index de performance non créés (extension pg_trgm indisponible ?)")
+    conn = app.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE metal_prices; ANALYZE ecb_exchange_rates;")
+        conn.commit()
+    finally:
+        conn.close()
+    return app
+
+
+def render_queries(app, sheet_id, filters):
+    cur = RecordingCursor()
+    app.fetch_sheet_data(cur, app.METALS_SOURCE_CONFIGS[sheet_id], **filters)
+    return cur.queries
+
+
+def explain(app, query, params):
+    conn = app.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL enable_seqscan = off")
+            cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cur.fetchone()[0][0]['Plan']
+        conn.rollback()
+        return plan
+    finally:
+        conn.close()
+
+
+def walk(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk(child)
+
+
+def unindexed_scans(plan):
+    """Parcours complets d'une table surveillée : Seq Scan, ou index lu sans condition."""
+    return [
+        n for n in walk(plan)
+        if n.get('Relation Name') in WATCHED_TABLES and (
+            n['Node Type'] == 'Seq Scan'
+            or (n['Node Type'] in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in n)
+        )
+    ]
+
+
+def scan_shape(plan):
+    """Accès aux tables du plan, sans coûts ni estimations (stables d'une base à l'autre)."""
+    return [
+        {k: n[k] for k in ('Node Type', 'Relation Name', 'Index Name') if k in n}
+        for n in walk(plan)
+        if 'Relation Name' in n or 'Index Name' in n
+    ]
+
+
+def table_rows(app, table):
+    conn = app.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT reltuples::BIGINT FROM pg_class WHERE relname = %s", (table,))
+            row = cur.fetchone()
+            return row[0] if row else 0
+    finally:
+        conn.close()
+
+
+CASES = [(sheet_id, name) for sheet_id in
+         ['brent', 'comex', 'girm', 'shme', 'lsnikko', 'silver', 'lme']
+         for name in FILTER_CASES]
+
+
+@pytest.mark.parametrize('sheet_id,filter_name', CASES)
+def test_sheet_query_plan(app_module, sheet_id, filter_name):
+    assert sheet_id in app_module.METALS_SOURCE_CONFIGS
+    queries = render_queries(app_module, sheet_id, FILTER_CASES[filter_name])
+    assert queries, "aucune requête émise"
+
+    shapes = []
+    for query, params in queries:
+        plan = explain(app_module, query, params)
+        for node in unindexed_scans(plan):
+            table = node['Relation Name']
+            rows = table_rows(app_module, table)
+            assert rows <= SEQSCAN_ROW_THRESHOLD, (
+                f"{node['Node Type']} complet sur {table} ({rows} lignes) "
+                f"pour {sheet_id}/{filter_name}:\n{query}"
+            )
+        shapes.append(scan_shape(plan))
+
+    path = os.path.join(SNAPSHOT_DIR, f"{sheet_id}__{filter_name}.json")
+    if UPDATE_SNAPSHOTS or not os.path.exists(path):
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(shapes, f, indent=2)
+            f.write('\n')
+        return
+    with open(path) as f:
+        expected = json.load(f)
+    assert shapes == expected, f"plan modifié pour {sheet_id}/{filter_name} (UPDATE_PLAN_SNAPSHOTS=1 si voulu)"
+
+
+@pytest.mark.parametrize('filters', [{}, {'year_filter': 2024}, {'year_filter': 2024, 'month_filter': 6}])
+def test_bme_query_uses_ref_date_index(app_module, filters):
+    cur = RecordingCursor()
+    app_module.get_bme_data(cur, **filters)
+    (query, params), = cur.queries
+    plan = explain(app_module, query, params)
+    assert not unindexed_scans(plan) or table_rows(app_module, 'ecb_exchange_rates') <= SEQSCAN_ROW_THRESHOLD
+
+
+def test_period_filter_is_sargable(app_module):
+    query, params = app_module._apply_period_filter("WHERE TRUE", [], 2024, 12)
+    assert 'EXTRACT' not in query
+    assert [p.isoformat() for p in params] == ['2024-12-01', '2025-01-01']
+
+
+@pytest.mark.parametrize('sheet_id', ['silver', 'lme'])
+@pytest.mark.parametrize('freq,agg', [('W', 'ohlc'), ('M', 'mean'), ('Y', 'last')])
+def test_resampled_sheet_keeps_index(app_module, sheet_id, freq, agg):
+    # Le GROUP BY date_trunc enveloppe la requête filtrée : les filtres doivent
+    # rester poussés jusqu'à l'index de metal_prices
+    filters = dict(FILTER_CASES['start_end'], freq=freq, agg=agg)
+    (query, params), = render_queries(app_module, sheet_id, filters)
+    assert 'date_trunc' in query
+    plan = explain(app_module, query, params)
+    assert not unindexed_scans(plan) or table_rows(app_module, 'metal_prices') <= SEQSCAN_ROW_THRESHOLD
@@ -0,0 +1,87 @@
+# tests/test_resample.py - Rééchantillonnage freq / agg des historiques
+"""
+parse_resample_args() n'accepte que les fréquences et agrégations connues :
+resample_query() n'insère dans le SQL que les unités date_trunc de
+RESAMPLE_FREQS, jamais la valeur brute de la query string.
+"""
+
+import re
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize('args, expected', [
+    ({},                            (None, None)),
+    ({'freq': ''},                  (None, None)),
+    ({'freq': 'm'},                 ('M', 'mean')),
+    ({'freq': 'W', 'agg': 'LAST'},  ('W', 'last')),
+    ({'freq': 'y', 'agg': 'ohlc'},  ('Y', 'ohlc')),
+])
+def test_parse_resample_args(args, expected):
+    assert app.parse_resample_args(args) == expected
+
+
+@pytest.mark.parametrize('args', [
+    {'agg': 'last'},                                 # agg sans freq
+    {'freq': 'H'},
+    {'freq': 'month'},
+    {'freq': "M', price_date)::date; DROP TABLE metal_prices; --"},
+    {'freq': 'M', 'agg': 'sum'},
+    {'freq': 'M', 'agg': 'max(price)) FROM pg_shadow --'},
+])
+def test_parse_resample_args_rejects_unknown_values(args):
+    with pytest.raises(ValueError):
+        app.parse_resample_args(args)
+
+
+BASE = "SELECT metal_type, price, price_date, created_at, id FROM metal_prices WHERE 1=1"
+
+
+def compact(sql):
+    return ' '.join(sql.split())
+
+
+@pytest.mark.parametrize('freq, unit', sorted(app.RESAMPLE_FREQS.items()))
+def test_period_is_a_whitelisted_date_trunc(freq, unit):
+    sql = compact(app.resample_query(BASE, ('metal_type',), freq, 'mean'))
+    assert re.findall(r"date_trunc\('(\w+)'", sql) == [unit, unit]   # SELECT et GROUP BY
+    assert f"GROUP BY metal_type, date_trunc('{unit}', price_date::timestamp)::date" in sql
+
+
+def test_unknown_freq_never_reaches_the_sql():
+    with pytest.raises(KeyError):
+        app.resample_query(BASE, ('metal_type',), "month'); DROP TABLE x; --", 'mean')
+
+
+def test_mean():
+    sql = compact(app.resample_query(BASE, ('metal_type', 'currency'), 'M', 'mean'))
+    assert sql.startswith("SELECT metal_type, currency, date_trunc('month', price_date::timestamp)::date "
+                          "AS price_date, AVG(price) AS price, COUNT(*) AS data_points, "
+                          "MAX(price_date) AS last_date")
+    assert f"FROM ({BASE}) AS raw WHERE price IS NOT NULL" in sql
+    assert 'ARRAY_AGG' not in sql
+
+
+def test_last_breaks_ties_on_the_latest_insert():
+    sql = compact(app.resample_query(BASE, ('metal_type',), 'W', 'last', tiebreak=('created_at', 'id')))
+    assert ("(ARRAY_AGG(price ORDER BY price_date DESC NULLS LAST, created_at DESC NULLS LAST, "
+            "id DESC NULLS LAST))[1] AS price") in sql
+    assert 'AVG(' not in sql
+
+
+def test_ohlc_columns():
+    sql = compact(app.resample_query(BASE, ('metal_type',), 'Q', 'ohlc', tiebreak=('created_at',)))
+    last = "(ARRAY_AGG(price ORDER BY price_date DESC NULLS LAST, created_at DESC NULLS LAST))[1]"
+    assert f"{last} AS price" in sql and f"{last} AS close" in sql
+    assert "(ARRAY_AGG(price ORDER BY price_date, created_at))[1] AS open" in sql
+    assert "MAX(price) AS high" in sql and "MIN(price) AS low" in sql
+
+
+def test_custom_columns_for_ecb_rates():
+    sql = compact(app.resample_query("SELECT * FROM ecb_exchange_rates", ('quote_currency',), 'M', 'last',
+                                     date_col='ref_date', value_col='rate'))
+    assert "date_trunc('month', ref_date::timestamp)::date AS ref_date" in sql
+    assert "(ARRAY_AGG(rate ORDER BY ref_date DESC NULLS LAST))[1] AS rate" in sql
+    assert "MAX(ref_date) AS last_date" in sql and "WHERE rate IS NOT NULL" in sql
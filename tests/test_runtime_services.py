@@ -0,0 +1,37 @@
+# tests/test_runtime_services.py - Démarrage paresseux des services du worker
+"""
+Hors create_app(), le premier appel ne lance pool chaud, migrations et
+élection du scheduler que vers une base explicite (DATABASE_URL) et hors
+app.testing : un client de test ne doit jamais joindre la base de production.
+"""
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def started(monkeypatch):
+    calls = []
+    monkeypatch.setattr(app, 'start_runtime_services', lambda: calls.append(True))
+    monkeypatch.setattr(app.app, 'testing', False)
+    return calls
+
+
+def test_skipped_without_explicit_database(monkeypatch, started):
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    app._ensure_runtime_services()
+    assert started == []
+
+
+def test_skipped_under_app_testing(monkeypatch, started):
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://localhost/lme_test')
+    monkeypatch.setattr(app.app, 'testing', True)
+    app._ensure_runtime_services()
+    assert started == []
+
+
+def test_started_with_explicit_database(monkeypatch, started):
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://localhost/lme_test')
+    app._ensure_runtime_services()
+    assert started == [True]
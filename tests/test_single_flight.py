@@ -0,0 +1,130 @@
+# tests/test_single_flight.py - Coalescence des appels identiques concurrents
+"""
+@single_flight : les appels concurrents aux mêmes arguments (défauts
+appliqués) partagent une seule exécution et son résultat ou son erreur ; les
+appels successifs ou aux arguments différents, même équivalents pour
+l'appelant (' copper ', 'all', None), s'exécutent chacun avec les leurs.
+"""
+
+import threading
+
+import pytest
+
+import app
+
+
+def concurrent_calls(func, args_list, release):
+    """Lance func(*args) dans un thread par entrée ; retourne (résultats, erreurs)."""
+    results, errors = [None] * len(args_list), [None] * len(args_list)
+
+    def call(i, args):
+        try:
+            results[i] = func(*args)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i, args)) for i, args in enumerate(args_list)]
+    for t in threads:
+        t.start()
+    release()
+    for t in threads:
+        t.join(timeout=5)
+    return results, errors
+
+
+def wait_for_waiters(name, expected):
+    """Attend que `expected` appels soient en attente du même vol."""
+    for _ in range(500):
+        with app._inflight_lock:
+            if app.single_flight_stats.get(name, {}).get('coalesced', 0) >= expected:
+                return
+        threading.Event().wait(0.01)
+    pytest.fail(f"{expected} appels coalescés attendus pour {name}")
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    started, gate, executions = threading.Event(), threading.Event(), []
+
+    @app.single_flight
+    def sf_shared(metal, year=None):
+        executions.append((metal, year))
+        started.set()
+        gate.wait(5)
+        return {'metal': metal, 'year': year}
+
+    def release():
+        started.wait(5)
+        wait_for_waiters('sf_shared', 4)
+        gate.set()
+
+    # year=None par défaut ou explicite : même clé
+    results, errors = concurrent_calls(
+        sf_shared, [('copper',), ('copper', None), ('copper',), ('copper',), ('copper',)], release)
+
+    assert errors == [None] * 5
+    assert len(executions) == 1
+    assert all(r is results[0] for r in results)
+    assert app.single_flight_stats['sf_shared'] == {'calls': 5, 'executions': 1, 'coalesced': 4}
+
+
+def test_concurrent_divergent_arguments_each_get_their_own_result():
+    gate, executions = threading.Event(), []
+
+    @app.single_flight
+    def sf_divergent(metal=None):
+        executions.append(metal)
+        gate.wait(5)
+        return metal
+
+    def release():
+        for _ in range(500):
+            if len(executions) == 5:
+                break
+            threading.Event().wait(0.01)
+        wait_for_waiters('sf_divergent', 1)
+        gate.set()
+
+    args_list = [('copper',), (' copper ',), ('all',), (None,), ('',)]
+    results, errors = concurrent_calls(sf_divergent, args_list + [()], release)
+
+    assert errors == [None] * 6
+    # sf_divergent() et sf_divergent(None) coalescent ; chaque autre valeur brute est exécutée
+    assert results == ['copper', ' copper ', 'all', None, '', None]
+    assert sorted(executions, key=repr) == sorted([a for a, in args_list], key=repr)
+
+
+def test_error_is_raised_to_every_waiter():
+    started, gate = threading.Event(), threading.Event()
+
+    @app.single_flight
+    def sf_failing(metal):
+        started.set()
+        gate.wait(5)
+        raise RuntimeError(f"échec {metal}")
+
+    def release():
+        started.wait(5)
+        wait_for_waiters('sf_failing', 2)
+        gate.set()
+
+    results, errors = concurrent_calls(sf_failing, [('zinc',)] * 3, release)
+
+    assert results == [None] * 3
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert errors[0] is errors[1] is errors[2]
+
+
+def test_different_arguments_and_sequential_calls_execute():
+    executions = []
+
+    @app.single_flight
+    def sf_plain(metal, sheet='lme'):
+        executions.append((metal, sheet))
+        return len(executions)
+
+    assert sf_plain('copper') == 1
+    assert sf_plain('copper') == 2            # le vol précédent est terminé
+    assert sf_plain('copper', 'comex') == 3
+    assert sf_plain('all') == 4
+    assert sf_plain(None) == 5
+    assert not app._inflight
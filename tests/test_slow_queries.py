@@ -0,0 +1,82 @@
+# tests/test_slow_queries.py - Journal des requêtes lentes et EXPLAIN échantillonné
+"""
+Empreinte des requêtes (littéraux et paramètres → ?) et garde-fou de
+l'EXPLAIN ANALYZE : seules les lectures pures sont rejouées, jamais une
+écriture (CTE comprise), un verrou ou un appel de fonction à effet de bord.
+"""
+
+import pytest
+
+import app
+
+
+def normalized(query):
+    return app.query_fingerprint(query)[1]
+
+
+def test_query_fingerprint_ignores_literals_and_whitespace():
+    a = app.query_fingerprint("SELECT *\n  FROM metal_prices WHERE metal_type = 'copper' AND price > 9000.5")
+    b = app.query_fingerprint("SELECT * FROM metal_prices WHERE metal_type = 'it''s' AND price > 12")
+    c = app.query_fingerprint("SELECT * FROM metal_prices WHERE metal_type = %s AND price > %(p)s")
+    assert a == b == c
+    assert a[1] == "SELECT * FROM metal_prices WHERE metal_type = ? AND price > ?"
+    assert app.query_fingerprint(b"SELECT 1")[1] == "SELECT ?"
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT * FROM metal_prices WHERE price_date >= %s",
+    "  select id from latest_prices",
+    "WITH recent AS (SELECT * FROM metal_prices) SELECT COUNT(*) FROM recent",
+    "(SELECT 1) UNION ALL (SELECT 2)",
+    "SELECT updated_at, inserted_by FROM sync_logs",                       # colonnes, pas des mots-clés
+    "SELECT * FROM alert_rules WHERE message = 'DELETE FROM alert_rules'",  # littéral remplacé
+])
+def test_read_only_queries_are_explained(query):
+    assert app.is_read_only_sql(normalized(query))
+
+
+@pytest.mark.parametrize('query', [
+    "INSERT INTO metal_prices (price) VALUES (%s)",
+    "UPDATE alert_rules SET enabled = false",
+    "DELETE FROM alert_events WHERE id = 1 RETURNING *",
+    "WITH gone AS (DELETE FROM alert_events RETURNING id) SELECT COUNT(*) FROM gone",
+    "WITH added AS (INSERT INTO table_counts VALUES ('x', 1) RETURNING *) SELECT * FROM added",
+    "with moved as (update latest_prices set price = 0 returning *) select 1",
+    "SELECT * INTO backup_prices FROM metal_prices",
+    "SELECT * FROM alert_rules FOR UPDATE",
+    "SELECT pg_try_advisory_lock(hashtext(%s))",
+    "SELECT pg_advisory_xact_lock(hashtext('alerts_schema'))",
+    "SELECT nextval('metal_prices_id_seq')",
+    "SELECT set_config('statement_timeout', '0', false)",
+    "TRUNCATE latest_prices",
+    "COPY metal_prices TO STDOUT",
+    "CALL refresh_latest_prices()",
+    "EXPLAIN ANALYZE DELETE FROM metal_prices",
+    "SET statement_timeout = 0",
+    "/* lecture */ SELECT 1",                                             # début non reconnu : exclu
+])
+def test_writes_and_side_effects_are_never_explained(query):
+    assert not app.is_read_only_sql(normalized(query))
+
+
+def test_record_slow_query_submits_only_reads(monkeypatch):
+    submitted = []
+
+    class Executor:
+        def submit(self, fn, entry, query, params):
+            submitted.append(query)
+            app._explain_pending.clear()
+
+    monkeypatch.setattr(app, '_explain_executor', Executor())
+    monkeypatch.setattr(app, 'SLOW_QUERY_EXPLAIN_SAMPLE', 1.0)
+    monkeypatch.setattr(app, '_slow_queries', app.deque(maxlen=10))
+    read = "SELECT * FROM metal_prices WHERE id = %s"
+    for query in (read, "WITH d AS (DELETE FROM metal_prices RETURNING id) SELECT * FROM d",
+                  "SELECT pg_try_advisory_lock(hashtext(%s))"):
+        app.record_slow_query('test', query, [1], 2.0, 1)
+    app.record_slow_query('test', read, [1], 2.0, None, error='QueryCanceled')   # échouée : pas rejouée
+    app.record_slow_query('test', read, [1], 0.001, 1)                          # rapide : ignorée
+
+    assert submitted == [read]
+    assert [e['sql'] for e in app._slow_queries][:1] == [normalized(read)]
+    assert len(app._slow_queries) == 4